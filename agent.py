@@ -0,0 +1,665 @@
+import json
+import time
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from tools import all_tools_schemas, available_functions, get_async_tools, get_tool_options, get_tool_timeout, get_tool_cache, FINAL_ANSWER_TOOL
+from tools import current_session_id, get_job_manager
+from config import Config
+from utils import extract_json
+from logger import MessageLogger
+from checkpoint import SessionCheckpoint
+from llm import ProviderRouter
+from events import get_event_bus
+from answer_cache import get_answer_index
+from tool_selection import ToolSelector, used_tool_names
+from stall import StallDetector
+from profiler import SessionProfiler
+
+
+SYSTEM_PROMPT = """
+Current time: {current_time}
+---
+You are a helpful assistant, and you have access to a set of tools. Your task is to try your best to complete the user's request.
+What you should do FIRST is to make a high-level plan for the task to instruct your following actions, but it's totally OK that you can adjust it during the process of the task, finally make sure you have completed the task.
+
+For completing the task, there will be multiple turns of interaction with tool invoking, observation and reasoning for each turn. And only when you believe the task is complete, call the `final_answer` tool with the answer and, if any, the sources it is based on. This ends the task immediately.
+For the task that requires a certain answer, you should finally give the answer in the "answer" argument of `final_answer`.
+For the task that requires non-specific answer but requires open-ended text generating, you should finally give the generated text according to the user's request and the additional information you have learned from the tools in the "answer" argument of `final_answer`.
+Only if you cannot call tools, include a JSON marker within the ```json block in your response instead, like this:
+```json
+{"task_complete": true, "message": "The answer or summary of the task"}
+```
+"""
+
+
+# Sync tools run here so a deadline can be enforced; a thread that overruns is abandoned, not killed
+tool_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="tool")
+
+WRAP_UP_MESSAGE = (
+    "The time budget for this task is almost used up. Stop researching and call the final_answer tool now "
+    "with the best answer you can give from what you have found so far."
+)
+STALL_WRAP_UP_MESSAGE = (
+    "The last turns have not made progress despite corrections. Stop here and call the final_answer tool now "
+    "with the best answer you can give from what you have found so far, noting anything you could not verify."
+)
+
+
+def message_to_dict(message) -> Dict[str, Any]:
+    """Convert a chat completion message into a plain, JSON-serializable dict"""
+    data = {"role": message.role, "content": message.content}
+    if message.tool_calls:
+        data["tool_calls"] = [
+            {
+                "id": tc.id,
+                "type": "function",
+                "function": {"name": tc.function.name, "arguments": tc.function.arguments},
+            }
+            for tc in message.tool_calls
+        ]
+    return data
+
+
+def is_error_result(result: str) -> bool:
+    try:
+        result_json = json.loads(result)
+    except (json.JSONDecodeError, TypeError):
+        return True
+    return not isinstance(result_json, dict) or "error" in result_json
+
+
+class AgentSession:
+    """
+    One agent conversation: the model/tool loop plus its durable state.
+
+    The state (messages, iteration counter, usage and tool results) is checkpointed after
+    the model responds and after every tool result, so a crashed session can be resumed
+    without calling the model or running a tool a second time.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        router: ProviderRouter,
+        user_prompt: str = "",
+        system_prompt: Optional[str] = None,
+        max_iterations: int = 16,
+        session_id: Optional[str] = None,
+        tool_names: Optional[List[str]] = None,
+        time_budget: Optional[float] = None,
+        parent_session_id: Optional[str] = None,
+    ):
+        self.config = config
+        self.router = router
+        self.provider = router.primary
+        self.model = router.get_model()
+        self.user_prompt = user_prompt
+        self.system_prompt = system_prompt or SYSTEM_PROMPT.replace("{current_time}", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        self.max_iterations = max_iterations
+        # Restrict the session to a subset of the registered tools (None means all of them)
+        self.tool_names = tool_names
+        # Set for sub-agent sessions started by delegate
+        self.parent_session_id = parent_session_id
+        self.tool_schemas = [
+            schema for schema in all_tools_schemas
+            if tool_names is None or schema["function"]["name"] in tool_names
+        ]
+
+        # Wall-clock seconds the session may run in total (None means unlimited)
+        self.time_budget = time_budget if time_budget is not None else config.get("agent.time_budget_seconds")
+        self.wrap_up_seconds = config.get("agent.wrap_up_seconds", 60)
+        self.time_used = 0.0
+        self.run_started: Optional[float] = None
+        self.wrapping_up = False
+        # Why the session is wrapping up: "time_budget" or "stall"
+        self.wrap_up_reason: Optional[str] = None
+        self.stall_detector = StallDetector(config)
+
+        self.tool_selector = ToolSelector(config, self.tool_schemas, user_prompt)
+        self.tools_expanded = False
+        self.tool_selection_stats = {"profiles": self.tool_selector.profiles, "turns": 0, "schema_tokens_sent": 0, "schema_tokens_saved": 0}
+
+        self.logger = MessageLogger(config, session_id)
+        self.checkpoint = SessionCheckpoint(config, self.logger.get_session_id())
+        self.event_bus = get_event_bus(config)
+        self.profiler = SessionProfiler(config, self.logger.get_session_id())
+
+        self.messages: List[Dict[str, Any]] = [
+            {
+                "role": "system",
+                "content": self.system_prompt
+            },
+            {
+                "role": "user",
+                "content": f"**User request**: {user_prompt}"
+            }
+        ]
+        self.iteration = 0
+        self.task_complete = False
+        self.task_message = ""
+        self.task_sources: List[str] = []
+        # How the session ended, how many turns were spent nudging a plain-text reply, and how
+        # many plain-text replies ended the session without one
+        self.completion_metrics = {"completed_via": None, "nudge_turns": 0, "nudges_avoided": 0}
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        self.tool_results: List[Dict[str, Any]] = []
+        self.pending_tool_calls: List[Dict[str, Any]] = []
+        self.tool_cache_stats = {"hits": 0, "misses": 0, "by_tool": {}}
+        self.status = "running"
+        self.cancel_requested = False
+        # Callbacks receiving every session event, e.g. to stream them to a client
+        self.event_handlers: List[Callable[[Dict[str, Any]], None]] = []
+
+    @property
+    def session_id(self) -> str:
+        return self.logger.get_session_id()
+
+    @classmethod
+    def resume(cls, config: Config, router: ProviderRouter, session_id: str) -> "AgentSession":
+        """Rebuild a session from its last checkpoint"""
+        state = SessionCheckpoint(config, session_id).load()
+        if state is None:
+            raise ValueError(f"No checkpoint found for session '{session_id}'")
+
+        session = cls(
+            config,
+            router,
+            user_prompt=state["user_prompt"],
+            system_prompt=state["system_prompt"],
+            max_iterations=state["max_iterations"],
+            tool_names=state.get("tool_names"),
+            session_id=session_id,
+            time_budget=state.get("time_budget"),
+            parent_session_id=state.get("parent_session_id"),
+        )
+        session.messages = state["messages"]
+        session.iteration = state["iteration"]
+        session.task_complete = state["task_complete"]
+        session.task_message = state["task_message"]
+        session.task_sources = state.get("task_sources", [])
+        session.completion_metrics = state.get("completion_metrics", session.completion_metrics)
+        session.usage = state["usage"]
+        session.tool_results = state["tool_results"]
+        session.pending_tool_calls = state["pending_tool_calls"]
+        session.tool_cache_stats = state.get("tool_cache_stats", session.tool_cache_stats)
+        session.time_used = state.get("time_used", 0.0)
+        session.tools_expanded = state.get("tools_expanded", False)
+        session.tool_selection_stats = state.get("tool_selection_stats", session.tool_selection_stats)
+        session.wrapping_up = state.get("wrapping_up", False)
+        session.wrap_up_reason = state.get("wrap_up_reason", "time_budget" if session.wrapping_up else None)
+        session.stall_detector.restore(state.get("stall", {}))
+        # A cancelled session can be picked up again where it stopped
+        session.status = "running" if state["status"] == "cancelled" else state["status"]
+        session.logger.restore(state["log"], state["session_start_time"])
+        return session
+
+    def get_state(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "status": self.status,
+            "provider": self.provider,
+            "model": self.model,
+            "user_prompt": self.user_prompt,
+            "system_prompt": self.system_prompt,
+            "max_iterations": self.max_iterations,
+            "tool_names": self.tool_names,
+            "parent_session_id": self.parent_session_id,
+            "iteration": self.iteration,
+            "task_complete": self.task_complete,
+            "task_message": self.task_message,
+            "task_sources": self.task_sources,
+            "completion_metrics": self.completion_metrics,
+            "usage": self.usage,
+            "messages": self.messages,
+            "tool_results": self.tool_results,
+            "pending_tool_calls": self.pending_tool_calls,
+            "tool_cache_stats": self.tool_cache_stats,
+            "time_budget": self.time_budget,
+            "time_used": self.elapsed(),
+            "wrapping_up": self.wrapping_up,
+            "wrap_up_reason": self.wrap_up_reason,
+            "stall": self.stall_detector.get_state(),
+            "tools_expanded": self.tools_expanded,
+            "tool_selection_stats": self.tool_selection_stats,
+            "session_start_time": self.logger.session_start_time.isoformat(),
+            "log": self.logger.messages_log,
+            "checkpoint_time": datetime.now().isoformat(),
+        }
+
+    def save_checkpoint(self):
+        self.checkpoint.save(self.get_state())
+
+    def emit(self, event_type: str, level: str = "info", **data):
+        if not self.event_handlers and not self.event_bus.wants(level):
+            return
+        event = {"type": event_type, "level": level, "session_id": self.session_id, "timestamp": datetime.now().isoformat(), **data}
+        for handler in self.event_handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                self.event_bus.publish("event_handler_error", "error", session_id=self.session_id, message=f"❌ Error in event handler: {e}")
+        if self.event_bus.wants(level):
+            self.event_bus.dispatch(event)
+
+    def elapsed(self) -> float:
+        """Seconds spent running this session, across resumes"""
+        if self.run_started is None:
+            return self.time_used
+        return self.time_used + time.monotonic() - self.run_started
+
+    def time_remaining(self) -> Optional[float]:
+        if self.time_budget is None:
+            return None
+        return self.time_budget - self.elapsed()
+
+    def tool_deadline(self, function_name: str) -> Optional[float]:
+        """The tool's own timeout, shortened so the session keeps time to wrap up within its budget"""
+        timeout = get_tool_timeout(function_name, self.config)
+        remaining = self.time_remaining()
+        if remaining is not None:
+            budget_left = max(1.0, remaining - self.wrap_up_seconds)
+            timeout = min(timeout, budget_left) if timeout else budget_left
+        return timeout
+
+    def start_wrap_up(self, reason: str = "time_budget"):
+        self.wrapping_up = True
+        self.wrap_up_reason = reason
+        if reason == "stall":
+            self.messages.append({"role": "user", "content": STALL_WRAP_UP_MESSAGE})
+            return
+        self.messages.append({"role": "user", "content": WRAP_UP_MESSAGE})
+        self.logger.log_message({"time_used": self.elapsed(), "time_budget": self.time_budget}, "time_budget_wrap_up")
+        self.emit("time_budget_wrap_up", "warning", time_used=round(self.elapsed(), 1), time_budget=self.time_budget)
+
+    def check_stall(self):
+        """Fingerprint the turn just finished; correct the model if it is stuck, or wrap up once corrections stop helping"""
+        turn_results = [entry for entry in self.tool_results if entry["iteration"] == self.iteration]
+        stall = self.stall_detector.observe(self.iteration, turn_results)
+        if stall is None or self.task_complete or self.wrapping_up:
+            return
+
+        action = "aborted" if self.stall_detector.should_abort() else "corrected"
+        event = self.stall_detector.record(self.iteration, stall, action)
+        self.logger.log_message(event, "stall_detected")
+        if action == "aborted":
+            self.emit("stall_detected", "warning", message=f"🛑 No progress after {self.stall_detector.interventions_since_progress} corrections ({stall['kind']}), asking for a final answer", **event)
+            self.start_wrap_up("stall")
+            return
+        self.emit("stall_detected", "warning", message=f"🔁 Stall detected ({stall['kind']}), sending a corrective message", **event)
+        self.messages.append({"role": "user", "content": stall["message"]})
+        self.logger.log_message({"role": "user", "content": stall["message"]}, "stall_feedback")
+
+    def extend_iterations(self) -> bool:
+        """Grant more turns to a session at its iteration limit, as long as it is still making progress"""
+        if self.wrapping_up or not self.stall_detector.can_extend():
+            return False
+        detector = self.stall_detector
+        detector.extensions += 1
+        self.max_iterations += detector.extend_by
+        details = {"max_iterations": self.max_iterations, "extension": detector.extensions, "recent_progress_turns": detector.recent_progress()}
+        self.logger.log_message(details, "iteration_budget_extended")
+        self.emit("iteration_budget_extended", message=f"➕ Still making progress, extending the budget to {self.max_iterations} iterations", **details)
+        return True
+
+    def cancel(self):
+        """Ask the loop to stop at the next model turn or tool call"""
+        self.cancel_requested = True
+
+    async def execute_tool_call(self, tool_call: Dict[str, Any]) -> str:
+        function_name = tool_call["function"]["name"]
+        try:
+            function_args = json.loads(tool_call["function"]["arguments"] or "{}")
+        except json.JSONDecodeError as e:
+            return json.dumps({"error": f"Invalid arguments for {function_name}: {str(e)}"})
+
+        if function_name not in available_functions or (self.tool_names is not None and function_name not in self.tool_names):
+            return json.dumps({"error": f"Unknown function: {function_name}"})
+
+        async_tools = get_async_tools()
+        function_to_call = self.profiler.wrap_tool(function_name, self.iteration, tool_call["id"], available_functions[function_name], function_name in async_tools)
+        options = get_tool_options().get(function_name, {})
+        tool_cache = get_tool_cache()
+
+        if options.get("memoize"):
+            result = tool_cache.get(function_name, function_args, options)
+            self.record_cache_lookup(function_name, result is not None)
+            if result is not None:
+                self.emit("tool_cache_hit", "debug", name=function_name)
+                self.logger.log_tool_call(function_name, function_args, result, cached=True, tool_call_id=tool_call["id"])
+                return result
+        else:
+            # The tool may change files, so cached filesystem results can no longer be trusted
+            tool_cache.invalidate_filesystem()
+
+        timeout = self.tool_deadline(function_name)
+        try:
+            if function_name in async_tools:
+                # Async tools are cancelled when the deadline passes
+                call = function_to_call(**function_args)
+            else:
+                # The worker thread gets this task's context, so the tool knows which session it serves
+                context = contextvars.copy_context()
+                call = asyncio.get_running_loop().run_in_executor(tool_executor, functools.partial(context.run, function_to_call, **function_args))
+            result = await asyncio.wait_for(call, timeout)
+
+            if options.get("memoize") and not is_error_result(result):
+                tool_cache.put(function_name, function_args, options, result)
+
+            # Log tool call and result
+            self.logger.log_tool_call(function_name, function_args, result, tool_call_id=tool_call["id"])
+
+            return result
+        except asyncio.TimeoutError:
+            error_msg = f"{function_name} did not finish within its {timeout:g}s deadline and was stopped."
+            self.logger.log_message({"tool_name": function_name, "arguments": function_args, "timeout": timeout}, "tool_timeout")
+            self.emit("tool_timeout", "warning", name=function_name, timeout=timeout, message=f"⏰ {error_msg}")
+            return json.dumps({"error": error_msg})
+        except Exception as e:
+            error_msg = f"Error executing {function_name}: {str(e)}"
+            self.emit("tool_error", "error", name=function_name, message=error_msg)
+            return json.dumps({"error": error_msg})
+
+    def record_cache_lookup(self, function_name: str, hit: bool):
+        stats = self.tool_cache_stats
+        by_tool = stats["by_tool"].setdefault(function_name, {"hits": 0, "misses": 0})
+        key = "hits" if hit else "misses"
+        stats[key] += 1
+        by_tool[key] += 1
+
+    async def process_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[str]:
+        completed = {m["tool_call_id"]: m["content"] for m in self.messages if m.get("role") == "tool"}
+        errors = []
+        # Only affects this asyncio.run, whose context is a copy
+        current_session_id.set(self.session_id)
+
+        for tool_call in tool_calls:
+            function_name = tool_call["function"]["name"]
+            if tool_call["id"] in completed:
+                # Already executed before a resume, reuse the recorded result
+                result = completed[tool_call["id"]]
+            else:
+                if self.cancel_requested:
+                    break
+                self.emit("tool_started", tool_call_id=tool_call["id"], name=function_name, arguments=tool_call["function"]["arguments"])
+                started = datetime.now()
+                result = await self.execute_tool_call(tool_call)
+                self.emit(
+                    "tool_finished",
+                    tool_call_id=tool_call["id"],
+                    name=function_name,
+                    result=result,
+                    duration=(datetime.now() - started).total_seconds(),
+                )
+
+                self.messages.append({
+                    "tool_call_id": tool_call["id"],
+                    "role": "tool",
+                    "name": function_name,
+                    "content": result,
+                })
+                self.tool_results.append({
+                    "iteration": self.iteration,
+                    "tool_call_id": tool_call["id"],
+                    "name": function_name,
+                    "arguments": tool_call["function"]["arguments"],
+                    "result": result,
+                })
+                self.save_checkpoint()
+
+            try:
+                result_json = json.loads(result)
+                if function_name == FINAL_ANSWER_TOOL and result_json.get("success"):
+                    self.complete(result_json["answer"], "final_answer_tool", result_json.get("sources", []))
+                    # The session ends here, so any tool calls after final_answer are not run
+                    break
+                if "error" in result_json:
+                    errors.append(f"{function_name} error: {result_json['error']}")
+                elif function_name == "execute_shell_command" and result_json.get("returncode", 0) != 0:
+                    errors.append(f"Command execution error: {result_json.get('stderr', 'Unknown error')}")
+            except json.JSONDecodeError:
+                errors.append(f"{function_name} error: Could not parse JSON: {result}")
+
+        return errors
+
+    def handle_tool_calls(self, tool_calls: List[Dict[str, Any]]):
+        # Execute the async tool calls
+        errors = asyncio.run(self.process_tool_calls(tool_calls))
+
+        if errors and not self.task_complete:
+            error_feedback = "Errors occurred during execution:\n" + "\n".join(errors) + "\nPlease handle these errors and continue the task."
+            self.emit("error_feedback", "warning", feedback=error_feedback)
+
+            self.messages.append({
+                "role": "user",
+                "content": error_feedback
+            })
+
+            # Log error feedback
+            self.logger.log_message({
+                "role": "user",
+                "content": error_feedback
+            }, "error_feedback")
+
+        self.pending_tool_calls = []
+
+    def call_model(self):
+        tools = self.tool_selector.select(used_tool_names(self.messages), self.tools_expanded)
+        if self.wrapping_up:
+            # Out of time: the only thing left to do is answer
+            tools = [schema for schema in tools if schema["function"]["name"] == FINAL_ANSWER_TOOL] or tools
+        self.record_tool_selection(tools)
+        response, provider = self.router.create(
+            messages=self.messages,
+            tools=tools,
+            tool_choice="auto",
+        )
+        self.provider = provider
+
+        if response.usage:
+            self.usage["prompt_tokens"] += response.usage.prompt_tokens or 0
+            self.usage["completion_tokens"] += response.usage.completion_tokens or 0
+            self.usage["total_tokens"] += response.usage.total_tokens or 0
+
+        return response.choices[0].message
+
+    def record_tool_selection(self, tools: List[Dict[str, Any]]):
+        saved = self.tool_selector.tokens_saved(tools)
+        stats = self.tool_selection_stats
+        stats["turns"] += 1
+        stats["schema_tokens_sent"] += self.tool_selector.full_tokens - saved
+        stats["schema_tokens_saved"] += saved
+        self.emit("tools_selected", "debug", tools=[t["function"]["name"] for t in tools], tokens_saved=saved)
+
+    def complete(self, message: str, completed_via: str, sources: Optional[List[str]] = None):
+        self.task_complete = True
+        self.task_message = message
+        self.task_sources = sources or []
+        self.completion_metrics["completed_via"] = completed_via
+        self.emit("final_answer", answer=message, sources=self.task_sources, completed_via=completed_via)
+
+    def check_completion(self, content: str):
+        # Fallback for models that answer with the JSON marker instead of calling final_answer
+        json_data = extract_json(content or "")
+        if json_data:
+            self.complete(json_data.get('message', "Task completed without specific message"), "json_marker")
+
+    def consult_answer_cache(self):
+        """
+        Look for completed sessions with a similar prompt. A recent one with the same prompt
+        answers this session outright; otherwise the closest answers are added to the user
+        request as prior findings.
+        """
+        try:
+            index = get_answer_index(self.config)
+            index.refresh()
+            exact = index.find_exact(self.user_prompt)
+            matches = index.search(self.user_prompt, self.config.get("answer_cache.max_context", 3))
+        except Exception as e:
+            self.emit("answer_cache_error", "warning", message=f"⚠️ Answer cache lookup failed: {e}")
+            return
+
+        if exact:
+            session_id, doc = exact
+            max_age = self.config.get("answer_cache.max_age_hours", 168) * 3600
+            try:
+                age = (datetime.now() - datetime.fromisoformat(doc["completed_at"])).total_seconds()
+            except (TypeError, ValueError):
+                age = float("inf")
+            if age <= max_age:
+                self.emit("answer_cache_hit", cached_session_id=session_id)
+                self.logger.log_message({"cached_session_id": session_id}, "answer_cache_hit")
+                self.complete(doc["answer"], "answer_cache")
+                return
+        if not matches:
+            return
+
+        # Similar is not the same: "3 - 5" and "3 + 5" share every word, so these are only hints
+        score = matches[0][0]
+        threshold = self.config.get("answer_cache.context_threshold", 0.3)
+        max_chars = self.config.get("answer_cache.context_chars", 1500)
+        findings = [
+            f"- Earlier request ({(match_doc['completed_at'] or '')[:10]}): {match_doc['prompt'].strip()}\n"
+            f"  Answer: {match_doc['answer'][:max_chars]}"
+            for match_score, _, match_doc in matches if match_score >= threshold
+        ]
+        if findings:
+            self.messages[1]["content"] += (
+                "\n\n**Findings from earlier sessions on similar requests** (may be outdated, verify before relying on them):\n"
+                + "\n".join(findings)
+            )
+            self.emit("answer_cache_context", "debug", findings=len(findings), best_score=round(score, 4))
+            self.logger.log_message({"findings": len(findings), "best_score": score}, "answer_cache_context")
+
+    def run(self) -> Tuple[bool, str]:
+        if self.status != "running":
+            return self.task_complete, self.task_message
+        self.run_started = time.monotonic()
+        self.profiler.start()
+
+        if self.iteration == 0:
+            # Log session start
+            self.logger.log_session_start(self.user_prompt, self.system_prompt, self.provider, self.model, self.parent_session_id)
+            self.emit("session_started", user_prompt=self.user_prompt)
+            # Sub-agent prompts are fragments of another session's task, not requests of their own
+            if self.config.get("answer_cache.enabled", True) and self.parent_session_id is None:
+                self.consult_answer_cache()
+            self.save_checkpoint()
+        else:
+            self.emit("session_resumed", iteration=self.iteration)
+
+        if self.pending_tool_calls:
+            # The process died while running the tools of the last iteration
+            self.handle_tool_calls(self.pending_tool_calls)
+
+        while not self.task_complete and not self.cancel_requested:
+            if self.iteration >= self.max_iterations and not self.extend_iterations():
+                break
+            remaining = self.time_remaining()
+            if remaining is not None and remaining <= self.wrap_up_seconds and not self.wrapping_up:
+                self.start_wrap_up()
+
+            self.iteration += 1
+            self.emit("iteration_started", iteration=self.iteration, max_iterations=self.max_iterations)
+
+            response_message = message_to_dict(self.call_model())
+            self.messages.append(response_message)
+            if response_message["content"]:
+                self.emit("model_text", "debug", iteration=self.iteration, provider=self.provider, text=response_message["content"])
+
+            # Log the model response
+            self.logger.log_message({
+                "role": response_message["role"],
+                "content": response_message["content"],
+                "tool_calls": [{"function": tc["function"]} for tc in response_message.get("tool_calls", [])],
+                "provider": self.provider,
+            }, "model_response")
+
+            if not self.task_complete:
+                self.check_completion(response_message["content"])
+
+            tool_calls = response_message.get("tool_calls")
+            if tool_calls:
+                self.pending_tool_calls = tool_calls
+                self.save_checkpoint()
+                self.handle_tool_calls(tool_calls)
+            else:
+                if self.task_complete:
+                    # A plain-text reply that carried the answer ends the loop instead of costing a nudge turn
+                    self.completion_metrics["nudges_avoided"] += 1
+                else:
+                    self.emit("no_tool_calls", "warning", iteration=self.iteration, text=response_message["content"])
+
+                    feedback = "Please use tools to complete the task, or if the task is complete, call the final_answer tool with the answer."
+                    self.completion_metrics["nudge_turns"] += 1
+                    # The model may be stuck for lack of a tool it was not offered
+                    self.tools_expanded = True
+                    self.messages.append({
+                        "role": "user",
+                        "content": feedback
+                    })
+
+                    # Log feedback message
+                    self.logger.log_message({
+                        "role": "user",
+                        "content": feedback
+                    }, "system_feedback")
+
+            profile = self.profiler.sample(self.iteration, self.messages, self.logger.messages_log, self.tool_results)
+            if profile:
+                self.logger.log_message(profile, "profile_iteration")
+                self.emit("profile_iteration", "debug", **profile)
+
+            if self.wrapping_up and not self.task_complete:
+                # The wrap-up turn is the last one the budget allows
+                if self.wrap_up_reason == "stall":
+                    self.logger.log_message({"iteration": self.iteration}, "stall_abort")
+                    self.emit("stall_abort", "warning", iteration=self.iteration)
+                else:
+                    self.logger.log_message({"time_used": self.elapsed(), "time_budget": self.time_budget}, "time_budget_exhausted")
+                    self.emit("time_budget_exhausted", "warning", time_used=round(self.elapsed(), 1), time_budget=self.time_budget)
+                break
+
+            if not self.task_complete:
+                self.check_stall()
+                # The one save of the turn after its tool results; a finished session is saved below
+                self.save_checkpoint()
+
+        self.time_used = self.elapsed()
+        self.run_started = None
+
+        killed = get_job_manager().cleanup(self.session_id)
+        if killed:
+            self.logger.log_message({"killed": killed}, "background_jobs_killed")
+            self.emit("background_jobs_killed", "warning", killed=killed, message=f"🧹 Killed {killed} background job(s) still running at session end")
+
+        # Log session end
+        self.status = "cancelled" if self.cancel_requested and not self.task_complete else "completed"
+        self.logger.log_message(self.router.get_stats(), "provider_stats")
+        self.logger.log_message(self.completion_metrics, "completion_metrics")
+        lookups = self.tool_cache_stats["hits"] + self.tool_cache_stats["misses"]
+        self.logger.log_message(
+            dict(self.tool_cache_stats, hit_rate=round(self.tool_cache_stats["hits"] / lookups, 4) if lookups else None),
+            "tool_cache_stats",
+        )
+        self.logger.log_message(self.tool_selection_stats, "tool_selection_stats")
+        self.logger.log_message(self.stall_detector.get_stats(), "stall_stats")
+        profile_summary = self.profiler.stop()
+        if profile_summary:
+            table = self.profiler.format_table()
+            self.logger.log_message(dict(profile_summary, table=table), "profile_summary")
+            self.emit("profile_summary", message=f"📊 Resource profile of {self.session_id}:\n{table}", **profile_summary)
+        self.logger.log_session_end(self.task_complete, self.task_message, self.iteration)
+        self.save_checkpoint()
+        if self.config.get("answer_cache.enabled", True) and self.task_complete and self.parent_session_id is None:
+            try:
+                # Picks up the log just written, so later sessions can find this answer
+                get_answer_index(self.config).refresh()
+            except Exception as e:
+                self.emit("answer_cache_error", "warning", message=f"⚠️ Could not update the answer index: {e}")
+        self.emit("session_finished", status=self.status, task_complete=self.task_complete, answer=self.task_message, iterations=self.iteration, usage=self.usage)
+
+        return self.task_complete, self.task_message
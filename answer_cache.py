@@ -0,0 +1,226 @@
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
+
+DIMENSIONS = 1 << 18
+INDEX_FILENAME = "answer_index.json"
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "is", "are", "was", "be",
+    "it", "this", "that", "by", "as", "at", "from", "me", "my", "i", "you", "please", "can", "could",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Words and word bigrams; runs of non-ASCII script (e.g. Chinese) are split into character bigrams"""
+    tokens = []
+    words = []
+    for word in TOKEN_PATTERN.findall(text.lower()):
+        if not word.isascii() and len(word) > 1:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+            continue
+        if word not in STOPWORDS:
+            words.append(word)
+    tokens.extend(words)
+    tokens.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return tokens
+
+
+def normalize_prompt(text: str) -> str:
+    """Prompt text compared for exact reuse: case and whitespace are ignored, nothing else"""
+    return " ".join(text.casefold().split())
+
+
+def hash_token(token: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little") % DIMENSIONS
+
+
+def term_counts(text: str) -> Dict[int, int]:
+    counts: Dict[int, int] = {}
+    for token in tokenize(text):
+        bucket = hash_token(token)
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+def read_session_log(path: str) -> Optional[Dict[str, Any]]:
+    """Prompt and final answer of a completed session log, or None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            log = json.load(f)
+    except (OSError, ValueError):
+        return None
+    start = end = None
+    for entry in log.get("messages", []):
+        if entry.get("message_type") == "session_start":
+            if entry.get("parent_session_id"):
+                # Sub-agent of a delegate call
+                return None
+            start = entry
+        elif entry.get("message_type") == "session_end":
+            end = entry
+        elif entry.get("message_type") == "completion_metrics" and entry["content"].get("completed_via") == "answer_cache":
+            # Answered from this index in the first place
+            return None
+    if not start or not end or not end.get("task_complete") or not end.get("task_message"):
+        return None
+    return {
+        "prompt": start.get("user_prompt", ""),
+        "answer": end["task_message"],
+        "completed_at": end.get("timestamp") or start.get("timestamp", ""),
+    }
+
+
+class AnswerIndex:
+    """
+    Offline similarity index of completed sessions.
+
+    Prompts are embedded as hashed TF-IDF vectors, with the final answers kept alongside.
+    Similarity only finds related sessions; an answer is reused as it is only for the same
+    prompt (find_exact). The session logs stay the source of
+    truth: the index file only caches their term counts, and refresh() picks up logs that
+    are new or changed since the last look, so updates are incremental.
+    """
+
+    def __init__(self, logs_path: str):
+        self.logs_path = logs_path
+        self.index_path = os.path.join(logs_path, INDEX_FILENAME)
+        self.files: Dict[str, int] = {}
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.df: Dict[int, int] = {}
+        self.postings: Dict[int, set] = {}
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.files = data.get("files", {})
+        for session_id, doc in data.get("docs", {}).items():
+            doc["terms"] = {int(bucket): count for bucket, count in doc["terms"].items()}
+            self._add_doc(session_id, doc)
+
+    def save(self):
+        with self.lock:
+            data = {"files": dict(self.files), "docs": {sid: dict(doc) for sid, doc in self.docs.items()}}
+        os.makedirs(self.logs_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.logs_path, prefix=".answer_index.", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _add_doc(self, session_id: str, doc: Dict[str, Any]):
+        self._remove_doc(session_id)
+        self.docs[session_id] = doc
+        for bucket in doc["terms"]:
+            self.df[bucket] = self.df.get(bucket, 0) + 1
+            self.postings.setdefault(bucket, set()).add(session_id)
+
+    def _remove_doc(self, session_id: str):
+        doc = self.docs.pop(session_id, None)
+        if doc is None:
+            return
+        for bucket in doc["terms"]:
+            self.df[bucket] -= 1
+            self.postings[bucket].discard(session_id)
+            if not self.df[bucket]:
+                del self.df[bucket]
+                del self.postings[bucket]
+
+    def add(self, session_id: str, prompt: str, answer: str, completed_at: Optional[str] = None):
+        doc = {
+            "prompt": prompt,
+            "answer": answer,
+            "completed_at": completed_at or datetime.now().isoformat(),
+            "terms": term_counts(prompt),
+        }
+        with self.lock:
+            self._add_doc(session_id, doc)
+
+    def refresh(self) -> int:
+        """Index session logs that appeared or changed since the last refresh; returns how many were read"""
+        try:
+            entries = [e for e in os.scandir(self.logs_path) if e.name.startswith("session_") and e.name.endswith(".json")]
+        except OSError:
+            return 0
+        changed = 0
+        for entry in entries:
+            try:
+                mtime = entry.stat().st_mtime_ns
+            except OSError:
+                continue
+            if self.files.get(entry.name) == mtime:
+                continue
+            changed += 1
+            session = read_session_log(entry.path)
+            session_id = entry.name[:-len(".json")]
+            if session:
+                self.add(session_id, session["prompt"], session["answer"], session["completed_at"])
+            with self.lock:
+                self.files[entry.name] = mtime
+        if changed:
+            self.save()
+        return changed
+
+    def find_exact(self, prompt: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Most recent completed session with the same prompt as (session id, doc), or None"""
+        key = normalize_prompt(prompt)
+        with self.lock:
+            candidates = set()
+            for bucket in term_counts(prompt):
+                candidates |= self.postings.get(bucket, set())
+            same = [(doc["completed_at"] or "", session_id, doc) for session_id, doc in self.docs.items()
+                    if session_id in candidates and normalize_prompt(doc["prompt"]) == key]
+        if not same:
+            return None
+        _, session_id, doc = max(same, key=lambda item: item[0])
+        return session_id, doc
+
+    def _vector(self, counts: Dict[int, int], total_docs: int) -> Dict[int, float]:
+        vector = {}
+        for bucket, count in counts.items():
+            idf = math.log((1 + total_docs) / (1 + self.df.get(bucket, 0))) + 1
+            vector[bucket] = (1 + math.log(count)) * idf
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {bucket: v / norm for bucket, v in vector.items()}
+
+    def search(self, prompt: str, limit: int = 3) -> List[Tuple[float, str, Dict[str, Any]]]:
+        """Most similar completed sessions as (cosine similarity, session id, doc), best first"""
+        with self.lock:
+            total_docs = len(self.docs)
+            query = self._vector(term_counts(prompt), total_docs)
+            candidates = set()
+            for bucket in query:
+                candidates |= self.postings.get(bucket, set())
+            scored = []
+            for session_id in candidates:
+                doc = self.docs[session_id]
+                vector = self._vector(doc["terms"], total_docs)
+                score = sum(weight * vector.get(bucket, 0.0) for bucket, weight in query.items())
+                scored.append((score, session_id, doc))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:limit]
+
+
+_indexes: Dict[str, AnswerIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_answer_index(config: Config) -> AnswerIndex:
+    """Process-wide index for the configured logs directory"""
+    logs_path = config.get("logging.save_path", "logs/")
+    with _indexes_lock:
+        if logs_path not in _indexes:
+            _indexes[logs_path] = AnswerIndex(logs_path)
+        return _indexes[logs_path]
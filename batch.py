@@ -0,0 +1,206 @@
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+from typing import Any, Dict
+from config import Config
+from agent import AgentSession
+from checkpoint import SessionCheckpoint
+from events import publish
+from llm import get_router
+from workqueue import WorkQueue
+
+
+class Heartbeat(threading.Thread):
+    """Keeps the lease of a running task alive, and cancels the session once it is lost or the worker stops"""
+
+    def __init__(self, config: Config, task_id: int, worker_id: str, session: AgentSession, stop: threading.Event, wake: threading.Event):
+        super().__init__(name=f"heartbeat-{task_id}", daemon=True)
+        self.config = config
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.session = session
+        self.stop = stop
+        # Set with stop or done, so neither waits for the next heartbeat
+        self.wake = wake
+        self.done = threading.Event()
+        self.lost = False
+        self.lease_seconds = config.get("queue.lease_seconds", 300)
+        self.interval = config.get("queue.heartbeat_interval", self.lease_seconds / 3)
+
+    def run(self):
+        # SQLite connections must not be shared across threads, so the heartbeat has its own
+        queue = WorkQueue.from_config(self.config)
+        try:
+            cancelled = False
+            while True:
+                # Once the session is cancelled only the end of the task matters
+                (self.done if cancelled else self.wake).wait(self.interval)
+                if self.done.is_set():
+                    return
+                if self.stop.is_set() and not cancelled:
+                    self.session.cancel()
+                    cancelled = True
+                try:
+                    owned = queue.heartbeat(self.task_id, self.worker_id, self.lease_seconds)
+                except Exception as e:
+                    publish("heartbeat_error", "warning", task_id=self.task_id, message=f"⚠️ Heartbeat for task {self.task_id} failed: {e}")
+                    continue
+                if not owned:
+                    self.lost = True
+                    self.session.cancel()
+                    publish("lease_lost", "warning", task_id=self.task_id, message=f"⚠️ Lost the lease on task {self.task_id}, stopping it")
+                    return
+        finally:
+            queue.close()
+
+
+def start_session(config: Config, task: Dict[str, Any]) -> AgentSession:
+    router = get_router(config)
+    if task["session_id"] and SessionCheckpoint(config, task["session_id"]).exists():
+        # An earlier attempt got this far; carry on from its checkpoint (a finished session
+        # just returns its result)
+        return AgentSession.resume(config, router, task["session_id"])
+    return AgentSession(config, router, user_prompt=task["prompt"], max_iterations=task["max_iterations"])
+
+
+def run_task(config: Config, queue: WorkQueue, task: Dict[str, Any], worker_id: str, stop: threading.Event, wake: threading.Event):
+    task_id = task["id"]
+    try:
+        session = start_session(config, task)
+    except Exception as e:
+        queue.fail(task_id, worker_id, f"Could not start session: {e}")
+        return
+    queue.set_session(task_id, worker_id, session.session_id)
+
+    if not stop.is_set():
+        wake.clear()
+    heartbeat = Heartbeat(config, task_id, worker_id, session, stop, wake)
+    heartbeat.start()
+    try:
+        task_complete, task_message = session.run()
+    except Exception as e:
+        queue.fail(task_id, worker_id, f"{type(e).__name__}: {e}")
+        publish("task_failed", "error", task_id=task_id, attempt=task["attempts"], message=f"❌ Task {task_id} failed (attempt {task['attempts']}/{task['max_attempts']}): {e}")
+        return
+    finally:
+        heartbeat.done.set()
+        wake.set()
+        heartbeat.join()
+
+    if heartbeat.lost:
+        return
+    if session.status == "cancelled":
+        queue.release(task_id, worker_id)
+        return
+    queue.complete(task_id, worker_id, {
+        "task_complete": task_complete,
+        "answer": task_message,
+        "sources": session.task_sources,
+        "session_id": session.session_id,
+        "iterations": session.iteration,
+        "usage": session.usage,
+    })
+    publish("task_completed", task_id=task_id, message=f"✅ Task {task_id} finished after {session.iteration} iterations")
+
+
+def worker_main(config_path: str, exit_when_empty: bool):
+    """Entry point of one worker process: claim and run tasks until stopped"""
+    config = Config(config_path)
+    queue = WorkQueue.from_config(config)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    lease_seconds = config.get("queue.lease_seconds", 300)
+    poll_interval = config.get("queue.poll_interval", 2.0)
+
+    stop = threading.Event()
+    wake = threading.Event()
+
+    def request_stop(*_):
+        stop.set()
+        wake.set()
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, request_stop)
+
+    publish("worker_started", worker_id=worker_id, message=f"👷 Worker {worker_id} started")
+    while not stop.is_set():
+        task = queue.claim(worker_id, lease_seconds)
+        if task is None:
+            if exit_when_empty and queue.counts()["queued"] == 0:
+                break
+            stop.wait(poll_interval)
+            continue
+        publish("task_claimed", task_id=task["id"], worker_id=worker_id, message=f"📥 Worker {worker_id} claimed task {task['id']}")
+        run_task(config, queue, task, worker_id, stop, wake)
+    queue.close()
+
+
+def work(config_path: str, processes: int, exit_when_empty: bool):
+    # Spawned rather than forked, so no thread pool or connection of the parent leaks into a worker
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=worker_main, args=(config_path, exit_when_empty), name=f"worker-{i}") for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # The workers got the same SIGINT; they hand back their tasks and exit
+        for worker in workers:
+            worker.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run agent tasks from a durable queue with a pool of worker processes.")
+    parser.add_argument("--config", default="config.yaml")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add tasks to the queue.")
+    enqueue.add_argument("prompts", nargs="*", help="Task prompts.")
+    enqueue.add_argument("--file", help="A file of prompts, one per line ('-' for stdin).")
+    enqueue.add_argument("--max-iterations", type=int)
+    enqueue.add_argument("--max-attempts", type=int)
+
+    worker = commands.add_parser("work", help="Run worker processes on this host.")
+    worker.add_argument("--processes", type=int)
+    worker.add_argument("--exit-when-empty", action="store_true", help="Stop once no task is queued.")
+
+    status = commands.add_parser("status", help="Show queue counts, or the tasks with a given status.")
+    status.add_argument("--list", choices=["queued", "running", "completed", "failed"])
+    status.add_argument("--limit", type=int, default=100)
+
+    args = parser.parse_args()
+    config = Config(args.config)
+
+    if args.command == "work":
+        processes = args.processes or config.get("queue.processes") or os.cpu_count() or 1
+        work(args.config, processes, args.exit_when_empty)
+        return
+
+    queue = WorkQueue.from_config(config)
+    if args.command == "enqueue":
+        prompts = list(args.prompts)
+        if args.file:
+            source = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+            with source:
+                prompts += [line.strip() for line in source if line.strip()]
+        if not prompts:
+            parser.error("no prompts given")
+        ids = queue.enqueue(
+            prompts,
+            max_iterations=args.max_iterations or config.get("queue.max_iterations", 16),
+            max_attempts=args.max_attempts or config.get("queue.max_attempts", 3),
+        )
+        print(json.dumps({"enqueued": ids}))
+    elif args.list:
+        print(json.dumps(queue.list(args.list, args.limit), indent=2, ensure_ascii=False))
+    else:
+        print(json.dumps(queue.counts(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
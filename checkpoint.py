@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+from typing import Dict, Any, List, Optional
+from config import Config
+from events import publish
+
+# Parts of the state that repeat the tool outputs already held by its messages
+TOOL_OUTPUT_COPIES = ("tool_results", "log")
+
+
+def _without_outputs(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{k: v for k, v in entry.items() if k != "result"} if "tool_call_id" in entry else entry for entry in entries]
+
+
+def _with_outputs(entries: List[Dict[str, Any]], outputs: Dict[str, str]) -> List[Dict[str, Any]]:
+    return [
+        dict(entry, result=outputs.get(entry["tool_call_id"])) if "tool_call_id" in entry and "result" not in entry else entry
+        for entry in entries
+    ]
+
+
+class SessionCheckpoint:
+    """
+    Durable per-session snapshot of the agent state, rewritten atomically after every step.
+
+    Each tool output is stored once, in the messages; the tool results and log entries that
+    repeat it are written without it and get it back on load.
+    """
+
+    def __init__(self, config: Config, session_id: str):
+        self.config = config
+        self.session_id = session_id
+        self.enabled = config.get("checkpoint.enabled", True)
+        self.save_path = config.get(
+            "checkpoint.save_path",
+            os.path.join(config.get("logging.save_path", "logs/"), "checkpoints"),
+        )
+        self.filepath = os.path.join(self.save_path, f"{session_id}.json")
+
+        if self.enabled:
+            os.makedirs(self.save_path, exist_ok=True)
+
+    def save(self, state: Dict[str, Any]):
+        """Write the state to a temp file, fsync it and rename it over the previous checkpoint"""
+        if not self.enabled:
+            return
+        state = dict(state, **{key: _without_outputs(state[key]) for key in TOOL_OUTPUT_COPIES if key in state})
+
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{self.session_id}.", suffix=".tmp", dir=self.save_path)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.filepath)
+        except Exception as e:
+            publish("checkpoint_error", "error", session_id=self.session_id, message=f"❌ Error saving checkpoint: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Load the last checkpoint of this session, or None if there is none"""
+        if not os.path.exists(self.filepath):
+            return None
+        with open(self.filepath, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        outputs = {m["tool_call_id"]: m["content"] for m in state.get("messages", []) if m.get("role") == "tool"}
+        for key in TOOL_OUTPUT_COPIES:
+            if key in state:
+                state[key] = _with_outputs(state[key], outputs)
+        return state
+
+    def exists(self) -> bool:
+        return os.path.exists(self.filepath)
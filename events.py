@@ -0,0 +1,264 @@
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, TextIO
+from config import Config
+
+LEVELS = {"error": 0, "warning": 1, "info": 2, "debug": 3}
+
+
+def level_value(level: str) -> int:
+    return LEVELS.get(level, LEVELS["info"])
+
+
+class Sink:
+    """Receives every published event at or below its verbosity level"""
+
+    def __init__(self, verbosity: str = "info"):
+        self.verbosity = level_value(verbosity)
+
+    def accepts(self, level: str) -> bool:
+        return level_value(level) <= self.verbosity
+
+    def handle(self, event: Dict[str, Any]):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class NullSink(Sink):
+    """Drops everything; useful for benchmarks"""
+
+    def __init__(self):
+        super().__init__("error")
+        self.verbosity = -1
+
+    def handle(self, event: Dict[str, Any]):
+        pass
+
+
+class QueuedSink(Sink):
+    """
+    A sink whose rendering and writing happen on a background thread.
+
+    handle() only enqueues the event, so formatting and slow writes (a terminal, a disk)
+    stay off the agent loop.
+    """
+
+    def __init__(self, verbosity: str = "info"):
+        super().__init__(verbosity)
+        self.queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self.thread = threading.Thread(target=self._worker, name=type(self).__name__, daemon=True)
+        self.thread.start()
+
+    def handle(self, event: Dict[str, Any]):
+        self.queue.put(event)
+
+    def _worker(self):
+        while True:
+            event = self.queue.get()
+            try:
+                if event is None:
+                    return
+                self.write(event)
+            except Exception as e:
+                sys.stderr.write(f"❌ Error in {type(self).__name__}: {e}\n")
+            finally:
+                self.queue.task_done()
+
+    def write(self, event: Dict[str, Any]):
+        raise NotImplementedError
+
+    def flush(self):
+        """Block until every queued event has been written"""
+        self.queue.join()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+def truncate(text: Any, max_chars: int) -> str:
+    text = text if isinstance(text, str) else json.dumps(text, ensure_ascii=False, default=str)
+    if max_chars and len(text) > max_chars:
+        return f"{text[:max_chars]}… [{len(text) - max_chars} more chars]"
+    return text
+
+
+class ConsoleSink(QueuedSink):
+    """Human-readable console output, with long arguments and results truncated"""
+
+    def __init__(self, verbosity: str = "info", max_chars: int = 1000, stream: Optional[TextIO] = None):
+        super().__init__(verbosity)
+        self.max_chars = max_chars
+        self.stream = stream or sys.stdout
+
+    def render(self, event: Dict[str, Any]) -> str:
+        short = lambda value: truncate(value, self.max_chars)
+        event_type = event["type"]
+        if event_type == "session_started":
+            return f"📝 Session started with ID: {event['session_id']}"
+        if event_type == "session_resumed":
+            return f"📝 Resuming session {event['session_id']} from iteration {event['iteration']}"
+        if event_type == "iteration_started":
+            return f"\n--- Iteration {event['iteration']}/{event['max_iterations']} ---\n"
+        if event_type == "model_text":
+            return f"💬 {short(event['text'])}"
+        if event_type == "tool_started":
+            return f"\nModel requests to call tool:      🛠️ {event['name']}\n\nArguments: {short(event['arguments'])}"
+        if event_type == "tool_cache_hit":
+            return f"\nTool result served from cache: ♻️ {event['name']}"
+        if event_type == "tool_finished":
+            return f"\nTool execution result: 📝 {short(event['result'])}\n"
+        if event_type == "error_feedback":
+            return f"\nErrors:\n{short(event['feedback'])}\n"
+        if event_type == "no_tool_calls":
+            return f"Model did not request tool calls, and did not indicate task completion.\nModel's response:\n{short(event['text'])}"
+        if event_type == "final_answer":
+            answer = json.dumps({"message": event["answer"], "sources": event["sources"]}, indent=2, ensure_ascii=False)
+            return f"\nTask completion detected: 🎉\n{answer}"
+        if event_type == "session_finished":
+            return f"🏁 Session {event['session_id']} {event['status']} after {event['iterations']} iterations"
+        if "message" in event:
+            return short(event["message"])
+        data = {k: v for k, v in event.items() if k not in ("type", "level", "timestamp")}
+        return f"[{event_type}] {short(data)}"
+
+    def write(self, event: Dict[str, Any]):
+        self.stream.write(self.render(event) + "\n")
+        self.stream.flush()
+
+
+class JSONLSink(QueuedSink):
+    """Appends every event as one JSON line"""
+
+    def __init__(self, path: str, verbosity: str = "debug"):
+        super().__init__(verbosity)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, event: Dict[str, Any]):
+        self.file.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        if self.queue.unfinished_tasks <= 1:
+            self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class EventBus:
+    """
+    In-process publish/subscribe bus for agent and tool events.
+
+    Publishing is cheap: an event is only built when some sink wants its level, and
+    queued sinks render it on their own thread.
+    """
+
+    def __init__(self, sinks: Optional[List[Sink]] = None):
+        self.sinks: List[Sink] = list(sinks or [])
+        self.subscribers: List[Callable[[Dict[str, Any]], None]] = []
+        self.lock = threading.Lock()
+
+    def add_sink(self, sink: Sink):
+        with self.lock:
+            self.sinks = self.sinks + [sink]
+
+    def set_sinks(self, sinks: List[Sink]):
+        with self.lock:
+            previous, self.sinks = self.sinks, list(sinks)
+        for sink in previous:
+            sink.close()
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]):
+        with self.lock:
+            self.subscribers = self.subscribers + [callback]
+
+    def unsubscribe(self, callback: Callable[[Dict[str, Any]], None]):
+        with self.lock:
+            self.subscribers = [s for s in self.subscribers if s is not callback]
+
+    def wants(self, level: str) -> bool:
+        return bool(self.subscribers) or any(sink.accepts(level) for sink in self.sinks)
+
+    def publish(self, event_type: str, level: str = "info", **data) -> Optional[Dict[str, Any]]:
+        if not self.wants(level):
+            return None
+        event = {"type": event_type, "level": level, "timestamp": datetime.now().isoformat(), **data}
+        self.dispatch(event)
+        return event
+
+    def dispatch(self, event: Dict[str, Any]):
+        level = event.get("level", "info")
+        for sink in self.sinks:
+            if sink.accepts(level):
+                sink.handle(event)
+        for callback in self.subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                sys.stderr.write(f"❌ Error in event subscriber: {e}\n")
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def sinks_from_config(config: Config, verbosity: Optional[str] = None) -> List[Sink]:
+    verbosity = verbosity or config.get("events.verbosity", "info")
+    sinks: List[Sink] = []
+    for name in config.get("events.sinks", ["console"]):
+        if name == "console":
+            sinks.append(ConsoleSink(verbosity, max_chars=config.get("events.console.max_chars", 1000)))
+        elif name == "jsonl":
+            path = config.get("events.jsonl.path", "logs/events.jsonl")
+            sinks.append(JSONLSink(path, config.get("events.jsonl.verbosity", "debug")))
+        elif name == "null":
+            sinks.append(NullSink())
+        else:
+            raise ValueError(f"Unknown event sink '{name}'")
+    return sinks
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_event_bus(config: Optional[Config] = None) -> EventBus:
+    """Process-wide bus, configured from the "events" section on first use"""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = EventBus(sinks_from_config(config or Config()))
+            atexit.register(_bus.close)
+        return _bus
+
+
+def configure_event_bus(config: Config, verbosity: Optional[str] = None) -> EventBus:
+    """Replace the sinks of the process-wide bus, e.g. to apply a verbosity given on the command line"""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = EventBus()
+            atexit.register(_bus.close)
+    _bus.set_sinks(sinks_from_config(config, verbosity))
+    return _bus
+
+
+def publish(event_type: str, level: str = "info", **data) -> Optional[Dict[str, Any]]:
+    return get_event_bus().publish(event_type, level, **data)
@@ -0,0 +1,217 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Any, Optional, Tuple
+from openai import OpenAI
+from config import Config
+from ratelimit import RetryPolicy, get_rate_limiter, estimate_tokens
+from events import publish
+
+DEFAULT_PROVIDERS = ["gemini", "claude", "qwen"]
+
+
+class ProviderStats:
+    """Rolling latency and error statistics for one provider"""
+
+    def __init__(self, window: int = 200):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.lock = threading.Lock()
+
+    def record_success(self, latency: float):
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(latency)
+
+    def record_error(self):
+        with self.lock:
+            self.requests += 1
+            self.errors += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self.lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def record_hedge_fired(self):
+        with self.lock:
+            self.hedges_fired += 1
+
+    def record_hedge_won(self):
+        with self.lock:
+            self.hedges_won += 1
+
+    def error_rate(self) -> float:
+        with self.lock:
+            return self.errors / self.requests if self.requests else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate(), 4),
+            "latency_p50": round(p50, 3) if p50 is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+        }
+
+
+class ProviderRouter:
+    """
+    Routes chat completion requests over the configured LLM providers.
+
+    Providers are tried in order and the next one takes over when a request fails. With
+    hedging enabled (llm.router.hedge), a second provider is also asked when the first has
+    not answered within its observed p95 latency, and whichever answers first wins. The
+    losing request cannot be aborted and is paid for, so hedging is off by default, and it
+    only starts once a provider has enough latency samples to know what slow means.
+    """
+
+    def __init__(self, config: Config, providers: Optional[List[str]] = None):
+        self.config = config
+        candidates = providers or config.get("llm.router.providers") or DEFAULT_PROVIDERS
+        self.providers = [p for p in candidates if config.get_model(p)]
+        if not self.providers:
+            # Keep the first candidate so errors surface from the API call rather than here
+            self.providers = candidates[:1]
+
+        self.hedge = config.get("llm.router.hedge", False)
+        self.hedge_min_delay = config.get("llm.router.hedge_min_delay", 1.0)
+        self.hedge_min_samples = config.get("llm.router.hedge_min_samples", 20)
+        self.hedge_percentile = config.get("llm.router.hedge_percentile", 95)
+
+        self.clients: Dict[str, OpenAI] = {}
+        self.models: Dict[str, str] = {}
+        self.stats: Dict[str, ProviderStats] = {}
+        for provider in self.providers:
+            self.clients[provider] = OpenAI(
+                api_key=config.get_api_key(provider),
+                base_url=config.get_base_url(provider),
+                timeout=config.get(f"llm.{provider}.timeout", 600),
+                # Retries are handled by retry_policy so they share the rate limiter
+                max_retries=0,
+            )
+            self.models[provider] = config.get_model(provider)
+            self.stats[provider] = ProviderStats()
+
+        self.retry_policy = RetryPolicy.from_config(config)
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.get("llm.router.max_workers", 16),
+            thread_name_prefix="llm",
+        )
+
+    @property
+    def primary(self) -> str:
+        return self.providers[0]
+
+    def get_model(self, provider: Optional[str] = None) -> str:
+        return self.models.get(provider or self.primary)
+
+    def best_provider(self) -> str:
+        """The configured provider with the lowest error rate, ties broken by the configured order"""
+        return min(self.providers, key=lambda p: (round(self.stats[p].error_rate(), 2), self.providers.index(p)))
+
+    def hedge_deadline(self, provider: str) -> Optional[float]:
+        """Seconds to wait for the provider before hedging, or None while its latency is not known well enough"""
+        stats = self.stats[provider]
+        with stats.lock:
+            samples = len(stats.latencies)
+        if samples < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, stats.percentile(self.hedge_percentile))
+
+    def _call(self, provider: str, kwargs: Dict[str, Any]):
+        limiter = get_rate_limiter(provider, self.config)
+        estimated = estimate_tokens(kwargs.get("messages")) + estimate_tokens(kwargs.get("tools") or "")
+        start = time.monotonic()
+        try:
+            response = self.retry_policy.call(
+                self.clients[provider].chat.completions.create,
+                limiter=limiter,
+                tokens=estimated,
+                model=self.models[provider],
+                **kwargs,
+            )
+        except Exception:
+            self.stats[provider].record_error()
+            raise
+        self.stats[provider].record_success(time.monotonic() - start)
+        if getattr(response, "usage", None) and response.usage.total_tokens:
+            limiter.record_usage(estimated, response.usage.total_tokens)
+        return response
+
+    def create(self, **kwargs) -> Tuple[Any, str]:
+        """
+        Send a chat completion request (without "model", which is filled in per provider).
+
+        Returns:
+            Tuple of (response, name of the provider that produced it)
+
+        Raises:
+            RuntimeError: When every provider failed
+        """
+        queue = list(self.providers)
+        pending = {}
+        errors = []
+        hedged_by = None
+
+        def launch():
+            provider = queue.pop(0)
+            pending[self.executor.submit(self._call, provider, kwargs)] = provider
+            return provider
+
+        first = launch()
+        while pending:
+            timeout = None
+            if self.hedge and queue and hedged_by is None and len(pending) == 1:
+                timeout = self.hedge_deadline(first)
+
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                self.stats[first].record_hedge_fired()
+                hedged_by = launch()
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    errors.append(f"{provider}: {str(e)}")
+                    publish("provider_failed", "warning", provider=provider, message=f"⚠️ Provider {provider} failed: {e}")
+                    if not pending and queue:
+                        # Fail over to the next provider
+                        first = launch()
+                    continue
+                if provider == hedged_by:
+                    self.stats[provider].record_hedge_won()
+                # A losing hedged request that already started keeps running in its worker; its result is discarded
+                for future in pending:
+                    future.cancel()
+                return response, provider
+
+        raise RuntimeError("All LLM providers failed: " + "; ".join(errors))
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {provider: self.stats[provider].to_dict() for provider in self.providers}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router(config: Optional[Config] = None) -> ProviderRouter:
+    """Process-wide router, so every session and tool shares the same clients and statistics"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ProviderRouter(config or Config())
+        return _router
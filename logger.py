@@ -4,12 +4,13 @@ import uuid
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from config import Config
+from events import publish
 
 
 class MessageLogger:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, session_id: Optional[str] = None):
         self.config = config
-        self.session_id = self._generate_session_id()
+        self.session_id = session_id or self._generate_session_id()
         self.session_start_time = datetime.now()
         self.messages_log = []
         self.log_enabled = config.get("logging.enabled", True)
@@ -42,7 +43,7 @@ class MessageLogger:
         
         self.messages_log.append(log_entry)
     
-    def log_tool_call(self, tool_name: str, arguments: Dict[str, Any], result: Any):
+    def log_tool_call(self, tool_name: str, arguments: Dict[str, Any], result: Any, cached: bool = False, tool_call_id: Optional[str] = None):
         """Log tool call and result"""
         if not self.log_enabled or not self.include_tool_calls:
             return
@@ -53,12 +54,15 @@ class MessageLogger:
             "message_type": "tool_call",
             "tool_name": tool_name,
             "arguments": arguments,
-            "result": result
+            "result": result,
+            "cached": cached
         }
+        if tool_call_id:
+            log_entry["tool_call_id"] = tool_call_id
         
         self.messages_log.append(log_entry)
     
-    def log_session_start(self, user_prompt: str, system_prompt: str, provider: str, model: str):
+    def log_session_start(self, user_prompt: str, system_prompt: str, provider: str, model: str, parent_session_id: Optional[str] = None):
         """Log session start information"""
         if not self.log_enabled:
             return
@@ -72,6 +76,8 @@ class MessageLogger:
             "provider": provider,
             "model": model
         }
+        if parent_session_id:
+            session_info["parent_session_id"] = parent_session_id
         
         self.messages_log.append(session_info)
     
@@ -116,9 +122,14 @@ class MessageLogger:
         try:
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(log_data, f, indent=2, ensure_ascii=False)
-            print(f"\n📝 Session log saved to: {filepath}")
+            publish("log_saved", "info", session_id=self.session_id, path=filepath, message=f"\n📝 Session log saved to: {filepath}")
         except Exception as e:
-            print(f"❌ Error saving log: {e}")
+            publish("log_error", "error", session_id=self.session_id, message=f"❌ Error saving log: {e}")
+    
+    def restore(self, messages_log: List[Dict[str, Any]], session_start_time: str):
+        """Restore the log buffer of a resumed session"""
+        self.messages_log = list(messages_log)
+        self.session_start_time = datetime.fromisoformat(session_start_time)
     
     def get_session_id(self) -> str:
         """Get current session ID"""
@@ -0,0 +1,242 @@
+import cProfile
+import functools
+import json
+import os
+import re
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+from config import Config
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MB = 1024 * 1024
+TRACE_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+# tracemalloc is process-wide; it runs while any profiled session needs it
+_tracing_sessions = 0
+_tracing_lock = threading.Lock()
+
+
+def _start_tracing(frames: int) -> bool:
+    global _tracing_sessions
+    with _tracing_lock:
+        if _tracing_sessions == 0 and tracemalloc.is_tracing():
+            # Someone else is tracing; leave it to them
+            return False
+        if _tracing_sessions == 0:
+            tracemalloc.start(frames)
+        _tracing_sessions += 1
+        return True
+
+
+def _stop_tracing():
+    global _tracing_sessions
+    with _tracing_lock:
+        _tracing_sessions -= 1
+        if _tracing_sessions == 0:
+            tracemalloc.stop()
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of the process in bytes (the peak where the current value is not available)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+    return None
+
+
+def _json_size(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False, default=str))
+
+
+class SessionProfiler:
+    """
+    Resource profile of one agent session, enabled with profiling.enabled in config.yaml.
+
+    After every iteration it records wall and CPU time, process RSS, the Python heap traced
+    by tracemalloc with its top allocation sites, and the size of the session's messages,
+    log buffer and tool results, so memory growth can be pinned on one of them. cProfile
+    can cover the agent loop ("session") or individual tool calls ("tool"); dumps are
+    written to profiling.dump_dir for pstats or snakeviz.
+    """
+
+    def __init__(self, config: Config, session_id: str):
+        self.session_id = session_id
+        self.enabled = config.get("profiling.enabled", False)
+        self.trace_memory = config.get("profiling.tracemalloc", True)
+        self.trace_frames = config.get("profiling.tracemalloc_frames", 1)
+        self.top_allocations = config.get("profiling.top_allocations", 5)
+        self.cprofile = config.get("profiling.cprofile") or None
+        self.cprofile_tools = config.get("profiling.cprofile_tools") or []
+        self.dump_dir = config.get("profiling.dump_dir") or os.path.join(config.get("logging.save_path", "logs/"), "profiles")
+
+        self.iterations: List[Dict[str, Any]] = []
+        self.dumps: List[str] = []
+        self.tracing = False
+        self.session_profile: Optional[cProfile.Profile] = None
+        self.last_snapshot: Optional[tracemalloc.Snapshot] = None
+        self.last_wall = self.last_cpu = 0.0
+
+    def start(self):
+        if not self.enabled:
+            return
+        if self.trace_memory and not self.tracing:
+            self.tracing = _start_tracing(self.trace_frames)
+        if self.cprofile == "session" and self.session_profile is None:
+            self.session_profile = self._enable_profile()
+        self.last_wall = time.monotonic()
+        self.last_cpu = time.process_time()
+
+    def _enable_profile(self) -> Optional[cProfile.Profile]:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active in this thread
+            return None
+        return profile
+
+    def _dump(self, profile: cProfile.Profile, name: str) -> str:
+        os.makedirs(self.dump_dir, exist_ok=True)
+        path = os.path.join(self.dump_dir, f"{name}.prof")
+        profile.dump_stats(path)
+        self.dumps.append(path)
+        return path
+
+    def sample(self, iteration: int, messages: List[Dict[str, Any]], log: List[Dict[str, Any]], tool_results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Record the resources used by the iteration just finished"""
+        if not self.enabled:
+            return None
+        if self.session_profile is not None:
+            # Keep the profiler's own snapshots out of the session profile
+            self.session_profile.disable()
+        now_wall, now_cpu = time.monotonic(), time.process_time()
+        record = {
+            "iteration": iteration,
+            "wall_seconds": round(now_wall - self.last_wall, 3),
+            # Process-wide, so it includes the tool worker threads
+            "cpu_seconds": round(now_cpu - self.last_cpu, 3),
+            "rss_mb": None,
+            "heap_mb": None,
+            "heap_peak_mb": None,
+            "messages": len(messages),
+            "messages_kb": round(_json_size(messages) / 1024, 1),
+            "log_entries": len(log),
+            "log_kb": round(_json_size(log) / 1024, 1),
+            "tool_results_kb": round(_json_size(tool_results) / 1024, 1),
+            "top_allocations": [],
+        }
+        self.last_wall, self.last_cpu = now_wall, now_cpu
+        rss = current_rss()
+        if rss is not None:
+            record["rss_mb"] = round(rss / MB, 1)
+
+        if self.tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            record["heap_mb"] = round(current / MB, 2)
+            record["heap_peak_mb"] = round(peak / MB, 2)
+            tracemalloc.reset_peak()
+            snapshot = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+            if self.last_snapshot is None:
+                stats = snapshot.statistics("lineno")[:self.top_allocations]
+                record["top_allocations"] = [
+                    {"site": str(stat.traceback), "kb": round(stat.size / 1024, 1), "count": stat.count}
+                    for stat in stats
+                ]
+            else:
+                # Sites that grew most since the last iteration
+                stats = snapshot.compare_to(self.last_snapshot, "lineno")[:self.top_allocations]
+                record["top_allocations"] = [
+                    {"site": str(stat.traceback), "kb": round(stat.size / 1024, 1), "growth_kb": round(stat.size_diff / 1024, 1), "count": stat.count}
+                    for stat in stats
+                ]
+            self.last_snapshot = snapshot
+
+        self.iterations.append(record)
+        if self.session_profile is not None:
+            self.session_profile.enable()
+        return record
+
+    def wrap_tool(self, name: str, iteration: int, call_id: str, func: Callable, is_async: bool) -> Callable:
+        """The tool function, profiled with cProfile in the thread that runs it when tool profiling is on"""
+        if not self.enabled or self.cprofile != "tool" or (self.cprofile_tools and name not in self.cprofile_tools):
+            return func
+        # The call id keeps parallel calls of one tool in the same turn apart
+        safe_call_id = re.sub(r"[^\w-]", "_", call_id)
+        dump_name = f"{self.session_id}_{iteration:03d}_{name}_{safe_call_id}"
+
+        if is_async:
+            @functools.wraps(func)
+            async def profiled_async(*args, **kwargs):
+                profile = self._enable_profile()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    if profile:
+                        profile.disable()
+                        self._dump(profile, dump_name)
+            return profiled_async
+
+        @functools.wraps(func)
+        def profiled(*args, **kwargs):
+            profile = self._enable_profile()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if profile:
+                    profile.disable()
+                    self._dump(profile, dump_name)
+        return profiled
+
+    def stop(self) -> Optional[Dict[str, Any]]:
+        """Stop profiling; returns the summary for the session log"""
+        if not self.enabled:
+            return None
+        if self.session_profile is not None:
+            self.session_profile.disable()
+            self._dump(self.session_profile, self.session_id)
+            self.session_profile = None
+        if self.tracing:
+            _stop_tracing()
+            self.tracing = False
+        self.last_snapshot = None
+
+        rss = [r["rss_mb"] for r in self.iterations if r["rss_mb"] is not None]
+        return {
+            "iterations": len(self.iterations),
+            "wall_seconds": round(sum(r["wall_seconds"] for r in self.iterations), 3),
+            "cpu_seconds": round(sum(r["cpu_seconds"] for r in self.iterations), 3),
+            "rss_growth_mb": round(rss[-1] - rss[0], 1) if len(rss) > 1 else None,
+            "max_heap_peak_mb": max((r["heap_peak_mb"] for r in self.iterations if r["heap_peak_mb"] is not None), default=None),
+            "cprofile_dumps": self.dumps,
+        }
+
+    def format_table(self) -> str:
+        columns = [
+            ("iter", "iteration"), ("wall s", "wall_seconds"), ("cpu s", "cpu_seconds"), ("rss MB", "rss_mb"),
+            ("heap MB", "heap_mb"), ("peak MB", "heap_peak_mb"), ("msgs", "messages"), ("msgs KB", "messages_kb"),
+            ("log KB", "log_kb"), ("tools KB", "tool_results_kb"),
+        ]
+        rows = [[title for title, _ in columns]]
+        rows += [["-" if r[key] is None else str(r[key]) for _, key in columns] for r in self.iterations]
+        widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+        lines = ["  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows]
+        lines.insert(1, "  ".join("-" * width for width in widths))
+        return "\n".join(lines)
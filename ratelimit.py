@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+from config import Config
+from events import publish
+
+# Transient network failures from openai, requests, httpx and the standard library
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "ConnectionError", "Timeout", "TimeoutError", "TimeoutException"}
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """A bucket refilled continuously at `per_minute` units per minute, holding at most a minute's worth"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        # A single request larger than the whole bucket only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one provider, shared by every thread"""
+
+    def __init__(self, name: str, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.condition = threading.Condition()
+        self.waited = 0.0
+
+    def acquire(self, tokens: float = 0, blocking: bool = True) -> bool:
+        """Take one request (and an estimated number of tokens) from the buckets, waiting if needed"""
+        with self.condition:
+            while True:
+                wait = 0.0
+                if self.requests:
+                    wait = max(wait, self.requests.wait_time(1))
+                if self.tokens and tokens:
+                    wait = max(wait, self.tokens.wait_time(tokens))
+                if wait <= 0:
+                    if self.requests:
+                        self.requests.consume(1)
+                    if self.tokens and tokens:
+                        self.tokens.consume(tokens)
+                    return True
+                if not blocking:
+                    return False
+                self.waited += wait
+                self.condition.wait(timeout=wait)
+
+    def record_usage(self, estimated_tokens: float, actual_tokens: float):
+        """Correct the token bucket once the real usage of a request is known"""
+        if not self.tokens:
+            return
+        with self.condition:
+            self.tokens.consume(actual_tokens - estimated_tokens)
+            self.condition.notify_all()
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, config: Optional[Config] = None) -> RateLimiter:
+    """Process-wide limiter for a provider, configured from rate_limits.<name> in config.yaml"""
+    with _limiters_lock:
+        if name not in _limiters:
+            config = config or Config()
+            _limiters[name] = RateLimiter(
+                name,
+                requests_per_minute=config.get(f"rate_limits.{name}.requests_per_minute"),
+                tokens_per_minute=config.get(f"rate_limits.{name}.tokens_per_minute"),
+            )
+        return _limiters[name]
+
+
+def estimate_tokens(payload: Any) -> int:
+    """Rough token estimate (about four characters per token) used to pre-charge the token bucket"""
+    return max(1, len(str(payload)) // 4)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class RetryPolicy:
+    """Retries transient failures, honoring Retry-After and otherwise backing off exponentially with full jitter"""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls, config: Config) -> "RetryPolicy":
+        return cls(
+            max_attempts=config.get("retry.max_attempts", 4),
+            base_delay=config.get("retry.base_delay", 1.0),
+            max_delay=config.get("retry.max_delay", 60.0),
+        )
+
+    def delay(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, func: Callable, *args, limiter: Optional[RateLimiter] = None, tokens: float = 0, **kwargs):
+        """Call func, acquiring from the limiter before every attempt and retrying transient errors"""
+        for attempt in range(self.max_attempts):
+            if limiter:
+                limiter.acquire(tokens)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt + 1 >= self.max_attempts or not is_retryable(e):
+                    raise
+                delay = self.delay(attempt, e)
+                publish(
+                    "retry",
+                    "warning",
+                    attempt=attempt + 1,
+                    delay=delay,
+                    message=f"⏳ Retrying in {delay:.1f}s after error ({attempt + 1}/{self.max_attempts - 1}): {e}",
+                )
+                time.sleep(delay)
@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+from config import Config
+from events import LEVELS, configure_event_bus, publish
+from agent import AgentSession
+from llm import get_router
+from tools import available_functions
+
+MAX_BODY_BYTES = 1024 * 1024
+SSE_KEEPALIVE_SECONDS = 15
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+
+class ManagedSession:
+    """An AgentSession plus the bookkeeping the server needs to report and stream it"""
+
+    def __init__(self, session: AgentSession, max_events: int):
+        self.session = session
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        # Replayed to streams that connect late; only the latest max_events are kept
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        session = self.session
+        return {
+            "session_id": session.session_id,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "iteration": session.iteration,
+            "max_iterations": session.max_iterations,
+            "task_complete": session.task_complete,
+            "answer": session.task_message if session.task_complete else None,
+            "sources": session.task_sources,
+            "usage": session.usage,
+            "error": self.error,
+        }
+
+
+class SessionEngine:
+    """
+    Runs many agent sessions in one process.
+
+    Each session's loop runs on a worker thread, at most max_concurrency at a time; further
+    sessions wait in a queue of at most max_queued, beyond which new sessions are refused.
+    Events published by the sessions are fanned out to every subscribed stream; a stream
+    whose client falls max_stream_backlog events behind is dropped.
+
+    Model output is streamed per turn as one model_text event, not token by token: the router
+    picks the winning provider only once a response is complete (failover and hedging), so
+    partial text from a request that is later discarded is never sent.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.router = get_router(config)
+        self.max_concurrency = config.get("server.max_concurrency", 4)
+        self.max_queued = config.get("server.max_queued", 32)
+        self.max_iterations = config.get("server.max_iterations", 16)
+        self.max_finished = config.get("server.max_finished", 1000)
+        self.max_events = config.get("server.max_events", 1000)
+        self.max_stream_backlog = config.get("server.max_stream_backlog", 1000)
+        self.sessions: Dict[str, ManagedSession] = {}
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="session")
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        self.loop = asyncio.get_running_loop()
+
+    def count(self, status: str) -> int:
+        return sum(1 for managed in self.sessions.values() if managed.status == status)
+
+    def create(self, prompt: str, max_iterations: Optional[int] = None, tools: Optional[List[str]] = None) -> ManagedSession:
+        if self.count("queued") >= self.max_queued:
+            raise OverflowError("Too many queued sessions, try again later")
+
+        session = AgentSession(
+            self.config,
+            self.router,
+            user_prompt=prompt,
+            max_iterations=min(int(max_iterations or self.max_iterations), self.max_iterations),
+            tool_names=tools,
+        )
+        managed = ManagedSession(session, self.max_events)
+        session.event_handlers.append(lambda event: self.loop.call_soon_threadsafe(self.publish, managed, event))
+        self.sessions[session.session_id] = managed
+        managed.task = asyncio.create_task(self.run(managed))
+        return managed
+
+    def publish(self, managed: ManagedSession, event: Dict[str, Any]):
+        managed.events.append(event)
+        for queue in list(managed.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # The client is not reading; cut it off rather than buffer the session for it
+                managed.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "stream_dropped", "session_id": managed.session.session_id, "reason": "Client too slow, reconnect to replay the events"})
+
+    async def run(self, managed: ManagedSession):
+        async with self.slots:
+            if managed.session.cancel_requested:
+                managed.status = "cancelled"
+            else:
+                managed.status = "running"
+                try:
+                    await self.loop.run_in_executor(self.executor, managed.session.run)
+                    managed.status = managed.session.status
+                except Exception as e:
+                    managed.status = "failed"
+                    managed.error = str(e)
+        self.publish(managed, {"type": "session_closed", "session_id": managed.session.session_id, "status": managed.status, "error": managed.error})
+        self.prune()
+
+    def prune(self):
+        """Forget the oldest finished sessions beyond max_finished; their logs and checkpoints stay on disk"""
+        finished = [sid for sid, m in self.sessions.items() if m.status in TERMINAL_STATUSES and not m.subscribers]
+        for session_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.sessions[session_id]
+
+    def cancel(self, session_id: str) -> Optional[ManagedSession]:
+        managed = self.sessions.get(session_id)
+        if managed is not None and managed.status not in TERMINAL_STATUSES:
+            managed.session.cancel()
+        return managed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queued": self.max_queued,
+            "running": self.count("running"),
+            "queued": self.count("queued"),
+            "total": len(self.sessions),
+            "providers": self.router.get_stats(),
+        }
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+STATUS_TEXT = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+async def read_request(reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes]:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), urlsplit(target).path, headers, body
+
+
+async def send_json(writer: asyncio.StreamWriter, status: int, data: Any):
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+
+
+async def stream_events(writer: asyncio.StreamWriter, managed: ManagedSession, max_backlog: int):
+    """Server-sent events: replay what already happened, then follow the session until it closes"""
+    writer.write(
+        b"HTTP/1.1 200 OK\r\n"
+        b"Content-Type: text/event-stream\r\n"
+        b"Cache-Control: no-cache\r\n"
+        b"Connection: close\r\n\r\n"
+    )
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_backlog)
+    backlog = list(managed.events)
+    managed.subscribers.add(queue)
+    try:
+        for event in backlog:
+            writer.write(f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+        await writer.drain()
+        if backlog and backlog[-1]["type"] == "session_closed":
+            return
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                writer.write(b": keepalive\n\n")
+                await writer.drain()
+                continue
+            writer.write(f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            if event["type"] == "stream_dropped":
+                # Closing does not wait for a client that is not reading
+                return
+            await writer.drain()
+            if event["type"] == "session_closed":
+                return
+    finally:
+        managed.subscribers.discard(queue)
+
+
+async def handle(engine: SessionEngine, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        method, path, headers, body = await read_request(reader)
+        parts = [part for part in path.split("/") if part]
+
+        if parts == ["health"] and method == "GET":
+            await send_json(writer, 200, engine.stats())
+        elif parts == ["sessions"] and method == "GET":
+            await send_json(writer, 200, {"sessions": [m.to_dict() for m in engine.sessions.values()]})
+        elif parts == ["sessions"] and method == "POST":
+            try:
+                payload = json.loads(body or b"{}")
+            except json.JSONDecodeError:
+                raise HTTPError(400, "Request body must be JSON")
+            if not isinstance(payload, dict) or not isinstance(payload.get("prompt"), str) or not payload["prompt"].strip():
+                raise HTTPError(400, "'prompt' is required")
+            max_iterations = payload.get("max_iterations")
+            if max_iterations is not None and (type(max_iterations) is not int or max_iterations < 1):
+                raise HTTPError(400, "'max_iterations' must be a positive integer")
+            tools = payload.get("tools")
+            if tools is not None and (not isinstance(tools, list) or not all(isinstance(name, str) for name in tools)):
+                raise HTTPError(400, "'tools' must be a list of tool names")
+            unknown = [name for name in tools or [] if name not in available_functions]
+            if unknown:
+                raise HTTPError(400, f"Unknown tools: {', '.join(unknown)}")
+            try:
+                managed = engine.create(payload["prompt"], max_iterations, tools)
+            except OverflowError as e:
+                raise HTTPError(429, str(e))
+            await send_json(writer, 202, managed.to_dict())
+        elif len(parts) >= 2 and parts[0] == "sessions":
+            managed = engine.sessions.get(parts[1])
+            if managed is None:
+                raise HTTPError(404, f"Unknown session '{parts[1]}'")
+            if len(parts) == 2 and method == "GET":
+                await send_json(writer, 200, managed.to_dict())
+            elif (len(parts) == 2 and method == "DELETE") or (parts[2:] == ["cancel"] and method == "POST"):
+                engine.cancel(parts[1])
+                await send_json(writer, 202, managed.to_dict())
+            elif parts[2:] == ["events"] and method == "GET":
+                await stream_events(writer, managed, engine.max_stream_backlog)
+            else:
+                raise HTTPError(405, "Method not allowed")
+        else:
+            raise HTTPError(404, "Not found")
+    except HTTPError as e:
+        await send_json(writer, e.status, {"error": str(e)})
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    except Exception as e:
+        try:
+            await send_json(writer, 500, {"error": str(e)})
+        except ConnectionError:
+            pass
+    finally:
+        writer.close()
+
+
+async def serve(config: Config, host: str, port: int):
+    engine = SessionEngine(config)
+    server = await asyncio.start_server(lambda r, w: handle(engine, r, w), host, port)
+    publish("server_started", host=host, port=port, message=f"🚀 Agent server listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    config = Config()
+    parser = argparse.ArgumentParser(description="Serve agent sessions over HTTP with server-sent events.")
+    parser.add_argument("--host", default=config.get("server.host", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=config.get("server.port", 8000))
+    parser.add_argument("--verbosity", choices=list(LEVELS), help="Console verbosity (default: events.verbosity or info).")
+    args = parser.parse_args()
+    configure_event_bus(config, args.verbosity)
+    asyncio.run(serve(config, args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
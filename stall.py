@@ -0,0 +1,206 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+from config import Config
+
+NO_TOOL_CALLS = "no_tool_calls"
+
+
+def _digest(value: str) -> str:
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def call_fingerprint(name: str, arguments: str) -> str:
+    """Hash of a tool call that ignores argument order and surrounding whitespace"""
+    try:
+        args = json.loads(arguments or "{}")
+    except json.JSONDecodeError:
+        args = arguments
+    if isinstance(args, dict):
+        args = {key: value.strip() if isinstance(value, str) else value for key, value in args.items()}
+    return _digest(name + json.dumps(args, sort_keys=True, ensure_ascii=False))
+
+
+def _error_of(result: str) -> Optional[str]:
+    try:
+        result_json = json.loads(result)
+    except (json.JSONDecodeError, TypeError):
+        return str(result)
+    if not isinstance(result_json, dict):
+        return str(result)
+    if "error" in result_json:
+        return str(result_json["error"])
+    # A background job that is still running reports no exit code yet
+    if result_json.get("returncode") not in (None, 0):
+        return str(result_json.get("stderr") or f"exit code {result_json['returncode']}")
+    return None
+
+
+class StallDetector:
+    """
+    Notices when an agent session stops making progress.
+
+    Every turn is fingerprinted by its tool calls and their results. A turn makes progress
+    when it yields a successful result not seen before in the session. The detector flags
+    a call repeated with an identical outcome, two actions alternating, and a run of turns
+    with no new result; the session answers each with a corrective message, and gives up
+    on further research once corrections keep failing. The same progress record decides
+    whether a session that reaches its iteration limit is granted more turns.
+    """
+
+    def __init__(self, config: Config):
+        self.enabled = config.get("agent.stall.enabled", True)
+        self.repeat_threshold = config.get("agent.stall.repeat_threshold", 2)
+        self.no_progress_turns = config.get("agent.stall.no_progress_turns", 4)
+        self.max_interventions = config.get("agent.stall.max_interventions", 2)
+        self.extend_by = config.get("agent.stall.extend_by", 4)
+        self.max_extensions = config.get("agent.stall.max_extensions", 2)
+        self.progress_window = config.get("agent.stall.progress_window", 3)
+
+        self.calls: Dict[str, Dict[str, Any]] = {}
+        self.results: List[str] = []
+        self.turns: List[Dict[str, Any]] = []
+        self.interventions = 0
+        self.interventions_since_progress = 0
+        self.extensions = 0
+        # Number of turns observed when the last corrective message was sent
+        self.corrected_at = 0
+        self.events: List[Dict[str, Any]] = []
+
+    def get_state(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "results": self.results,
+            "turns": self.turns,
+            "interventions": self.interventions,
+            "interventions_since_progress": self.interventions_since_progress,
+            "extensions": self.extensions,
+            "corrected_at": self.corrected_at,
+            "events": self.events,
+        }
+
+    def restore(self, state: Dict[str, Any]):
+        for key, value in state.items():
+            setattr(self, key, value)
+
+    def observe(self, iteration: int, tool_results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Record a turn's tool results; returns the stall it reveals, if any"""
+        if not self.enabled:
+            return None
+
+        known_results = set(self.results)
+        progress = False
+        repeats = []
+        fingerprints = []
+        for entry in tool_results:
+            fingerprint = call_fingerprint(entry["name"], entry["arguments"])
+            outcome = _digest(entry["result"])
+            error = _error_of(entry["result"])
+            fingerprints.append(fingerprint)
+
+            call = self.calls.setdefault(fingerprint, {"name": entry["name"], "count": 0, "same_outcome": 0, "outcome": None})
+            call["count"] += 1
+            call["same_outcome"] = call["same_outcome"] + 1 if call["outcome"] == outcome else 1
+            call["outcome"] = outcome
+            if call["same_outcome"] >= self.repeat_threshold:
+                repeats.append((call, error))
+
+            if error is None and outcome not in known_results:
+                progress = True
+                known_results.add(outcome)
+                self.results.append(outcome)
+
+        turn = {"iteration": iteration, "fingerprint": _digest("|".join(sorted(fingerprints))) if fingerprints else NO_TOOL_CALLS, "progress": progress}
+        turn["names"] = sorted({entry["name"] for entry in tool_results})
+        self.turns.append(turn)
+        if progress:
+            self.interventions_since_progress = 0
+            return None
+        return self._find_stall(repeats)
+
+    def _find_stall(self, repeats: List) -> Optional[Dict[str, Any]]:
+        if repeats:
+            call, error = max(repeats, key=lambda item: item[0]["same_outcome"])
+            if error is not None:
+                return {
+                    "kind": "repeated_error",
+                    "tool": call["name"],
+                    "count": call["same_outcome"],
+                    "message": (
+                        f"`{call['name']}` has now failed {call['same_outcome']} times with the same arguments and the same error: "
+                        f"{error[:300]}\nDo not retry it unchanged. Fix the cause, use different arguments or another tool, "
+                        "or call final_answer if you already have enough to answer."
+                    ),
+                }
+            return {
+                "kind": "repeated_call",
+                "tool": call["name"],
+                "count": call["same_outcome"],
+                "message": (
+                    f"You have called `{call['name']}` with the same arguments {call['same_outcome']} times and got the same result "
+                    "each time. Repeating it gives no new information. Use what it returned, change the arguments, "
+                    "try a different tool, or call final_answer if you already have enough to answer."
+                ),
+            }
+
+        # Turns up to a correction have been dealt with; give the model room to act on it
+        since_correction = self.turns[self.corrected_at:]
+        recent = [turn["fingerprint"] for turn in since_correction[-4:]]
+        if len(recent) == 4 and recent[0] == recent[2] and recent[1] == recent[3] and recent[0] != recent[1]:
+            actions = " / ".join(", ".join(turn["names"]) or "no tool" for turn in since_correction[-2:])
+            return {
+                "kind": "oscillation",
+                "tools": actions,
+                "message": (
+                    f"Your last four turns alternate between the same two actions ({actions}) without producing anything new. "
+                    "Break the cycle: take a substantially different approach, or call final_answer with the best answer you have."
+                ),
+            }
+
+        stalled = since_correction[-self.no_progress_turns:]
+        if len(stalled) == self.no_progress_turns and not any(turn["progress"] for turn in stalled):
+            return {
+                "kind": "no_progress",
+                "turns": self.no_progress_turns,
+                "message": (
+                    f"The last {self.no_progress_turns} turns produced no new information. Step back and revise your plan: "
+                    "try a substantially different approach, or call final_answer with the best answer you have."
+                ),
+            }
+        return None
+
+    def record(self, iteration: int, stall: Dict[str, Any], action: str) -> Dict[str, Any]:
+        event = dict(stall, iteration=iteration, action=action)
+        event.pop("message", None)
+        self.events.append(event)
+        if action == "corrected":
+            self.interventions += 1
+            self.interventions_since_progress += 1
+            self.corrected_at = len(self.turns)
+        return event
+
+    def should_abort(self) -> bool:
+        """Corrections have not brought the session back on track"""
+        return self.interventions_since_progress >= self.max_interventions
+
+    def recent_progress(self) -> int:
+        """Turns with new results among the last progress_window"""
+        return sum(1 for turn in self.turns[-self.progress_window:] if turn["progress"])
+
+    def can_extend(self) -> bool:
+        """The session is still finding new things, so a few more turns are likely to pay off"""
+        return (
+            self.enabled
+            and self.extensions < self.max_extensions
+            and self.interventions_since_progress == 0
+            and self.recent_progress() > 0
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "turns": len(self.turns),
+            "progress_turns": sum(1 for turn in self.turns if turn["progress"]),
+            "interventions": self.interventions,
+            "extensions": self.extensions,
+            "events": self.events,
+        }
@@ -0,0 +1,104 @@
+import json
+import math
+import wave
+import threading
+from array import array
+import pytest
+from tools import audio, config as tools_config
+
+RATE = 16000
+# Each spoken segment is a tone whose loudness tells the stub which word it is
+WORDS = {4000: "one", 8000: "two", 12000: "three"}
+
+
+class StubBackend(audio.TranscriptionBackend):
+    """Transcribes a chunk to the words of the tones in it, without any service"""
+
+    name = "stub"
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def transcribe(self, audio_path: str) -> str:
+        with self.lock:
+            self.calls.append(audio_path)
+        with wave.open(audio_path, "rb") as wav:
+            samples = array("h")
+            samples.frombytes(wav.readframes(wav.getnframes()))
+        words = []
+        window = RATE // 10
+        for start in range(0, len(samples) - window + 1, window):
+            peak = max(abs(s) for s in samples[start:start + window])
+            word = next((w for amplitude, w in WORDS.items() if abs(peak - amplitude) < 500), None)
+            if word and (not words or words[-1] != word):
+                words.append(word)
+        return " ".join(words)
+
+
+def write_speech(path, seconds_per_word=1.0, pause_seconds=0.3):
+    samples = array("h")
+    for index, amplitude in enumerate(WORDS):
+        if index:
+            samples.extend([0] * int(pause_seconds * RATE))
+        samples.extend(int(amplitude * math.sin(2 * math.pi * 440 * i / RATE)) for i in range(int(seconds_per_word * RATE)))
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(samples.tobytes())
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(tools_config, "WORKSPACE_DIR", str(tmp_path))
+    monkeypatch.setattr(audio, "TRANSCRIPT_CACHE_DIR", str(tmp_path / "transcripts"))
+    monkeypatch.setattr(audio, "CHUNK_SECONDS", 1.0)
+    monkeypatch.setattr(audio, "SILENCE_SEARCH_SECONDS", 0.4)
+    monkeypatch.setattr(audio.shutil, "which", lambda name: None)
+    stub = StubBackend()
+    original = audio._backend
+    audio.set_transcription_backend(stub)
+    yield stub
+    audio.set_transcription_backend(original)
+
+
+def test_long_audio_is_split_at_pauses(tmp_path, backend):
+    path = tmp_path / "speech.wav"
+    write_speech(path)
+    chunks = audio.split_on_silence(str(path), str(tmp_path))
+    assert len(chunks) == 3
+    assert [backend.transcribe(chunk) for chunk in chunks] == ["one", "two", "three"]
+
+
+def test_chunks_are_transcribed_in_order_and_cached(tmp_path, backend):
+    path = tmp_path / "speech.wav"
+    write_speech(path)
+
+    result = json.loads(audio.transcribe_audio(str(path)))
+    assert result["success"]
+    assert result["audio_text"] == "one two three"
+    assert result["chunks"] == 3 and not result["cached"]
+    assert len(backend.calls) == 3
+
+    result = json.loads(audio.transcribe_audio(str(path)))
+    assert result["audio_text"] == "one two three" and result["cached"]
+    assert len(backend.calls) == 3
+
+
+def test_short_audio_is_sent_whole(tmp_path, backend):
+    path = tmp_path / "short.wav"
+    write_speech(path, seconds_per_word=0.2, pause_seconds=0.1)
+    result = json.loads(audio.transcribe_audio(str(path)))
+    assert result["audio_text"] == "one two three"
+    assert result["chunks"] == 1
+
+
+def test_paths_outside_the_workspace_are_refused(tmp_path, backend):
+    path = tmp_path.parent / "outside.wav"
+    write_speech(path, seconds_per_word=0.2, pause_seconds=0.1)
+    result = json.loads(audio.transcribe_audio(str(path)))
+    assert "out of allowed range" in result["error"]
+    result = json.loads(audio.transcribe_audio("../outside.wav"))
+    assert "out of allowed range" in result["error"]
+    assert not backend.calls
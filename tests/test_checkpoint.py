@@ -0,0 +1,43 @@
+import json
+from checkpoint import SessionCheckpoint
+from config import Config
+
+OUTPUT = json.dumps({"success": True, "content": "x" * 10_000})
+
+
+def make_checkpoint(tmp_path):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(f"checkpoint:\n  save_path: {tmp_path / 'checkpoints'}\n")
+    return SessionCheckpoint(Config(str(config_path)), "session_test")
+
+
+def make_state():
+    call = {"iteration": 1, "tool_call_id": "call_1", "name": "read_file", "arguments": "{}", "result": OUTPUT}
+    return {
+        "messages": [
+            {"role": "user", "content": "Read it"},
+            {"tool_call_id": "call_1", "role": "tool", "name": "read_file", "content": OUTPUT},
+        ],
+        "tool_results": [call],
+        "log": [
+            {"message_type": "session_start", "user_prompt": "Read it"},
+            {"message_type": "tool_call", "tool_name": "read_file", "tool_call_id": "call_1", "result": OUTPUT, "cached": False},
+        ],
+    }
+
+
+def test_tool_outputs_are_written_once(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    state = make_state()
+    checkpoint.save(state)
+
+    with open(checkpoint.filepath, encoding="utf-8") as f:
+        assert f.read().count("x" * 10_000) == 1
+    # The live state is left as it was
+    assert state["tool_results"][0]["result"] == OUTPUT
+
+
+def test_tool_outputs_are_restored_from_the_messages(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    checkpoint.save(make_state())
+    assert checkpoint.load() == make_state()
@@ -0,0 +1,47 @@
+from tools.fetch import _ReadableHTMLParser
+
+ARTICLE = "Readable article text. " * 20
+
+
+def extract(html: str) -> str:
+    parser = _ReadableHTMLParser("https://example.com/", markdown=True)
+    parser.feed(html)
+    parser.close()
+    return parser.get_text()
+
+
+def test_wrapper_classes_mentioning_boilerplate_keep_the_page():
+    html = f"""
+    <html><body class="home blog no-sidebar">
+      <div class="site has-sidebar">
+        <nav class="menu"><ul><li>Home<li>About</ul></nav>
+        <div class="content-area"><p>{ARTICLE}</p></div>
+        <div class="sidebar"><p>Recent posts<p>Archives</div>
+        <footer>Copyright</footer>
+      </div>
+    </body></html>
+    """
+    text = extract(html)
+    assert "Readable article text." in text
+    assert "Recent posts" not in text
+    assert "Home" not in text
+    assert "Copyright" not in text
+
+
+def test_content_tags_are_never_boilerplate():
+    html = f'<body><div id="page"><main class="sidebar-layout"><article class="share"><p>{ARTICLE}</p></article></main></div></body>'
+    assert "Readable article text." in extract(html)
+
+
+def test_unclosed_items_in_skipped_sections_do_not_swallow_the_page():
+    html = f'<body><div id="page"><nav><ul><li>Home<li>About</ul></nav><main><p>{ARTICLE}</p></main></div></body>'
+    text = extract(html)
+    assert "Readable article text." in text
+    assert "About" not in text
+
+
+def test_article_header_keeps_its_title():
+    html = f"<body><header>Site name</header><article><header><h1>Title</h1></header><p>{ARTICLE}</p></article></body>"
+    text = extract(html)
+    assert text.startswith("# Title")
+    assert "Site name" not in text
@@ -0,0 +1,162 @@
+import os
+import re
+import mmap
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from tools import file_utils
+
+
+class FileServer(ThreadingHTTPServer):
+    """Serves fixed files with ETag revalidation and, optionally, byte ranges, recording every request"""
+
+    def __init__(self, files, ranges=True):
+        super().__init__(("127.0.0.1", 0), FileHandler)
+        self.files = files
+        self.ranges = ranges
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.server_address[1]}/{name}"
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        data = self.server.files.get(self.path.lstrip("/"))
+        if data is None:
+            self.send_error(404)
+            return
+        etag = '"%s"' % hashlib.sha256(data).hexdigest()[:16]
+        byte_range = self.headers.get("Range")
+        with self.server.lock:
+            self.server.requests.append({"path": self.path, "range": byte_range, "if_none_match": self.headers.get("If-None-Match")})
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)", byte_range or "")
+        if match and self.server.ranges:
+            start, end = int(match.group(1)), int(match.group(2))
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        # Advertised either way, to exercise the fallback when ranges are then ignored
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(files, ranges=True):
+    server = FileServer(files, ranges)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_utils, "DOWNLOAD_CACHE_DIR", str(tmp_path / "downloads"))
+    return tmp_path / "downloads"
+
+
+@pytest.fixture
+def server():
+    files = {"small.bin": os.urandom(10_000), "large.bin": os.urandom(300_000)}
+    server = start_server(files)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_download_is_cached_and_revalidated(server, cache_dir):
+    url = server.url("small.bin")
+    path, headers = file_utils.download_file(url)
+    assert read(path) == server.files["small.bin"]
+    assert os.path.dirname(path) == str(cache_dir / "blobs")
+    assert headers["ETag"]
+
+    cached_path, _ = file_utils.download_file(url)
+    assert cached_path == path
+    assert server.requests[-1]["if_none_match"] == headers["ETag"]
+
+
+def test_changed_file_is_downloaded_again(server, cache_dir):
+    url = server.url("small.bin")
+    first_path, _ = file_utils.download_file(url)
+    server.files["small.bin"] = b"new content"
+    second_path, _ = file_utils.download_file(url)
+    assert second_path != first_path
+    assert read(second_path) == b"new content"
+
+
+def test_large_file_is_fetched_in_ranges(server, cache_dir, monkeypatch):
+    monkeypatch.setattr(file_utils, "RANGE_THRESHOLD", 100_000)
+    monkeypatch.setattr(file_utils, "RANGE_PARTS", 4)
+    path, _ = file_utils.download_file(server.url("large.bin"))
+    assert read(path) == server.files["large.bin"]
+    assert len([r for r in server.requests if r["range"]]) == 4
+
+
+def test_ignored_ranges_fall_back_to_one_stream(cache_dir, monkeypatch):
+    data = os.urandom(300_000)
+    server = start_server({"large.bin": data}, ranges=False)
+    try:
+        monkeypatch.setattr(file_utils, "RANGE_THRESHOLD", 100_000)
+        path, _ = file_utils.download_file(server.url("large.bin"))
+        assert read(path) == data
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_size_limit_is_enforced(server, cache_dir):
+    with pytest.raises(ValueError):
+        file_utils.download_file(server.url("large.bin"), max_size_mb=0.1)
+    assert not [name for name in os.listdir(cache_dir / "blobs") if name.endswith(".part")]
+
+
+def test_least_recently_used_downloads_are_evicted(cache_dir, monkeypatch):
+    files = {f"{i}.bin": os.urandom(40_000) for i in range(3)}
+    server = start_server(files)
+    try:
+        monkeypatch.setattr(file_utils, "MAX_CACHE_BYTES", 100_000)
+        paths = []
+        for i in range(3):
+            path, _ = file_utils.download_file(server.url(f"{i}.bin"))
+            # Modification times drive eviction; keep them apart on coarse filesystems
+            os.utime(path, (i, i))
+            paths.append(path)
+        assert not os.path.exists(paths[0])
+        assert os.path.exists(paths[1]) and os.path.exists(paths[2])
+
+        # The evicted entry is a cache miss and is downloaded again
+        path, _ = file_utils.download_file(server.url("0.bin"))
+        assert read(path) == files["0.bin"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_get_file_from_source_maps_the_file(server, cache_dir):
+    path, mime_type, content = file_utils.get_file_from_source(server.url("small.bin"), type="document")
+    with content:
+        assert isinstance(content, mmap.mmap)
+        assert content[:] == server.files["small.bin"]
+    assert mime_type == "application/octet-stream"
+    assert file_utils.get_path_from_source(server.url("small.bin"), type="document") == (path, mime_type)
@@ -0,0 +1,10 @@
+import tools.dir  # noqa: F401  (registers the tools)
+import tools.retrieval  # noqa: F401
+import tools.workspace_search  # noqa: F401
+from tools.decorator import get_tool_options
+
+
+def test_tools_reading_directory_trees_are_not_memoized():
+    options = get_tool_options()
+    for name in ("list_directory_contents", "search_workspace", "search_documents"):
+        assert not options[name]["memoize"]
@@ -0,0 +1,28 @@
+import os
+from tools import retrieval
+
+
+def broken_pdf_reader(path):
+    raise RuntimeError("PDF support needs the pypdf package or the pdftotext command")
+
+
+def test_failed_extraction_is_retried(tmp_path, monkeypatch):
+    document = tmp_path / "report.pdf"
+    document.write_bytes(b"%PDF-1.4 not really a pdf")
+    index = retrieval.PassageIndex(str(tmp_path / "index"))
+
+    monkeypatch.setattr(retrieval, "_pdf_pages", broken_pdf_reader)
+    documents, errors = index.refresh(str(document))
+    assert not documents
+    assert "pypdf" in errors[str(document)]
+    # Unchanged and still unreadable: the error is reported again, not an empty document
+    os.utime(document)
+    documents, errors = index.refresh(str(document))
+    assert not documents and str(document) in errors
+
+    # Once extraction works, the same content is indexed without touching the file
+    monkeypatch.setattr(retrieval, "_pdf_pages", lambda path: ["Quarterly revenue grew by ten percent."])
+    documents, errors = index.refresh(str(document))
+    assert not errors
+    hits = index.search(documents, "revenue", top_k=1)
+    assert hits and "Quarterly revenue" in hits[0]["text"]
@@ -0,0 +1,100 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set
+from config import Config
+from ratelimit import estimate_tokens
+
+# Keyword-triggered groups of tools; a task mentioning none of the keywords gets every tool
+DEFAULT_PROFILES = {
+    "research": {
+        "keywords": [
+            "search", "find", "look up", "latest", "recent", "news", "paper", "papers", "arxiv", "web",
+            "website", "online", "internet", "huggingface", "github", "wikipedia", "summarize", "summary",
+            "research", "compare", "http", "https", "www",
+        ],
+        "tools": ["web_search", "fetch_url", "browser_use", "search_documents", "delegate"],
+    },
+    "browse": {
+        "keywords": ["browse", "browser", "navigate", "click", "login", "log in", "go to", "page", "site", "screenshot"],
+        "tools": ["browser_use", "fetch_url"],
+    },
+    "files": {
+        "keywords": [
+            "file", "files", "directory", "folder", "read", "write", "save", "workspace", "csv", "json",
+            "pdf", "txt", "xlsx", "excel", "document", "report", "data", "dataset", "table", "spreadsheet", "parquet",
+        ],
+        "tools": ["read_file", "write_file", "list_directory_contents", "search_workspace", "search_documents", "query_table"],
+    },
+    "code": {
+        "keywords": [
+            "code", "python", "script", "run", "execute", "compute", "calculate", "shell", "command",
+            "install", "test", "bug", "program", "plot", "build", "compile", "train", "download",
+        ],
+        "tools": [
+            "execute_python_code", "execute_shell_command", "read_file", "write_file", "list_directory_contents",
+            "start_background_job", "poll_background_job", "wait_background_job", "kill_background_job",
+        ],
+    },
+    "audio": {
+        "keywords": ["audio", "mp3", "wav", "m4a", "transcribe", "transcript", "podcast", "recording", "speech"],
+        "tools": ["transcribe_audio"],
+    },
+    "vision": {
+        "keywords": [
+            "image", "images", "photo", "picture", "screenshot", "png", "jpg", "jpeg", "chart", "diagram",
+            "figure", "scan", "scanned",
+        ],
+        "tools": ["analyze_image", "read_file"],
+    },
+}
+
+
+def _keyword_pattern(keywords: Iterable[str]) -> re.Pattern:
+    return re.compile(r"\b(?:" + "|".join(re.escape(k.lower()) for k in keywords) + r")\b")
+
+
+def used_tool_names(messages: List[Dict[str, Any]]) -> Set[str]:
+    names = set()
+    for message in messages:
+        for tool_call in message.get("tool_calls") or []:
+            names.add(tool_call["function"]["name"])
+    return names
+
+
+class ToolSelector:
+    """
+    Picks the tool schemas sent with each model request.
+
+    The base set comes from the profiles whose keywords the task mentions, plus the tools
+    configured to be always present. Tools the session has already called stay in the set,
+    and once the selector is expanded every tool is offered. Schemas keep their registry
+    order, so the tool block of the prompt stays a stable prefix for provider caching.
+    """
+
+    def __init__(self, config: Config, schemas: List[Dict[str, Any]], user_prompt: str):
+        self.schemas = schemas
+        self.enabled = config.get("tool_selection.enabled", True)
+        self.always = set(config.get("tool_selection.always", ["final_answer"]))
+        profiles = config.get("tool_selection.profiles") or DEFAULT_PROFILES
+        self.full_tokens = estimate_tokens(schemas)
+
+        prompt = user_prompt.lower()
+        self.profiles = [
+            name for name, profile in profiles.items()
+            if profile.get("keywords") and _keyword_pattern(profile["keywords"]).search(prompt)
+        ]
+        self.base: Optional[Set[str]] = None
+        if self.enabled and self.profiles:
+            self.base = set(self.always)
+            for name in self.profiles:
+                self.base.update(profiles[name].get("tools", []))
+
+    def select(self, used: Set[str], expanded: bool = False) -> List[Dict[str, Any]]:
+        if self.base is None or expanded:
+            return self.schemas
+        names = self.base | used
+        return [schema for schema in self.schemas if schema["function"]["name"] in names]
+
+    def tokens_saved(self, selected: List[Dict[str, Any]]) -> int:
+        if len(selected) == len(self.schemas):
+            return 0
+        return max(0, self.full_tokens - estimate_tokens(selected))
@@ -1,12 +1,21 @@
-from .decorator import get_registered_tools, get_tool_schemas, get_async_tools
+from .decorator import get_registered_tools, get_tool_schemas, get_async_tools, get_tool_options, get_tool_timeout
+from .memo import get_tool_cache
 
 from .file import *
 from .command import *
 from .dir import *
 from .execute import *
+from .jobs import *
 from .browser import *
 from .search import *
 from .audio import *
+from .vision import *
+from .workspace_search import *
+from .fetch import *
+from .retrieval import *
+from .table import *
+from .answer import *
+from .delegate import *
 
 available_functions = get_registered_tools()
 all_tools_schemas = get_tool_schemas()
@@ -0,0 +1,28 @@
+import json
+from typing import List, Optional
+from .decorator import tool
+
+FINAL_ANSWER_TOOL = "final_answer"
+
+
+@tool()
+def final_answer(answer: str, sources: Optional[List[str]] = None) -> str:
+    """
+    Submit the final answer to the user's request and end the task. Call this as soon as the task
+    is complete instead of replying in plain text; no further tools can be used afterwards.
+
+    Args:
+        answer: The final answer, or the generated text the user asked for.
+        sources: Optional list of URLs or file paths the answer is based on.
+
+    Returns:
+        A JSON string confirming the submitted answer, or an error if the arguments are invalid.
+    """
+    if not isinstance(answer, str) or not answer.strip():
+        return json.dumps({"error": "final_answer requires a non-empty 'answer' string"})
+    if sources is None:
+        sources = []
+    if not isinstance(sources, list) or not all(isinstance(source, str) for source in sources):
+        return json.dumps({"error": "final_answer 'sources' must be a list of strings"})
+
+    return json.dumps({"success": True, "answer": answer.strip(), "sources": sources}, ensure_ascii=False)
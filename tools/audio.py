@@ -1,14 +1,20 @@
-import base64
 import json
 import os
-import traceback
-from typing import List
-from pydantic import Field
-from .file_utils import get_file_from_source
+import wave
+import shutil
+import hashlib
+import operator
+import tempfile
+import subprocess
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from openai import OpenAI
 from config import Config
+from .config import PROJECT_ROOT, get_workspace_path, is_path_in_workspace
+from .file_utils import get_path_from_source, is_url
 from .decorator import tool
-import dashscope
 from dashscope import MultiModalConversation
 
 
@@ -19,101 +25,236 @@ base_url = config.get_base_url(provider)
 
 
 client = OpenAI(
-    api_key=api_key, 
+    api_key=api_key,
     base_url=base_url,
 )
 
 model = config.get_model(provider)
 
 AUDIO_TRANSCRIBE = """
-Input is a base64 encoded audio. Transcribe the audio content. 
-Return a json string with the following format: 
+Input is a base64 encoded audio. Transcribe the audio content.
+Return a json string with the following format:
 {
     "audio_text": "transcribed text from audio"
 }
 """
 
+TRANSCRIPT_CACHE_DIR = config.get("tool.audio.cache_dir") or os.path.join(PROJECT_ROOT, ".cache", "transcripts")
+CHUNK_SECONDS = float(config.get("tool.audio.chunk_seconds", 60))
+# How far either side of the target boundary we look for the quietest point to cut at
+SILENCE_SEARCH_SECONDS = float(config.get("tool.audio.silence_search_seconds", 10))
+MAX_CONCURRENCY = int(config.get("tool.audio.max_concurrency", 4))
+SAMPLE_RATE = 16000
+RMS_WINDOW_SECONDS = 0.05
+RMS_DECIMATION = 4
 
-def encode_audio(audio_path):
-    with open(audio_path, "rb") as audio_file:
-        return base64.b64encode(audio_file.read()).decode("utf-8")
 
+class TranscriptionBackend:
+    """Transcribes a single local audio file. Subclass it to plug in another service or a stub."""
 
-@tool()
+    name = "base"
+
+    def transcribe(self, audio_path: str) -> str:
+        raise NotImplementedError
+
+
+class DashScopeBackend(TranscriptionBackend):
+    name = "dashscope:qwen-audio-turbo-latest"
+
+    def transcribe(self, audio_path: str) -> str:
+        messages = [
+            {
+                "role": "system",
+                "content": [{"text": "You are a helpful assistant."}]},
+            {
+                "role": "user",
+                "content": [{"audio": f"file://{audio_path}"}, {"text": AUDIO_TRANSCRIBE}],
+            }
+        ]
+        response = MultiModalConversation.call(
+            model="qwen-audio-turbo-latest",
+            messages=messages,
+            api_key=api_key,
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Transcription failed: {response.code} {response.message}")
+
+        text = response["output"]["choices"][0]["message"]["content"][0]["text"]
+        # The model is asked for {"audio_text": ...} but does not always comply
+        try:
+            return json.loads(text.strip().strip("`").removeprefix("json"))["audio_text"]
+        except (ValueError, KeyError, TypeError):
+            return text
+
+
+_backend: TranscriptionBackend = DashScopeBackend()
+_cache_lock = threading.Lock()
+
+
+def set_transcription_backend(backend: TranscriptionBackend):
+    """Replace the backend used by transcribe_audio."""
+    global _backend
+    _backend = backend
+
+
+def _hash_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_path(content_hash: str) -> str:
+    key = hashlib.sha256(f"{_backend.name}:{content_hash}".encode("utf-8")).hexdigest()
+    return os.path.join(TRANSCRIPT_CACHE_DIR, f"{key}.json")
+
+
+def _load_cached(content_hash: str) -> Optional[str]:
+    try:
+        with open(_cache_path(content_hash), "r", encoding="utf-8") as f:
+            return json.load(f)["audio_text"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _store_cached(content_hash: str, text: str):
+    path = _cache_path(content_hash)
+    with _cache_lock:
+        os.makedirs(TRANSCRIPT_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=TRANSCRIPT_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"backend": _backend.name, "audio_text": text}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def _transcribe_cached(audio_path: str) -> str:
+    content_hash = _hash_file(audio_path)
+    text = _load_cached(content_hash)
+    if text is None:
+        text = _backend.transcribe(audio_path)
+        _store_cached(content_hash, text)
+    return text
+
+
+def _to_pcm_wav(audio_path: str, work_dir: str) -> Optional[str]:
+    """Decode audio to 16 kHz mono 16-bit WAV, or return None if it cannot be decoded."""
+    if shutil.which("ffmpeg"):
+        wav_path = os.path.join(work_dir, "decoded.wav")
+        process = subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", audio_path,
+             "-ac", "1", "-ar", str(SAMPLE_RATE), "-sample_fmt", "s16", wav_path],
+            capture_output=True,
+        )
+        if process.returncode == 0:
+            return wav_path
+
+    # Without ffmpeg only plain 16-bit mono WAV can be split
+    try:
+        with wave.open(audio_path, "rb") as wav:
+            if wav.getsampwidth() == 2 and wav.getnchannels() == 1:
+                return audio_path
+    except (wave.Error, EOFError, OSError):
+        pass
+    return None
+
+
+def _window_energy(samples: array, start: int, end: int) -> int:
+    window = samples[start:end:RMS_DECIMATION]
+    return sum(map(operator.mul, window, window))
+
+
+def _find_split_points(samples: array, rate: int) -> List[int]:
+    """Pick cut points near every CHUNK_SECONDS, each at the quietest window within the search range."""
+    total = len(samples)
+    chunk = int(CHUNK_SECONDS * rate)
+    search = int(SILENCE_SEARCH_SECONDS * rate)
+    window = max(1, int(RMS_WINDOW_SECONDS * rate))
+
+    points = []
+    last = 0
+    while total - last > chunk + search:
+        target = last + chunk
+        best, best_energy = target, None
+        for start in range(max(last + window, target - search), min(total - window, target + search), window):
+            energy = _window_energy(samples, start, start + window)
+            if best_energy is None or energy < best_energy:
+                best, best_energy = start + window // 2, energy
+        points.append(best)
+        last = best
+    return points
+
+
+def split_on_silence(audio_path: str, work_dir: str) -> List[str]:
+    """
+    Split audio into chunks of roughly CHUNK_SECONDS, cutting at the quietest nearby point.
+
+    Returns the original path as the only chunk when the audio is short or cannot be decoded.
+    """
+    wav_path = _to_pcm_wav(audio_path, work_dir)
+    if wav_path is None:
+        return [audio_path]
+
+    with wave.open(wav_path, "rb") as wav:
+        rate = wav.getframerate()
+        if wav.getnframes() <= (CHUNK_SECONDS + SILENCE_SEARCH_SECONDS) * rate:
+            return [audio_path]
+        samples = array("h")
+        samples.frombytes(wav.readframes(wav.getnframes()))
+
+    bounds = [0] + _find_split_points(samples, rate) + [len(samples)]
+    chunk_paths = []
+    for index, (start, end) in enumerate(zip(bounds, bounds[1:])):
+        chunk_path = os.path.join(work_dir, f"chunk_{index:04d}.wav")
+        with wave.open(chunk_path, "wb") as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(rate)
+            out.writeframes(samples[start:end].tobytes())
+        chunk_paths.append(chunk_path)
+    return chunk_paths
+
+
+def _resolve_audio(audio_path: str) -> str:
+    if is_url(audio_path):
+        file_path, _ = get_path_from_source(audio_path, max_size_mb=500.0, type="audio")
+        return file_path
+    file_path = get_workspace_path(audio_path)
+    # For security reasons, we limit the file path to the workspace directory
+    if not is_path_in_workspace(file_path):
+        raise PermissionError("File access out of allowed range")
+    return file_path
+
+
+@tool(timeout=900)
 def transcribe_audio(audio_path: str) -> str:
     """
-    Transcribe the given audio in a list of filepaths or urls.
+    Transcribe the given audio file path or URL.
 
     Args:
-        audio_urls: List of audio file paths or URLs
+        audio_path: Audio file path relative to the workspace, or URL
 
     Returns:
-        str: JSON string containing transcriptions
+        str: JSON string containing the transcription in "audio_text"
     """
+    try:
+        file_path = _resolve_audio(audio_path)
+        if not os.path.isfile(file_path):
+            return json.dumps({"error": f"Audio file '{audio_path}' does not exist"})
+
+        content_hash = _hash_file(file_path)
+        text = _load_cached(content_hash)
+        if text is not None:
+            return json.dumps({"success": True, "audio_text": text, "cached": True}, ensure_ascii=False)
+
+        with tempfile.TemporaryDirectory(prefix="transcribe_") as work_dir:
+            chunk_paths = split_on_silence(file_path, work_dir)
+            # Chunks are independent requests; map keeps them in order for stitching
+            with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENCY, len(chunk_paths)))) as executor:
+                texts = list(executor.map(_transcribe_cached, chunk_paths))
 
-    # base64_audio = encode_audio(audio_path)
-    messages = [
-        {
-            "role": "system", 
-            "content": [{"text": "You are a helpful assistant."}]},
-        {
-            "role": "user",
-            "content": [{"audio": audio_path}, {"text": AUDIO_TRANSCRIBE}],
-        }
-    ]
-    response = MultiModalConversation.call(
-        model="qwen-audio-turbo-latest", 
-        messages=messages,
-        api_key=api_key,
-    )
-
-    print(response)
-    res = response["output"]["choices"][0]["message"]["content"][0]["text"]
-    return res
-
-
-# @tool()
-# def transcribe_audio(
-#     audio_urls: List[str] = Field(
-#         description="The input audio in given a list of filepaths or urls."
-#     ),
-# ) -> str:
-#     """
-#     Transcribe the given audio in a list of filepaths or urls.
-
-#     Args:
-#         audio_urls: List of audio file paths or URLs
-
-#     Returns:
-#         str: JSON string containing transcriptions
-#     """
-#     transcriptions = []
-#     for audio_url in audio_urls:
-#         try:
-#             # Get file with validation (only audio files allowed)
-#             file_path, mime_type, content = get_file_from_source(
-#                 audio_url,
-#                 allowed_mime_prefixes=["audio/"],
-#                 max_size_mb=50.0,  # 50MB limit for audio files
-#                 type="audio",  # Specify type as audio to handle audio files
-#             )
-
-#             # Use the file for transcription
-#             with open(file_path, "rb") as audio_file:
-#                 transcription = client.audio.transcriptions.create(
-#                     file=audio_file,
-#                     model=model,
-#                     response_format="text",
-#                 )
-#                 transcriptions.append(transcription)
-
-#             # Clean up temporary file if it was created for a URL
-#             if file_path != os.path.abspath(audio_url) and os.path.exists(file_path):
-#                 os.unlink(file_path)
-
-#         except Exception as e:
-#             print(f"Error transcribing {audio_url}: {traceback.format_exc()}")
-#             transcriptions.append(f"Error: {str(e)}")
-
-#     print(f"---get_text_by_transcribe-transcription:{transcriptions}")
-#     return json.dumps(transcriptions, ensure_ascii=False)
+        text = " ".join(t.strip() for t in texts if t and t.strip())
+        _store_cached(content_hash, text)
+        return json.dumps({"success": True, "audio_text": text, "chunks": len(chunk_paths), "cached": False}, ensure_ascii=False)
+    except Exception as e:
+        return json.dumps({"error": f"Transcribing '{audio_path}' failed: {str(e)}"})
@@ -3,6 +3,7 @@ import os
 import traceback
 import asyncio
 import sys
+from typing import Dict, List
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -10,16 +11,34 @@ from browser_use import Agent
 from browser_use.agent.views import AgentHistoryList
 from browser_use.browser.browser import Browser, BrowserConfig
 from browser_use.browser.context import BrowserContext, BrowserContextConfig
+from langchain_core.rate_limiters import BaseRateLimiter
 from langchain_openai import ChatOpenAI
 from pydantic import Field
 from .decorator import tool
+from .browser_cache import extract_urls, get_browser_cache, normalize_url
 from config import Config
+from llm import get_router
+from ratelimit import RateLimiter, RetryPolicy, get_rate_limiter
+from events import publish
 
-provider = "gemini"
 config = Config()
-api_key = config.get_api_key(provider)
-base_url = config.get_base_url(provider)
-model = config.get_model(provider)
+
+# Traces are only recorded when asked for; Playwright writes them as zip archives
+TRACE_ENABLED = config.get("tool.browser.trace", False)
+TRACE_DIR = config.get("tool.browser.trace_dir", "./browser_trace")
+
+
+class SharedRateLimiter(BaseRateLimiter):
+    """Lets the browser agent's LLM draw from the same process-wide limiter as the main loop"""
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        return self.limiter.acquire(blocking=blocking)
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        return await asyncio.to_thread(self.limiter.acquire, blocking=blocking)
 
 
 browser_system_prompt = """
@@ -57,17 +76,48 @@ Your goal is to extract precisely the information needed with minimal browsing s
 """
 
 
-@tool()
+def _page_contents(history: AgentHistoryList) -> Dict[str, List[str]]:
+    """Group the content extracted during a run by the normalized URL of the page it came from"""
+    pages: Dict[str, List[str]] = {}
+    for item in history.history:
+        url = getattr(item.state, "url", None)
+        if not url or not url.startswith(("http://", "https://")):
+            continue
+        contents = [r.extracted_content for r in item.result if getattr(r, "extracted_content", None) and not r.is_done]
+        if contents:
+            pages.setdefault(normalize_url(url), []).extend(contents)
+    return pages
+
+
+def _known_pages_context(pages: Dict[str, str]) -> str:
+    sections = [f"## {url}\n{content}" for url, content in pages.items()]
+    return (
+        "Content extracted from these pages in earlier sessions is below. If it already answers "
+        "the task, finish without navigating to them again.\n\n" + "\n\n".join(sections)
+    )
+
+
+@tool(timeout=600)
 async def browser_use(
     task: str = Field(description="The task to perform using the browser."),
+    use_cache: bool = True,
 ) -> str:
     """
     Perform browser actions using the browser-use package.
+    To just read the content of a known URL, use fetch_url instead, which is much faster.
     Args:
         task (str): The task to perform using the browser.
+        use_cache (bool): Whether a recent result of the same task from any session may be reused (default: True).
     Returns:
         str: The result of the browser actions.
     """
+    browser_cache = get_browser_cache()
+    if use_cache:
+        cached = browser_cache.get_result(task)
+        if cached is not None:
+            return json.dumps({"success": True, "result": cached["result"], "cached": True})
+    known_pages = browser_cache.get_pages(extract_urls(task)) if use_cache else {}
+
     browser = Browser(
         config=BrowserConfig(
             headless=False,
@@ -81,10 +131,16 @@ async def browser_use(
     )
     browser_context = BrowserContext(
         config=BrowserContextConfig(
-            trace_path="./browser_trace",
+            trace_path=TRACE_DIR if TRACE_ENABLED else None,
         ),
         browser=browser,
     )
+    # Drive the browser agent with the healthiest configured provider
+    provider = get_router(config).best_provider()
+    api_key = config.get_api_key(provider)
+    base_url = config.get_base_url(provider)
+    model = config.get_model(provider)
+
     import os
     os.environ["OPENAI_API_KEY"] = api_key
     
@@ -95,9 +151,13 @@ async def browser_use(
             api_key=api_key,
             base_url=base_url,
             temperature=0.7,
+            rate_limiter=SharedRateLimiter(get_rate_limiter(provider, config)),
+            # The OpenAI client's own retries honor Retry-After with jittered backoff
+            max_retries=RetryPolicy.from_config(config).max_attempts - 1,
         ),
         browser_context=browser_context,
         extend_system_message=browser_system_prompt,
+        message_context=_known_pages_context(known_pages) if known_pages else None,
     )
     try:
         browser_execution: AgentHistoryList = await agent.run(max_steps=50)
@@ -107,17 +167,27 @@ async def browser_use(
             and browser_execution.is_successful()
         ):
             exec_trace = browser_execution.extracted_content()
-            print(
-                ">>> 🌏 Browse Execution Succeed!\n"
-                f">>> 💡 Result: {json.dumps(exec_trace, ensure_ascii=False, indent=4)}\n"
-                ">>> 🌏 Browse Execution Succeed!\n"
+            publish(
+                "browser_succeeded",
+                "debug",
+                message=(
+                    ">>> 🌏 Browse Execution Succeed!\n"
+                    f">>> 💡 Result: {json.dumps(exec_trace, ensure_ascii=False, indent=4)}\n"
+                    ">>> 🌏 Browse Execution Succeed!\n"
+                ),
             )
             result = browser_execution.final_result()
+            try:
+                for url, contents in _page_contents(browser_execution).items():
+                    browser_cache.put_page(url, contents)
+                browser_cache.put_result(task, result, [normalize_url(u) for u in browser_execution.urls() if u])
+            except Exception as e:
+                publish("browser_cache_error", "warning", message=f"⚠️ Could not cache browser result: {e}")
             return json.dumps({"success": True, "result": result})
         else:
             return json.dumps({"error": f"Browser execution failed for task: {task}"})
     except Exception as e:
-        print(f"Browser execution failed: {traceback.format_exc()}")
+        publish("browser_error", "error", message=f"Browser execution failed: {traceback.format_exc()}")
         return json.dumps({"error": f"Browser execution failed for task: {task} due to {str(e)}"})
     finally:
         try:
@@ -144,7 +214,7 @@ async def browser_use(
                 pass
             
             gc.collect()
-            print("Browser resources cleaned up")
+            publish("browser_cleanup", "debug", message="Browser resources cleaned up")
             
             # Clear references
             if 'browser' in locals():
@@ -153,10 +223,10 @@ async def browser_use(
                 browser_context = None
             gc.collect()
         except Exception as e:
-            print(f"Error during browser cleanup: {e}")
+            publish("browser_cleanup_error", "warning", message=f"Error during browser cleanup: {e}")
             try:
                 import gc
                 gc.collect()
-                print("Forced final cleanup")
+                publish("browser_cleanup", "debug", message="Forced final cleanup")
             except:
                 pass
@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import time
+import hashlib
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from config import Config
+from .config import PROJECT_ROOT
+from .file_utils import _write_json_atomic
+
+config = Config()
+
+BROWSER_CACHE_DIR = config.get("tool.browser.cache_dir") or os.path.join(PROJECT_ROOT, ".cache", "browser")
+RESULT_TTL = config.get("tool.browser.cache_ttl", 6 * 3600)
+PAGE_TTL = config.get("tool.browser.page_cache_ttl", 24 * 3600)
+MAX_PAGE_CHARS = 20000
+
+URL_PATTERN = re.compile(r"https?://[^\s'\"<>()\[\]{}]+")
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "ref_src")
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL: lowercase scheme and host, no default port, fragment or tracking parameters, sorted query"""
+    parts = urlsplit(url.strip().rstrip(".,;:"))
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def extract_urls(text: str) -> List[str]:
+    seen = []
+    for match in URL_PATTERN.findall(text):
+        url = normalize_url(match)
+        if url not in seen:
+            seen.append(url)
+    return seen
+
+
+def task_fingerprint(task: str) -> str:
+    """Hash of a browser task that ignores case, whitespace and cosmetic URL differences"""
+    text = URL_PATTERN.sub(lambda m: normalize_url(m.group(0)), task)
+    text = " ".join(text.lower().split())
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _key(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class BrowserCache:
+    """
+    On-disk cache of browser work shared by every session.
+
+    Final results are stored by task fingerprint, and the content extracted from each page
+    by normalized URL, each with its own TTL.
+    """
+
+    def __init__(self, cache_dir: str = BROWSER_CACHE_DIR, result_ttl: float = RESULT_TTL, page_ttl: float = PAGE_TTL):
+        self.cache_dir = cache_dir
+        self.result_ttl = result_ttl
+        self.page_ttl = page_ttl
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.cache_dir, kind, f"{key}.json")
+
+    def _load(self, path: str, ttl: float) -> Optional[Dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("stored_at", 0) > ttl:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def get_result(self, task: str) -> Optional[Dict]:
+        return self._load(self._path("results", task_fingerprint(task)), self.result_ttl)
+
+    def put_result(self, task: str, result: str, urls: List[str]):
+        _write_json_atomic(self._path("results", task_fingerprint(task)), {
+            "task": task,
+            "result": result,
+            "urls": urls,
+            "stored_at": time.time(),
+        })
+
+    def get_page(self, url: str) -> Optional[Dict]:
+        return self._load(self._path("pages", _key(normalize_url(url))), self.page_ttl)
+
+    def put_page(self, url: str, contents: List[str]):
+        text = "\n\n".join(contents)[:MAX_PAGE_CHARS]
+        _write_json_atomic(self._path("pages", _key(normalize_url(url))), {
+            "url": normalize_url(url),
+            "content": text,
+            "stored_at": time.time(),
+        })
+
+    def get_pages(self, urls: List[str]) -> Dict[str, str]:
+        """Cached content for those of the URLs that have some"""
+        pages = {}
+        for url in urls:
+            entry = self.get_page(url)
+            if entry and entry["content"]:
+                pages[url] = entry["content"]
+        return pages
+
+
+_cache = BrowserCache()
+
+
+def get_browser_cache() -> BrowserCache:
+    return _cache
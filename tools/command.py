@@ -1,14 +1,18 @@
 import subprocess
 import json
 import os
+from config import Config
 from .config import get_workspace_path
-from .decorator import tool
+from .decorator import tool, get_tool_timeout
 
-@tool()
+config = Config()
+
+@tool(timeout=60)
 def execute_shell_command(command: str) -> str:
     """
     Executes a shell command and returns the output as a JSON string.
-    Commands are executed in the workspace directory.
+    Commands are executed in the workspace directory and stopped after about a minute;
+    use start_background_job for anything that may take longer.
 
     Args:
         command: The shell command to execute.
@@ -28,7 +32,8 @@ def execute_shell_command(command: str) -> str:
             shell=True, 
             capture_output=True, 
             text=True, 
-            timeout=30,
+            # Just inside the tool deadline, so the process is killed rather than left running
+            timeout=max(1, (get_tool_timeout("execute_shell_command", config) or 3600) - 1),
             cwd=workspace_dir
         )
         
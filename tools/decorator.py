@@ -1,13 +1,36 @@
 import functools
 import inspect
 import asyncio
-from typing import Dict, List, Any, Callable, Optional, get_type_hints
+from typing import Dict, List, Any, Callable, Optional, Union, get_type_hints, get_origin, get_args
 
 registered_tools = {}
 tool_schemas = []
 async_tools = set()  # Track which tools are async
+tool_options = {}  # Per-tool dispatcher options, e.g. memoization
+DEFAULT_TIMEOUT = 120
 
-def tool(name: Optional[str] = None, description: Optional[str] = None):
+def tool(
+    name: Optional[str] = None,
+    description: Optional[str] = None,
+    memoize: bool = False,
+    ttl: Optional[float] = None,
+    path_args: Optional[List[str]] = None,
+    timeout: Optional[float] = None,
+):
+    """
+    Register a function as a tool.
+
+    Args:
+        name: Tool name (default: the function name)
+        description: Tool description (default: the docstring)
+        memoize: Whether identical calls may be answered from the tool result cache
+        ttl: Seconds a memoized result stays valid (default: until invalidated)
+        path_args: Arguments holding workspace file paths; a memoized result is only reused while
+                   the mtime and size of those files are unchanged. Tools that read a whole
+                   directory tree are not memoized, as edits deeper in it leave these unchanged
+        timeout: Seconds a call may take before it is abandoned (default: DEFAULT_TIMEOUT);
+                 overridable per tool with tool.timeouts.<name> in config.yaml
+    """
     def decorator(func: Callable):
         func_name = name or func.__name__
         func_description = description or inspect.getdoc(func) or ""
@@ -22,11 +45,10 @@ def tool(name: Optional[str] = None, description: Optional[str] = None):
             if param_name == 'self':
                 continue
                 
-            param_type = type_hints.get(param_name, Any).__name__
             param_doc = _extract_param_doc(func_description, param_name)
             
             properties[param_name] = {
-                "type": _python_type_to_json_type(param_type),
+                **_type_to_schema(type_hints.get(param_name, Any)),
                 "description": param_doc
             }
             
@@ -48,6 +70,12 @@ def tool(name: Optional[str] = None, description: Optional[str] = None):
         
         registered_tools[func_name] = func
         tool_schemas.append(tool_schema)
+        tool_options[func_name] = {
+            "memoize": memoize,
+            "ttl": ttl,
+            "path_args": list(path_args or []),
+            "timeout": timeout,
+        }
         
         # Check if the function is async and track it
         if inspect.iscoroutinefunction(func):
@@ -66,16 +94,17 @@ def _extract_param_doc(docstring: str, param_name: str) -> str:
         return ""
     
     lines = docstring.split("\n")
-    param_marker = f"{param_name} "
-    param_marker_with_type = f"{param_name} ("
+    param_markers = (f"{param_name} ", f"{param_name} (", f"{param_name}:")
     
     for i, line in enumerate(lines):
+        indent = len(line) - len(line.lstrip())
         line = line.strip()
-        if line.startswith(param_marker) or line.startswith(param_marker_with_type):
+        if line.startswith(param_markers):
             description = line.split(":", 1)[1].strip() if ":" in line else ""
             
+            # Continuation lines are indented deeper than the parameter line itself
             j = i + 1
-            while j < len(lines) and lines[j].strip() and not any(lines[j].strip().startswith(p) for p in ["Args:", "Returns:", "Raises:", "Yields:", "Example:", "Note:"]):
+            while j < len(lines) and lines[j].strip() and len(lines[j]) - len(lines[j].lstrip()) > indent and not any(lines[j].strip().startswith(p) for p in ["Args:", "Returns:", "Raises:", "Yields:", "Example:", "Note:"]):
                 description += " " + lines[j].strip()
                 j += 1
                 
@@ -83,6 +112,19 @@ def _extract_param_doc(docstring: str, param_name: str) -> str:
     
     return ""
 
+def _type_to_schema(annotation: Any) -> Dict[str, Any]:
+    origin = get_origin(annotation)
+    if origin is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return _type_to_schema(args[0]) if len(args) == 1 else {"type": "string"}
+    if annotation is list or origin is list:
+        args = get_args(annotation)
+        # Some providers reject array parameters without an item schema
+        return {"type": "array", "items": _type_to_schema(args[0]) if args else {"type": "string"}}
+    if annotation is dict or origin is dict:
+        return {"type": "object"}
+    return {"type": _python_type_to_json_type(getattr(annotation, "__name__", "str"))}
+
 def _python_type_to_json_type(type_name: str) -> str:
     type_map = {
         "str": "string",
@@ -103,3 +145,15 @@ def get_tool_schemas() -> List[Dict[str, Any]]:
 
 def get_async_tools() -> set:
     return async_tools
+
+def get_tool_options() -> Dict[str, Dict[str, Any]]:
+    return tool_options
+
+def get_tool_timeout(name: str, config) -> Optional[float]:
+    """Deadline of a tool in seconds: tool.timeouts.<name>, else the @tool() value, else tool.timeouts.default"""
+    timeout = config.get(f"tool.timeouts.{name}")
+    if timeout is None:
+        timeout = tool_options.get(name, {}).get("timeout")
+    if timeout is None:
+        timeout = config.get("tool.timeouts.default", DEFAULT_TIMEOUT)
+    return timeout or None
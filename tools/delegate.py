@@ -0,0 +1,98 @@
+import json
+import asyncio
+from typing import List, Optional
+from config import Config
+from .decorator import tool, get_registered_tools, get_tool_timeout
+from .answer import FINAL_ANSWER_TOOL
+from .jobs import current_session_id
+
+config = Config()
+
+MAX_CONCURRENCY = config.get("tool.delegate.max_concurrency", 4)
+MAX_SUBTASKS = config.get("tool.delegate.max_subtasks", 8)
+MAX_ITERATIONS = config.get("tool.delegate.max_iterations", 8)
+
+SUBAGENT_NOTE = """
+---
+You are a sub-agent working on one part of a larger task for another agent. Stay strictly within your subtask,
+and call `final_answer` with a concise, self-contained answer as soon as you have it.
+"""
+
+
+@tool(timeout=1800)
+async def delegate(tasks: List[str], tools: Optional[List[str]] = None, max_iterations: int = 8) -> str:
+    """
+    Run independent subtasks concurrently in separate sub-agent sessions and return their final answers.
+    Use it for fan-out work (e.g. researching several papers or items) whose parts do not depend on each other.
+
+    Args:
+        tasks: The subtasks, each a complete self-contained instruction for one sub-agent.
+        tools: Names of the tools the sub-agents may use (default: all tools except delegate).
+        max_iterations: Maximum number of turns each sub-agent may take (default: 8).
+
+    Returns:
+        A JSON string with, for each subtask in order, whether it completed, its answer and its sources.
+    """
+    # Imported here because the agent module itself imports the tools package
+    from agent import AgentSession, SYSTEM_PROMPT
+    from llm import get_router
+    from datetime import datetime
+
+    if not tasks or not all(isinstance(task, str) and task.strip() for task in tasks):
+        return json.dumps({"error": "delegate requires a non-empty list of task strings"})
+    if len(tasks) > MAX_SUBTASKS:
+        return json.dumps({"error": f"At most {MAX_SUBTASKS} subtasks can be delegated at once"})
+
+    registered = get_registered_tools()
+    if tools:
+        unknown = [name for name in tools if name not in registered]
+        if unknown:
+            return json.dumps({"error": f"Unknown tools: {', '.join(unknown)}"})
+        tool_names = list(tools)
+    else:
+        tool_names = list(registered)
+    # Sub-agents cannot delegate further, and always need a way to answer
+    tool_names = [name for name in tool_names if name != "delegate"]
+    if FINAL_ANSWER_TOOL not in tool_names:
+        tool_names.append(FINAL_ANSWER_TOOL)
+
+    system_prompt = SYSTEM_PROMPT.replace("{current_time}", datetime.now().strftime("%Y-%m-%d %H:%M:%S")) + SUBAGENT_NOTE
+    max_iterations = max(1, min(int(max_iterations), MAX_ITERATIONS))
+    parent_session_id = current_session_id.get()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    # Sub-agents wrap up on their own before the delegate call itself hits its deadline
+    deadline = get_tool_timeout("delegate", config)
+    time_budget = config.get("tool.delegate.time_budget_seconds") or (deadline * 0.9 if deadline else None)
+
+    async def run_subtask(task: str) -> dict:
+        async with semaphore:
+            session = AgentSession(
+                config,
+                get_router(config),
+                user_prompt=task,
+                system_prompt=system_prompt,
+                max_iterations=max_iterations,
+                tool_names=tool_names,
+                time_budget=time_budget,
+                parent_session_id=parent_session_id,
+            )
+            try:
+                # Each session runs its own loop, so it gets a worker thread of its own
+                complete, answer = await asyncio.to_thread(session.run)
+            except asyncio.CancelledError:
+                # The thread cannot be interrupted, but the session stops at its next step
+                session.cancel()
+                raise
+            except Exception as e:
+                return {"task": task, "session_id": session.session_id, "complete": False, "error": str(e)}
+            return {
+                "task": task,
+                "session_id": session.session_id,
+                "complete": complete,
+                "answer": answer if complete else "Sub-agent did not finish within its iteration budget",
+                "sources": session.task_sources,
+                "iterations": session.iteration,
+            }
+
+    results = await asyncio.gather(*(run_subtask(task) for task in tasks))
+    return json.dumps({"success": True, "results": results}, ensure_ascii=False)
@@ -1,40 +1,161 @@
 import os
 import json
+import base64
+import fnmatch
+from datetime import datetime
 from .config import get_workspace_path, is_path_in_workspace
 from .decorator import tool
 
+SORT_KEYS = ("name", "type", "size", "mtime")
+MAX_LIMIT = 1000
+
+
+def _matches_any(rel_path: str, name: str, globs: list) -> bool:
+    return any(fnmatch.fnmatch(rel_path, g) or fnmatch.fnmatch(name, g) for g in globs)
+
+
+def _encode_cursor(key: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> list:
+    return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+
+
+def _sort_key(item: dict, sort_by: str) -> list:
+    if sort_by == "name":
+        return [item["name"]]
+    value = item.get(sort_by)
+    return [value if value is not None else 0, item["name"]]
+
+
+def _walk(root: str, recursive: bool, max_depth: int, include: list, exclude: list, need_stat: bool) -> list:
+    items = []
+    stack = [("", 1)]
+    while stack:
+        rel_dir, depth = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, rel_dir)) as entries:
+                for entry in entries:
+                    rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                    if exclude and _matches_any(rel_path, entry.name, exclude):
+                        continue
+                    # DirEntry caches the type from the directory read, so no extra stat here
+                    try:
+                        is_dir = entry.is_dir()
+                        item_type = "directory" if is_dir else "file" if entry.is_file() else "unknown"
+                    except OSError:
+                        is_dir, item_type = False, "unknown"
+
+                    if recursive and is_dir and depth < max_depth and not entry.is_symlink():
+                        stack.append((rel_path, depth + 1))
+
+                    if include and (is_dir or not _matches_any(rel_path, entry.name, include)):
+                        continue
+
+                    item = {"name": rel_path, "type": item_type}
+                    if need_stat:
+                        try:
+                            stat = entry.stat()
+                            item["size"] = stat.st_size if item_type == "file" else None
+                            item["mtime"] = stat.st_mtime
+                        except OSError:
+                            item["size"], item["mtime"] = None, None
+                    items.append(item)
+        except OSError:
+            continue
+    return items
+
+
 @tool()
-def list_directory_contents(directory_path: str) -> str:
+def list_directory_contents(
+    directory_path: str,
+    recursive: bool = False,
+    max_depth: int = 3,
+    include: str = "",
+    exclude: str = "",
+    include_size: bool = False,
+    include_mtime: bool = False,
+    sort_by: str = "name",
+    reverse: bool = False,
+    limit: int = 200,
+    cursor: str = "",
+) -> str:
     """
-    List the contents of a directory.
+    List the contents of a directory, optionally recursively, one page at a time.
 
     Args:
-        directory_path: The path to the directory to list. Can be a relative path from the workspace 
+        directory_path: The path to the directory to list. Can be a relative path from the workspace
                        directory (e.g., "subfolder") or an absolute path within the workspace directory.
+        recursive: Whether to list subdirectories as well (default: False).
+        max_depth: Maximum directory depth to descend to when recursive, 1 being the directory itself (default: 3).
+        include: Comma-separated glob patterns; only files matching one of them are listed, e.g. "*.py,*.md".
+        exclude: Comma-separated glob patterns of files and directories to skip entirely, e.g. "node_modules,*.log".
+        include_size: Whether to report the size in bytes of each file (default: False).
+        include_mtime: Whether to report the last modification time of each entry (default: False).
+        sort_by: Sort order, one of "name", "type", "size" or "mtime" (default: "name").
+        reverse: Whether to reverse the sort order (default: False).
+        limit: Maximum number of entries to return in one page (default: 200).
+        cursor: The "next_cursor" value from a previous call, to fetch the following page.
 
     Returns:
-        A JSON string containing the directory contents with file and directory information.
+        A JSON string containing the directory contents with file and directory information, the total
+        number of matching entries and a "next_cursor" if more entries are available.
     """
     try:
         # Convert to absolute path within workspace
         abs_directory_path = get_workspace_path(directory_path)
-        
+
         # For security reasons, we limit the directory path to the workspace directory
         if not is_path_in_workspace(abs_directory_path):
             return json.dumps({"error": "Access to the directory is not allowed."})
-        
+
         if not os.path.exists(abs_directory_path):
             return json.dumps({"error": f"Directory '{abs_directory_path}' does not exist."})
         if not os.path.isdir(abs_directory_path):
             return json.dumps({"error": f"Path '{abs_directory_path}' is not a directory."})
+        if sort_by not in SORT_KEYS:
+            return json.dumps({"error": f"Invalid sort_by '{sort_by}'. Expected one of: {', '.join(SORT_KEYS)}."})
+
+        include_globs = [g.strip() for g in include.split(",") if g.strip()]
+        exclude_globs = [g.strip() for g in exclude.split(",") if g.strip()]
+        need_stat = include_size or include_mtime or sort_by in ("size", "mtime")
+        items = _walk(abs_directory_path, recursive, max(1, int(max_depth)), include_globs, exclude_globs, need_stat)
+
+        items.sort(key=lambda item: _sort_key(item, sort_by), reverse=reverse)
+        total = len(items)
+
+        # Cursors are keyset-based, so a page stays correct even if entries were added or removed meanwhile
+        if cursor:
+            try:
+                after = _decode_cursor(cursor)
+            except Exception:
+                return json.dumps({"error": "Invalid cursor."})
+            if reverse:
+                items = [item for item in items if _sort_key(item, sort_by) < after]
+            else:
+                items = [item for item in items if _sort_key(item, sort_by) > after]
+
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        page = items[:limit]
+        next_cursor = _encode_cursor(_sort_key(page[-1], sort_by)) if len(items) > limit else None
 
-        contents = os.listdir(abs_directory_path)
-        items = []
-        for item in contents:
-            item_path = os.path.join(abs_directory_path, item)
-            item_type = "file" if os.path.isfile(item_path) else "directory" if os.path.isdir(item_path) else "unknown"
-            items.append({"name": item, "type": item_type})
+        for item in page:
+            if not include_size:
+                item.pop("size", None)
+            if include_mtime:
+                if item.get("mtime") is not None:
+                    item["mtime"] = datetime.fromtimestamp(item["mtime"]).isoformat()
+            else:
+                item.pop("mtime", None)
 
-        return json.dumps({"success": True, "directory_path": abs_directory_path, "contents": items})
+        return json.dumps({
+            "success": True,
+            "directory_path": abs_directory_path,
+            "total": total,
+            "returned": len(page),
+            "next_cursor": next_cursor,
+            "contents": page,
+        })
     except Exception as e:
-        return json.dumps({"error": f"List '{abs_directory_path}' failed: {str(e)}"})
+        return json.dumps({"error": f"List '{directory_path}' failed: {str(e)}"})
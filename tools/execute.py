@@ -1,9 +1,50 @@
+import sys
+import json
+import subprocess
+from config import Config
+from .decorator import tool, get_tool_timeout
+
+config = Config()
+
+# Runs in a child process, so code that loops forever can be killed at the deadline
+# instead of holding a worker thread and the redirected sys.stdout of the agent
+RUNNER = r'''
 import io
+import sys
 import json
 from contextlib import redirect_stdout
-from .decorator import tool
 
-@tool()
+code = sys.stdin.read()
+namespace = {
+    '__builtins__': {
+        'print': print,
+        'len': len,
+        'range': range,
+        'list': list,
+        'dict': dict,
+        'str': str,
+        'int': int,
+        'float': float,
+        'True': True,
+        'False': False,
+        'None': None,
+        'json': json,
+        'sorted': sorted,
+        '__import__': __import__,
+    },
+    'json': json
+}
+stdout_capture = io.StringIO()
+try:
+    with redirect_stdout(stdout_capture):
+        exec(code, namespace, namespace)
+    result = {"success": True, "code": code, "stdout": stdout_capture.getvalue().strip(), "returned_value": None}
+except BaseException as e:
+    result = {"error": f"Execution failed: {type(e).__name__}: {str(e)}", "stdout": stdout_capture.getvalue().strip()}
+sys.__stdout__.write(json.dumps(result))
+'''
+
+@tool(timeout=60)
 def execute_python_code(code: str) -> str:
     """
     Executes Python code and captures the output.
@@ -14,32 +55,23 @@ def execute_python_code(code: str) -> str:
     Returns:
         A JSON string containing the execution results, including stdout and any errors.
     """
-    namespace = {
-        '__builtins__': {
-            'print': print,
-            'len': len,
-            'range': range,
-            'list': list,
-            'dict': dict,
-            'str': str,
-            'int': int,
-            'float': float,
-            'True': True,
-            'False': False,
-            'None': None,
-            'json': json,
-            'sorted': sorted,
-            '__import__': __import__,
-        },
-        'json': json
-    }
-    stdout_capture = io.StringIO()
     try:
-        with redirect_stdout(stdout_capture):
-            exec(code, namespace, namespace)
-        output = stdout_capture.getvalue()
-        return json.dumps({"success": True, "code": code, "stdout": output.strip(), "returned_value": None})
+        process = subprocess.run(
+            [sys.executable, "-c", RUNNER],
+            input=code,
+            capture_output=True,
+            text=True,
+            # Just inside the tool deadline, so the process is killed rather than left running
+            timeout=max(1, (get_tool_timeout("execute_python_code", config) or 3600) - 1),
+        )
+    except subprocess.TimeoutExpired:
+        return json.dumps({"error": "Execution timed out and the code was stopped."})
     except Exception as e:
-        return json.dumps({"error": f"Execution failed: {type(e).__name__}: {str(e)}", "stdout": stdout_capture.getvalue().strip()})
-    finally:
-        stdout_capture.close()
+        return json.dumps({"error": f"Execution failed: {type(e).__name__}: {str(e)}"})
+
+    try:
+        json.loads(process.stdout)
+        return process.stdout
+    except json.JSONDecodeError:
+        # The code ended the interpreter itself, e.g. with os._exit
+        return json.dumps({"error": f"Execution failed: the Python process exited with code {process.returncode}", "stderr": process.stderr.strip()})
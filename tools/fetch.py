@@ -0,0 +1,324 @@
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urldefrag
+import requests
+from config import Config
+from .decorator import tool
+
+config = Config()
+
+MAX_BYTES = int(config.get("tool.fetch.max_size_mb", 5) * 1024 * 1024)
+TIMEOUT = config.get("tool.fetch.timeout", 15)
+CACHE_TTL = config.get("tool.fetch.cache_ttl", 600)
+CACHE_SIZE = config.get("tool.fetch.cache_size", 128)
+MAX_LINKS = 100
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "canvas", "iframe", "nav", "footer", "aside", "form", "button", "select"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+# Site headers are boilerplate, but an article's own <header> holds its title
+PAGE_HEADER_TAGS = {"header"}
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "blockquote", "figure", "figcaption", "dl", "dt", "dd", "ul", "ol", "address", "details", "summary"}
+# Whole id/class names only: "no-sidebar" or "has-sidebar" on a page wrapper says nothing about the element itself
+BOILERPLATE_NAMES = {
+    "nav", "navbar", "navigation", "menu", "footer", "sidebar", "cookie", "cookies", "consent", "banner",
+    "advert", "ads", "advertisement", "breadcrumb", "breadcrumbs", "share", "social", "popup", "modal",
+}
+# Never boilerplate, whatever their classes say; neither is the first element inside <body>
+CONTENT_TAGS = {"html", "body", "main", "article"}
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog"}
+
+_session = requests.Session()
+_session.headers.update({"User-Agent": USER_AGENT})
+_session.max_redirects = 10
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class _ReadableHTMLParser(HTMLParser):
+    """Turns HTML into readable markdown or plain text, dropping scripts, navigation and other boilerplate."""
+
+    def __init__(self, base_url: str, markdown: bool = True):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.markdown = markdown
+        self.title = ""
+        self.parts: List[str] = []
+        self.main_parts: Optional[List[str]] = None
+        self.links: List[Dict[str, str]] = []
+        self.tables: List[List[List[str]]] = []
+        self._seen_links = set()
+        # Tag that opened the skipped section and how deeply that same tag is nested in it
+        self._skip_tag: Optional[str] = None
+        self._skip_depth = 0
+        self._main_depth = 0
+        # Set between <body> and its first element, the page's top-level wrapper
+        self._at_body_start = False
+        self._in_title = False
+        self._in_pre = False
+        self._tables: List[List[List[str]]] = []
+        self._cell: Optional[List[str]] = None
+        self._link: Optional[Dict[str, str]] = None
+
+    def _emit(self, text: str):
+        if self._cell is not None:
+            self._cell.append(text)
+            return
+        self.parts.append(text)
+        if self._main_depth:
+            self.main_parts.append(text)
+
+    def _is_boilerplate(self, tag: str, attrs: Dict[str, str]) -> bool:
+        if tag in VOID_TAGS or tag in CONTENT_TAGS or attrs.get("role") == "main" or self._at_body_start:
+            return False
+        if attrs.get("role", "").lower() in BOILERPLATE_ROLES or "hidden" in attrs or attrs.get("aria-hidden") == "true":
+            return True
+        names = f"{attrs.get('id', '')} {attrs.get('class', '')}".lower().split()
+        return any(name in BOILERPLATE_NAMES for name in names)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k: v or "" for k, v in attrs}
+        if self._skip_tag is not None:
+            # Only the opening tag is counted: other elements inside may be left unclosed (<li>, <p>)
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        if tag in SKIP_TAGS or (tag in PAGE_HEADER_TAGS and not self._main_depth) or self._is_boilerplate(tag, attrs):
+            if tag not in VOID_TAGS:
+                self._skip_tag = tag
+                self._skip_depth = 1
+            return
+        if tag not in VOID_TAGS:
+            self._at_body_start = tag == "body"
+
+        if tag == "title":
+            self._in_title = True
+        elif tag in ("main", "article") or attrs.get("role") == "main":
+            if self.main_parts is None:
+                self.main_parts = []
+            if tag not in VOID_TAGS:
+                self._main_depth += 1
+        elif tag == "table":
+            self._tables.append([])
+        elif tag == "tr" and self._tables:
+            self._tables[-1].append([])
+        elif tag in ("td", "th") and self._tables:
+            if not self._tables[-1]:
+                self._tables[-1].append([])
+            self._cell = []
+        elif re.fullmatch(r"h[1-6]", tag):
+            self._emit("\n\n" + ("#" * int(tag[1]) + " " if self.markdown else ""))
+        elif tag == "li":
+            self._emit("\n- " if self.markdown else "\n")
+        elif tag == "br":
+            self._emit("\n")
+        elif tag == "pre":
+            self._in_pre = True
+            self._emit("\n\n```\n" if self.markdown else "\n\n")
+        elif tag in BLOCK_TAGS:
+            self._emit("\n\n")
+        elif tag == "a" and attrs.get("href"):
+            href = urldefrag(urljoin(self.base_url, attrs["href"]))[0]
+            if href.startswith(("http://", "https://")):
+                self._link = {"url": href, "text": ""}
+
+    def handle_endtag(self, tag):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skip_tag = None
+            return
+
+        if tag == "title":
+            self._in_title = False
+        elif tag in ("main", "article") and self._main_depth:
+            self._main_depth -= 1
+        elif tag in ("td", "th") and self._cell is not None:
+            self._tables[-1][-1].append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "table" and self._tables:
+            rows = [row for row in self._tables.pop() if any(row)]
+            if rows:
+                self.tables.append(rows)
+                self._emit("\n\n" + render_table(rows, self.markdown) + "\n\n")
+        elif re.fullmatch(r"h[1-6]", tag):
+            self._emit("\n\n")
+        elif tag == "pre":
+            self._in_pre = False
+            self._emit("\n```\n\n" if self.markdown else "\n\n")
+        elif tag in BLOCK_TAGS:
+            self._emit("\n\n")
+        elif tag == "a" and self._link is not None:
+            link, self._link = self._link, None
+            link["text"] = " ".join(link["text"].split())
+            if link["text"] and link["url"] not in self._seen_links and len(self.links) < MAX_LINKS:
+                self._seen_links.add(link["url"])
+                self.links.append(link)
+
+    def handle_data(self, data):
+        if self._skip_tag is not None:
+            return
+        if self._in_title:
+            self.title += data
+            return
+        if self._link is not None:
+            self._link["text"] += data
+        self._emit(data if self._in_pre else re.sub(r"\s+", " ", data))
+
+    def get_text(self) -> str:
+        # Prefer the page's main/article content when it has a meaningful amount of text
+        parts = self.main_parts if self.main_parts and len("".join(self.main_parts).strip()) > 200 else self.parts
+        text = "".join(parts)
+        text = re.sub(r"[ \t]+\n", "\n", text)
+        # Collapsed whitespace leaves at most one space after a newline; longer runs are from <pre>
+        text = re.sub(r"\n (?! )", "\n", text)
+        text = re.sub(r"\n{3,}", "\n\n", text)
+        return text.strip()
+
+
+def render_table(rows: List[List[str]], markdown: bool = True) -> str:
+    if not markdown:
+        return "\n".join("\t".join(row) for row in rows)
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = ["| " + " | ".join(cell.replace("|", "\\|") for cell in row) + " |" for row in rows]
+    lines.insert(1, "|" + " --- |" * width)
+    return "\n".join(lines)
+
+
+def _decode(content: bytes, content_type: str) -> str:
+    match = re.search(r"charset=([\w-]+)", content_type, re.IGNORECASE)
+    if not match:
+        match = re.search(rb"<meta[^>]+charset=[\"']?([\w-]+)", content[:4096], re.IGNORECASE)
+    encoding = match.group(1) if match else "utf-8"
+    if isinstance(encoding, bytes):
+        encoding = encoding.decode("ascii")
+    try:
+        return content.decode(encoding, errors="replace")
+    except LookupError:
+        return content.decode("utf-8", errors="replace")
+
+
+def _get_cached(key: tuple) -> Optional[Dict]:
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.time() - stored_at > CACHE_TTL:
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return result
+
+
+def _put_cached(key: tuple, result: Dict):
+    with _cache_lock:
+        _cache[key] = (time.time(), result)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _fetch(url: str, output_format: str) -> Dict:
+    response = _session.get(url, stream=True, timeout=TIMEOUT, allow_redirects=True)
+    try:
+        response.raise_for_status()
+        content_length = response.headers.get("Content-Length")
+        if content_length and int(content_length) > MAX_BYTES:
+            return {"error": f"Page '{url}' is larger than {MAX_BYTES // (1024 * 1024)}MB, use a download tool instead"}
+
+        content = bytearray()
+        truncated = False
+        for chunk in response.iter_content(chunk_size=65536):
+            content.extend(chunk)
+            if len(content) > MAX_BYTES:
+                del content[MAX_BYTES:]
+                truncated = True
+                break
+        content_type = response.headers.get("Content-Type", "")
+        final_url = response.url
+    finally:
+        response.close()
+
+    mime_type = content_type.split(";")[0].strip().lower()
+    text = _decode(bytes(content), content_type)
+    result = {"url": url, "final_url": final_url, "content_type": mime_type, "truncated_download": truncated}
+
+    if mime_type in ("text/html", "application/xhtml+xml") or (not mime_type and "<html" in text[:1024].lower()):
+        parser = _ReadableHTMLParser(final_url, markdown=output_format == "markdown")
+        parser.feed(text)
+        parser.close()
+        result.update({
+            "title": " ".join(parser.title.split()),
+            "content": parser.get_text(),
+            "tables": parser.tables,
+            "links": parser.links,
+        })
+    elif mime_type.startswith("text/") or mime_type in ("application/json", "application/xml", "application/javascript"):
+        result["content"] = text
+    else:
+        return {"error": f"Unsupported content type '{mime_type}' for '{url}'. Use browser_use or download the file instead."}
+    return result
+
+
+@tool(timeout=60)
+def fetch_url(
+    url: str,
+    output_format: str = "markdown",
+    include_links: bool = False,
+    include_tables: bool = False,
+    max_chars: int = 20000,
+) -> str:
+    """
+    Fetch a web page with a plain HTTP GET and return its readable text. Much faster than browser_use;
+    prefer it whenever the URL is known and the page does not need JavaScript or interaction.
+
+    Args:
+        url: The http(s) URL to fetch.
+        output_format: "markdown" (default) or "text".
+        include_links: Whether to also return the links found in the page content (default: False).
+        include_tables: Whether to also return the page's tables as lists of rows; they are always
+                        rendered inline in the content as well (default: False).
+        max_chars: Maximum number of characters of page content to return (default: 20000).
+
+    Returns:
+        A JSON string with the page title, readable content and optionally its tables and links.
+    """
+    if not url.startswith(("http://", "https://")):
+        return json.dumps({"error": f"Invalid URL '{url}', only http(s) URLs are supported"})
+    if output_format not in ("markdown", "text"):
+        return json.dumps({"error": f"Invalid output_format '{output_format}', expected 'markdown' or 'text'"})
+
+    key = (url, output_format)
+    result = _get_cached(key)
+    cached = result is not None
+    if not cached:
+        try:
+            result = _fetch(url, output_format)
+        except requests.exceptions.HTTPError as e:
+            return json.dumps({"error": f"HTTP Error {e.response.status_code} fetching '{url}'"})
+        except Exception as e:
+            return json.dumps({"error": f"Fetching '{url}' failed: {str(e)}"})
+        if "error" in result:
+            return json.dumps(result)
+        _put_cached(key, result)
+
+    output = dict(result, success=True, cached=cached)
+    if not include_links:
+        output.pop("links", None)
+    if not include_tables:
+        output.pop("tables", None)
+    content = output.get("content", "")
+    max_chars = max(1, int(max_chars))
+    if len(content) > max_chars:
+        output["content"] = content[:max_chars]
+        output["truncated"] = True
+        output["total_chars"] = len(content)
+    return json.dumps(output, ensure_ascii=False)
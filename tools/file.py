@@ -3,7 +3,7 @@ import json
 from .config import get_workspace_path, is_path_in_workspace
 from .decorator import tool
 
-@tool()
+@tool(memoize=True, path_args=["file_path"])
 def read_file(file_path: str) -> str:
     """
     Read the content of a file.
@@ -1,8 +1,31 @@
 import os
+import json
+import mmap
+import hashlib
 import tempfile
-from typing import List, Optional, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 import requests
+from config import Config
+from events import publish
+from .config import PROJECT_ROOT
+
+config = Config()
+
+DOWNLOAD_CACHE_DIR = config.get("tool.download.cache_dir") or os.path.join(PROJECT_ROOT, ".cache", "downloads")
+CHUNK_SIZE = 1024 * 1024
+# Files at least this large are fetched with parallel range requests when the server allows it
+RANGE_THRESHOLD = int(config.get("tool.download.range_threshold_mb", 16) * 1024 * 1024)
+RANGE_PARTS = int(config.get("tool.download.range_parts", 4))
+# Least recently used downloads are deleted once the cache grows beyond this
+MAX_CACHE_BYTES = int(config.get("tool.download.max_cache_mb", 2048) * 1024 * 1024)
+
+_session = requests.Session()
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=RANGE_PARTS * 4))
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=RANGE_PARTS * 4))
+_cache_lock = threading.Lock()
 
 
 def get_mime_type(file_path: str, default_mime: Optional[str] = None) -> str:
@@ -51,20 +74,251 @@ def get_mime_type(file_path: str, default_mime: Optional[str] = None) -> str:
         return extension_mime_map.get(ext, default_mime or "application/octet-stream")
 
 
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+]
+
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """MIME type of an image from its first bytes, or None when they match no known format"""
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[4:8] == b"ftyp" and header[8:12] in (b"heic", b"heix", b"mif1", b"avif"):
+        return "image/avif" if header[8:12] == b"avif" else "image/heic"
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    return None
+
+
 def is_url(path_or_url: str) -> bool:
     parsed = urlparse(path_or_url)
     return bool(parsed.scheme and parsed.netloc)
 
 
-def get_file_from_source(
+def _cache_paths(url: str) -> Tuple[str, str]:
+    """Return (metadata path, blob directory) for a URL in the download cache."""
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(DOWNLOAD_CACHE_DIR, "urls", f"{key}.json"), os.path.join(DOWNLOAD_CACHE_DIR, "blobs")
+
+
+def _load_cache_entry(meta_path: str) -> Optional[Dict]:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(entry.get("blob_path", "")):
+        return None
+    return entry
+
+
+def _write_json_atomic(path: str, data: Dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _stream_to_file(response: requests.Response, file_obj, max_size_bytes: float, max_size_mb: float, digest) -> int:
+    downloaded_size = 0
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        downloaded_size += len(chunk)
+        if downloaded_size > max_size_bytes:
+            raise ValueError(f"File size exceeds limit of {max_size_mb}MB")
+        file_obj.write(chunk)
+        digest.update(chunk)
+    return downloaded_size
+
+
+def _download_ranges(url: str, file_path: str, total_size: int, timeout: int, headers: Dict[str, str]):
+    """Fetch byte ranges of url concurrently and write each one in place."""
+    part_size = -(-total_size // RANGE_PARTS)
+    ranges = [(start, min(start + part_size, total_size) - 1) for start in range(0, total_size, part_size)]
+
+    with open(file_path, "r+b") as f:
+        f.truncate(total_size)
+        fd = f.fileno()
+
+        def fetch(byte_range: Tuple[int, int]):
+            start, end = byte_range
+            range_headers = dict(headers, Range=f"bytes={start}-{end}")
+            with _session.get(url, headers=range_headers, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise IOError("Server ignored the range request")
+                offset = start
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if offset + len(chunk) > end + 1:
+                        raise IOError("Server returned more data than requested")
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+                if offset != end + 1:
+                    raise IOError(f"Incomplete range {start}-{end}")
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            list(executor.map(fetch, ranges))
+
+
+def _evict_blobs(blob_dir: str, keep: str):
+    """Delete the least recently used blobs until the cache fits MAX_CACHE_BYTES; keep is never deleted."""
+    blobs = []
+    total = 0
+    try:
+        with os.scandir(blob_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".part") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                blobs.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    except OSError:
+        return
+    blobs.sort()
+    for _, size, path in blobs:
+        if total <= MAX_CACHE_BYTES:
+            break
+        if path == keep:
+            continue
+        try:
+            # The URL entry pointing at it becomes a cache miss
+            os.unlink(path)
+            total -= size
+        except OSError:
+            continue
+
+
+def _hash_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def download_file(url: str, max_size_mb: float = 100.0, timeout: int = 60, use_cache: bool = True) -> Tuple[str, Dict[str, str]]:
+    """
+    Download a URL into the content-addressed download cache, streaming straight to disk.
+
+    A cached copy is revalidated with the server using its ETag / Last-Modified validators
+    and reused on a 304 response. Large files are fetched with parallel range requests when
+    the server advertises support for them.
+
+    Args:
+        url: The URL to download
+        max_size_mb: Maximum allowed file size in MB
+        timeout: Timeout for each request in seconds
+        use_cache: Whether to reuse and populate the download cache
+
+    Returns:
+        Tuple[str, Dict[str, str]]: (path of the cached file, response headers)
+
+    Raises:
+        ValueError: When the file exceeds the size limit
+        requests.RequestException: When the request fails
+    """
+    max_size_bytes = max_size_mb * 1024 * 1024
+    meta_path, blob_dir = _cache_paths(url)
+    os.makedirs(blob_dir, exist_ok=True)
+
+    entry = _load_cache_entry(meta_path) if use_cache else None
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = _session.get(url, headers=headers, stream=True, timeout=timeout)
+    try:
+        if entry and response.status_code == 304:
+            try:
+                # Eviction goes by modification time, so mark the blob as recently used
+                os.utime(entry["blob_path"])
+            except OSError:
+                pass
+            return entry["blob_path"], entry.get("headers", {})
+        response.raise_for_status()
+
+        # Check Content-Length if available
+        content_length = response.headers.get("Content-Length")
+        if content_length and int(content_length) > max_size_bytes:
+            raise ValueError(f"File size exceeds limit of {max_size_mb}MB")
+
+        fd, tmp_path = tempfile.mkstemp(dir=blob_dir, suffix=".part")
+        try:
+            use_ranges = (
+                content_length
+                and int(content_length) >= RANGE_THRESHOLD
+                and response.headers.get("Accept-Ranges", "").lower() == "bytes"
+                and "Content-Encoding" not in response.headers
+            )
+            content_hash = None
+            if use_ranges:
+                response.close()
+                os.close(fd)
+                # If-Range makes the server send the whole file instead if it changed in between
+                range_headers = {"If-Range": response.headers["ETag"]} if response.headers.get("ETag") else {}
+                try:
+                    _download_ranges(url, tmp_path, int(content_length), timeout, range_headers)
+                    content_hash = _hash_file(tmp_path)
+                except (IOError, requests.RequestException):
+                    response = _session.get(url, stream=True, timeout=timeout)
+                    response.raise_for_status()
+                    fd = os.open(tmp_path, os.O_WRONLY | os.O_TRUNC)
+            if content_hash is None:
+                digest = hashlib.sha256()
+                with os.fdopen(fd, "wb") as f:
+                    _stream_to_file(response, f, max_size_bytes, max_size_mb, digest)
+                content_hash = digest.hexdigest()
+
+            blob_path = os.path.join(blob_dir, content_hash)
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        kept_headers = {k: v for k, v in response.headers.items() if k.lower() in ("content-type", "etag", "last-modified")}
+        with _cache_lock:
+            if use_cache:
+                _write_json_atomic(meta_path, {
+                    "url": url,
+                    "blob_path": blob_path,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "headers": kept_headers,
+                })
+            _evict_blobs(blob_dir, keep=blob_path)
+        return blob_path, kept_headers
+    finally:
+        response.close()
+
+
+def map_file(file_path: str) -> Union[mmap.mmap, bytes]:
+    """Return a read-only memory-mapped view of a file (empty files cannot be mapped)."""
+    if os.path.getsize(file_path) == 0:
+        return b""
+    with open(file_path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def get_path_from_source(
     source: str,
     allowed_mime_prefixes: List[str] = None,
     max_size_mb: float = 100.0,
     timeout: int = 60,
     type: str = "image",
-) -> Tuple[str, str, bytes]:
+) -> Tuple[str, str]:
     """
-    Unified function to get file content from a URL or local path with validation.
+    Resolve a URL or local path to a validated local file, without reading it.
 
     Args:
         source: URL or local file path
@@ -73,8 +327,8 @@ def get_file_from_source(
         timeout: Timeout for URL requests in seconds
 
     Returns:
-        Tuple[str, str, bytes]: (file_path, mime_type, file_content)
-        - For URLs, file_path will be a temporary file path
+        Tuple[str, str]: (file_path, mime_type)
+        - For URLs, file_path is the file in the download cache; it is shared and must not be deleted
         - For local files, file_path will be the original path
 
     Raises:
@@ -83,90 +337,79 @@ def get_file_from_source(
         requests.RequestException: When URL request fails
     """
     max_size_bytes = max_size_mb * 1024 * 1024
-    temp_file = None
+    mime_type = "application/octet-stream"
+    headers = {}
 
-    try:
-        if is_url(source):
-            # Handle URL
-            print(f"Downloading file from URL: {source}")
-            response = requests.get(source, stream=True, timeout=timeout)
-            response.raise_for_status()
-
-            # Check Content-Length if available
-            content_length = response.headers.get("Content-Length")
-            if content_length and int(content_length) > max_size_bytes:
-                raise ValueError(f"File size exceeds limit of {max_size_mb}MB")
-
-            # Create a temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False)
-            file_path = temp_file.name
-
-            # Download content in chunks to avoid memory issues
-            content = bytearray()
-            downloaded_size = 0
-            for chunk in response.iter_content(chunk_size=8192):
-                downloaded_size += len(chunk)
-                if downloaded_size > max_size_bytes:
-                    raise ValueError(f"File size exceeds limit of {max_size_mb}MB")
-                temp_file.write(chunk)
-                content.extend(chunk)
-
-            temp_file.close()
-
-            # Get MIME type
-            if type == "audio":
-                mime_type = "audio/mpeg"
-            elif type == "image":
-                mime_type = "image/jpeg"
-            elif type == "video":
-                mime_type = "video/mp4"
-
-            # mime_type = get_mime_type(file_path)
-
-            # For URLs where magic fails, try to use Content-Type header
-            if mime_type == "application/octet-stream":
-                content_type = response.headers.get("Content-Type", "").split(";")[0]
-                if content_type:
-                    mime_type = content_type
-        else:
-            # Handle local file
-            file_path = os.path.abspath(source)
-
-            # Check if file exists
-            if not os.path.exists(file_path):
-                raise ValueError(f"File not found: {file_path}")
-
-            # Check file size
-            file_size = os.path.getsize(file_path)
-            if file_size > max_size_bytes:
-                raise ValueError(f"File size exceeds limit of {max_size_mb}MB")
-
-            # Get MIME type
-            if type == "audio":
-                mime_type = "audio/mpeg"
-            elif type == "image":
-                mime_type = "image/jpeg"
-            elif type == "video":
-                mime_type = "video/mp4"
-            # mime_type = get_mime_type(file_path)
-
-            # Read file content
-            with open(file_path, "rb") as f:
-                content = f.read()
-
-        # Validate MIME type if allowed_mime_prefixes is provided
-        if allowed_mime_prefixes:
-            if not any(
-                mime_type.startswith(prefix) for prefix in allowed_mime_prefixes
-            ):
-                allowed_types = ", ".join(allowed_mime_prefixes)
-                raise ValueError(
-                    f"Invalid file type: {mime_type}. Allowed types: {allowed_types}"
-                )
-
-        return file_path, mime_type, content
-
-    except Exception as e:
-        if temp_file and os.path.exists(temp_file.name):
-            os.unlink(temp_file.name)
-        raise e
+    if is_url(source):
+        # Handle URL
+        publish("download_started", "debug", url=source, message=f"Downloading file from URL: {source}")
+        file_path, headers = download_file(source, max_size_mb=max_size_mb, timeout=timeout)
+        if os.path.getsize(file_path) > max_size_bytes:
+            raise ValueError(f"File size exceeds limit of {max_size_mb}MB")
+    else:
+        # Handle local file
+        file_path = os.path.abspath(source)
+
+        # Check if file exists
+        if not os.path.exists(file_path):
+            raise ValueError(f"File not found: {file_path}")
+
+        # Check file size
+        file_size = os.path.getsize(file_path)
+        if file_size > max_size_bytes:
+            raise ValueError(f"File size exceeds limit of {max_size_mb}MB")
+
+    # Get MIME type
+    if type == "audio":
+        mime_type = "audio/mpeg"
+    elif type == "image":
+        with open(file_path, "rb") as f:
+            mime_type = sniff_image_type(f.read(16)) or mime_type
+    elif type == "video":
+        mime_type = "video/mp4"
+    # mime_type = get_mime_type(file_path)
+
+    # For URLs where magic fails, try to use Content-Type header
+    if mime_type == "application/octet-stream":
+        content_type = headers.get("Content-Type", "").split(";")[0]
+        if content_type:
+            mime_type = content_type
+
+    # Validate MIME type if allowed_mime_prefixes is provided
+    if allowed_mime_prefixes:
+        if not any(
+            mime_type.startswith(prefix) for prefix in allowed_mime_prefixes
+        ):
+            allowed_types = ", ".join(allowed_mime_prefixes)
+            raise ValueError(
+                f"Invalid file type: {mime_type}. Allowed types: {allowed_types}"
+            )
+
+    return file_path, mime_type
+
+
+def get_file_from_source(
+    source: str,
+    allowed_mime_prefixes: List[str] = None,
+    max_size_mb: float = 100.0,
+    timeout: int = 60,
+    type: str = "image",
+) -> Tuple[str, str, Union[mmap.mmap, bytes]]:
+    """
+    Unified function to get file content from a URL or local path with validation.
+
+    Takes the same arguments as get_path_from_source, which callers that only need the
+    file should use instead.
+
+    Returns:
+        Tuple[str, str, mmap]: (file_path, mime_type, file_content)
+        - file_content is a read-only memory-mapped view of the file, not a copy in memory;
+          the caller owns it and should close it when done (an mmap works with "with")
+
+    Raises:
+        ValueError: When file doesn't exist, exceeds size limit, or has invalid MIME type
+        IOError: When file cannot be read
+        requests.RequestException: When URL request fails
+    """
+    file_path, mime_type = get_path_from_source(source, allowed_mime_prefixes, max_size_mb, timeout, type)
+    return file_path, mime_type, map_file(file_path)
@@ -0,0 +1,139 @@
+import io
+import os
+import json
+import hashlib
+from typing import Dict, Tuple
+from config import Config
+from .config import PROJECT_ROOT
+from .file_utils import _hash_file, _write_json_atomic, sniff_image_type
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+config = Config()
+
+IMAGE_CACHE_DIR = config.get("tool.image.cache_dir") or os.path.join(PROJECT_ROOT, ".cache", "images")
+# Longest side and encoded size of the images sent to a model
+MAX_SIDE = int(config.get("tool.image.max_side", 1568))
+MAX_BYTES = int(config.get("tool.image.max_kb", 800) * 1024)
+JPEG_QUALITIES = (85, 75, 65, 55, 45)
+MIN_SIDE = 256
+# Formats every vision model accepts as they are
+UPLOAD_FORMATS = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif", "image/webp": ".webp"}
+
+
+def _encode(image: "Image.Image", format: str, **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+
+def _shrink(image: "Image.Image", max_side: int) -> "Image.Image":
+    if max(image.size) <= max_side:
+        return image
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return image
+
+
+def _recompress(image: "Image.Image") -> Tuple[bytes, str, "Image.Image"]:
+    """Smallest-effort encoding within MAX_BYTES: PNG for transparent images if it fits, else JPEG at falling quality and size"""
+    image = _shrink(image, MAX_SIDE)
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        image = image.convert("RGBA")
+        data = _encode(image, "PNG", optimize=True)
+        if len(data) <= MAX_BYTES:
+            return data, "image/png", image
+        # JPEG has no alpha channel; flatten onto white
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    image = image.convert("RGB")
+
+    while True:
+        for quality in JPEG_QUALITIES:
+            data = _encode(image, "JPEG", quality=quality, optimize=True, progressive=True)
+            if len(data) <= MAX_BYTES:
+                return data, "image/jpeg", image
+        if max(image.size) <= MIN_SIDE:
+            return data, "image/jpeg", image
+        image = _shrink(image, int(max(image.size) * 0.75))
+
+
+def _process(file_path: str, mime_type: str) -> Tuple[bytes, str, int, int]:
+    """Encoded bytes, MIME type and size of the variant of an image to upload"""
+    if Image is None:
+        if mime_type in UPLOAD_FORMATS and os.path.getsize(file_path) <= MAX_BYTES:
+            with open(file_path, "rb") as f:
+                return f.read(), mime_type, 0, 0
+        raise RuntimeError("Resizing or converting images needs the Pillow package (pip install Pillow)")
+
+    with Image.open(file_path) as image:
+        # Animated images are reduced to their first frame
+        image.seek(0)
+        image = ImageOps.exif_transpose(image)
+        width, height = image.size
+        if mime_type in UPLOAD_FORMATS and max(width, height) <= MAX_SIDE and os.path.getsize(file_path) <= MAX_BYTES:
+            # Already small enough: recompressing would only lose quality
+            with open(file_path, "rb") as f:
+                return f.read(), mime_type, width, height
+        data, mime_type, image = _recompress(image)
+        return data, mime_type, image.size[0], image.size[1]
+
+
+def prepare_image(file_path: str) -> Dict:
+    """
+    Ready a local image for upload to a model: sniff its real format, downscale it to MAX_SIDE,
+    and recompress it to MAX_BYTES.
+
+    The processed variant is cached on disk by content hash and settings, so each image is only
+    processed once.
+
+    Args:
+        file_path: Path of the image file
+
+    Returns:
+        Dict with "path" of the processed file, "mime_type", "width", "height" (0 when unknown),
+        "original_bytes", "bytes" and "cached"
+
+    Raises:
+        ValueError: When the file is not a recognised image
+        RuntimeError: When the image needs processing and Pillow is not installed
+    """
+    with open(file_path, "rb") as f:
+        mime_type = sniff_image_type(f.read(16))
+    if mime_type is None:
+        raise ValueError(f"'{file_path}' is not a recognised image file")
+
+    settings = f"{MAX_SIDE}:{MAX_BYTES}:{Image is not None}"
+    key = hashlib.sha256(f"{_hash_file(file_path)}:{settings}".encode("utf-8")).hexdigest()
+    meta_path = os.path.join(IMAGE_CACHE_DIR, f"{key}.json")
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if os.path.exists(meta["path"]):
+            return dict(meta, cached=True)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    data, processed_type, width, height = _process(file_path, mime_type)
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    processed_path = os.path.join(IMAGE_CACHE_DIR, key + EXTENSIONS[processed_type])
+    tmp_path = f"{processed_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, processed_path)
+
+    meta = {
+        "path": processed_path,
+        "mime_type": processed_type,
+        "width": width,
+        "height": height,
+        "original_bytes": os.path.getsize(file_path),
+        "bytes": len(data),
+    }
+    _write_json_atomic(meta_path, meta)
+    return dict(meta, cached=False)
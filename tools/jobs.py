@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import atexit
+import signal
+import asyncio
+import threading
+import subprocess
+import contextvars
+from typing import Dict, List, Optional
+from config import Config
+from .config import PROJECT_ROOT, get_workspace_path
+from .decorator import tool
+
+config = Config()
+
+SPOOL_DIR = config.get("tool.jobs.spool_dir") or os.path.join(PROJECT_ROOT, ".cache", "jobs")
+MAX_RUNNING = config.get("tool.jobs.max_running", 8)
+MAX_WAIT = config.get("tool.jobs.max_wait_seconds", 600)
+MAX_OUTPUT_CHARS = config.get("tool.jobs.max_output_chars", 4000)
+KILL_GRACE_SECONDS = 5
+
+# Session on whose behalf a tool runs; set by the agent around each tool call
+current_session_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_session_id", default=None)
+
+
+class Job:
+    """A shell command running in the background, with its output spooled to a file"""
+
+    def __init__(self, job_id: str, command: str, owner: Optional[str], log_path: str, process: subprocess.Popen):
+        self.job_id = job_id
+        self.command = command
+        self.owner = owner
+        self.log_path = log_path
+        self.process = process
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.read_offset = 0
+        self.killed = False
+
+    def returncode(self) -> Optional[int]:
+        returncode = self.process.poll()
+        if returncode is not None and self.finished_at is None:
+            self.finished_at = time.time()
+        return returncode
+
+    def status(self) -> Dict:
+        returncode = self.returncode()
+        if returncode is None:
+            state = "running"
+        else:
+            state = "killed" if self.killed else "exited"
+        return {
+            "job_id": self.job_id,
+            "command": self.command,
+            "status": state,
+            "returncode": returncode,
+            "runtime_seconds": round((self.finished_at or time.time()) - self.started_at, 1),
+        }
+
+    def read_new_output(self, max_chars: int) -> Dict:
+        """Output written since the last read; only the tail is returned if there is more than max_chars"""
+        with open(self.log_path, "rb") as f:
+            f.seek(self.read_offset)
+            data = f.read()
+        self.read_offset += len(data)
+        text = data.decode("utf-8", errors="replace")
+        skipped = max(0, len(text) - max_chars)
+        return {"output": text[skipped:], "skipped_chars": skipped, "output_bytes_total": self.read_offset}
+
+    def kill(self):
+        if self.returncode() is not None:
+            return
+        self.killed = True
+        # The shell runs in its own process group, so its children are stopped with it
+        try:
+            if os.name == "posix":
+                os.killpg(self.process.pid, signal.SIGTERM)
+            else:
+                self.process.terminate()
+            self.process.wait(KILL_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            if os.name == "posix":
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+            self.process.wait()
+        except ProcessLookupError:
+            pass
+        self.returncode()
+
+
+class JobManager:
+    """
+    Background jobs of every session in this process.
+
+    Jobs belong to the session that started them: a session only sees its own jobs, and
+    cleanup() at the end of the session kills whatever is still running and removes the
+    spooled output.
+    """
+
+    def __init__(self, spool_dir: str = SPOOL_DIR):
+        self.spool_dir = spool_dir
+        self.jobs: Dict[str, Job] = {}
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def start(self, command: str, owner: Optional[str]) -> Job:
+        with self.lock:
+            running = [job for job in self.jobs.values() if job.owner == owner and job.returncode() is None]
+            if len(running) >= MAX_RUNNING:
+                raise RuntimeError(f"{len(running)} jobs are already running; wait for or kill one first")
+            self.counter += 1
+            job_id = f"job_{self.counter}"
+
+        workspace_dir = get_workspace_path()
+        os.makedirs(workspace_dir, exist_ok=True)
+        os.makedirs(self.spool_dir, exist_ok=True)
+        log_path = os.path.join(self.spool_dir, f"{os.getpid()}_{job_id}.log")
+        with open(log_path, "wb") as log:
+            process = subprocess.Popen(
+                command,
+                shell=True,
+                cwd=workspace_dir,
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=os.name == "posix",
+            )
+        job = Job(job_id, command, owner, log_path, process)
+        with self.lock:
+            self.jobs[job_id] = job
+        return job
+
+    def get(self, job_id: str, owner: Optional[str]) -> Job:
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None or job.owner != owner:
+            raise KeyError(f"No background job '{job_id}'")
+        return job
+
+    def list(self, owner: Optional[str]) -> List[Job]:
+        with self.lock:
+            return [job for job in self.jobs.values() if job.owner == owner]
+
+    def cleanup(self, owner: Optional[str]) -> int:
+        """Kill the owner's running jobs and forget all of them; returns how many were killed"""
+        with self.lock:
+            jobs = [job for job in self.jobs.values() if job.owner == owner]
+            for job in jobs:
+                del self.jobs[job.job_id]
+        killed = 0
+        for job in jobs:
+            if job.returncode() is None:
+                job.kill()
+                killed += 1
+            try:
+                os.unlink(job.log_path)
+            except OSError:
+                pass
+        return killed
+
+    def cleanup_all(self):
+        with self.lock:
+            owners = {job.owner for job in self.jobs.values()}
+        for owner in owners:
+            self.cleanup(owner)
+
+
+_manager = JobManager()
+atexit.register(_manager.cleanup_all)
+
+
+def get_job_manager() -> JobManager:
+    return _manager
+
+
+def _job_result(job: Job, max_chars: int) -> str:
+    return json.dumps({"success": True, **job.status(), **job.read_new_output(max_chars)}, ensure_ascii=False)
+
+
+@tool(timeout=30)
+def start_background_job(command: str) -> str:
+    """
+    Start a shell command in the background and return at once with its job id.
+    Use it for anything that may take longer than a minute (builds, installs, downloads, training),
+    then keep working and check on it with poll_background_job or wait_background_job.
+
+    Args:
+        command: The shell command to run in the workspace directory.
+
+    Returns:
+        A JSON string with the job id and process id.
+    """
+    try:
+        job = get_job_manager().start(command, current_session_id.get())
+        return json.dumps({"success": True, "job_id": job.job_id, "pid": job.process.pid, "command": command})
+    except Exception as e:
+        return json.dumps({"error": f"Starting background job '{command}' failed: {str(e)}"})
+
+
+@tool(timeout=30)
+def poll_background_job(job_id: str = "", max_chars: int = MAX_OUTPUT_CHARS) -> str:
+    """
+    Check a background job without waiting: its status, exit code, and the output it produced since the last check.
+    Without a job id, list the status of all background jobs.
+
+    Args:
+        job_id: The job to check (default: list all jobs).
+        max_chars: Maximum characters of new output to return; only the latest output is kept beyond that.
+
+    Returns:
+        A JSON string with the job status and new output, or the list of jobs.
+    """
+    try:
+        manager = get_job_manager()
+        owner = current_session_id.get()
+        if not job_id:
+            return json.dumps({"success": True, "jobs": [job.status() for job in manager.list(owner)]}, ensure_ascii=False)
+        return _job_result(manager.get(job_id, owner), max_chars)
+    except KeyError as e:
+        return json.dumps({"error": str(e.args[0])})
+    except Exception as e:
+        return json.dumps({"error": f"Polling background job '{job_id}' failed: {str(e)}"})
+
+
+@tool(timeout=MAX_WAIT + 30)
+async def wait_background_job(job_id: str, timeout: float = 60, max_chars: int = MAX_OUTPUT_CHARS) -> str:
+    """
+    Wait until a background job finishes or the timeout passes, then report like poll_background_job.
+
+    Args:
+        job_id: The job to wait for.
+        timeout: Maximum seconds to wait (default: 60).
+        max_chars: Maximum characters of new output to return; only the latest output is kept beyond that.
+
+    Returns:
+        A JSON string with the job status and new output; the status is still "running" if the timeout passed.
+    """
+    try:
+        job = get_job_manager().get(job_id, current_session_id.get())
+        deadline = time.monotonic() + max(0.0, min(float(timeout), MAX_WAIT))
+        while job.returncode() is None and time.monotonic() < deadline:
+            await asyncio.sleep(min(0.5, max(0.0, deadline - time.monotonic())))
+        return _job_result(job, max_chars)
+    except KeyError as e:
+        return json.dumps({"error": str(e.args[0])})
+    except Exception as e:
+        return json.dumps({"error": f"Waiting for background job '{job_id}' failed: {str(e)}"})
+
+
+@tool(timeout=30)
+def kill_background_job(job_id: str) -> str:
+    """
+    Stop a background job and everything it started, and return its remaining output.
+
+    Args:
+        job_id: The job to stop.
+
+    Returns:
+        A JSON string with the final job status and its output since the last check.
+    """
+    try:
+        job = get_job_manager().get(job_id, current_session_id.get())
+        job.kill()
+        return _job_result(job, MAX_OUTPUT_CHARS)
+    except KeyError as e:
+        return json.dumps({"error": str(e.args[0])})
+    except Exception as e:
+        return json.dumps({"error": f"Killing background job '{job_id}' failed: {str(e)}"})
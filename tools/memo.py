@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from config import Config
+from .config import get_workspace_path
+
+config = Config()
+
+MAX_ENTRIES = config.get("tool.memoize.max_entries", 512)
+
+
+def _path_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(get_workspace_path(path))
+    except (OSError, TypeError, ValueError):
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ToolCache:
+    """
+    Process-wide LRU cache of tool results keyed by (tool name, canonical arguments).
+
+    Entries of filesystem tools are validated against the mtime and size of their path
+    arguments, and entries with a TTL expire after it. Filesystem entries are also dropped
+    whenever a tool that may have side effects runs.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(tool_name: str, arguments: Dict[str, Any]) -> Tuple[str, str]:
+        return tool_name, json.dumps(arguments, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+    @staticmethod
+    def _signatures(arguments: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+        return {arg: _path_signature(arguments[arg]) for arg in options["path_args"] if arg in arguments}
+
+    def get(self, tool_name: str, arguments: Dict[str, Any], options: Dict[str, Any]) -> Optional[str]:
+        key = self.make_key(tool_name, arguments)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        expired = options["ttl"] is not None and time.time() - entry["stored_at"] > options["ttl"]
+        if expired or entry["signatures"] != self._signatures(arguments, options):
+            with self.lock:
+                self.entries.pop(key, None)
+            return None
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+        return entry["result"]
+
+    def put(self, tool_name: str, arguments: Dict[str, Any], options: Dict[str, Any], result: str):
+        key = self.make_key(tool_name, arguments)
+        entry = {
+            "result": result,
+            "stored_at": time.time(),
+            "signatures": self._signatures(arguments, options),
+            "filesystem": bool(options["path_args"]),
+        }
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate_filesystem(self):
+        """Drop every filesystem entry; a path's own mtime does not reflect changes deeper in a tree"""
+        with self.lock:
+            for key in [k for k, entry in self.entries.items() if entry["filesystem"]]:
+                del self.entries[key]
+
+
+_cache = ToolCache()
+
+
+def get_tool_cache() -> ToolCache:
+    return _cache
@@ -0,0 +1,277 @@
+import os
+import re
+import json
+import math
+import shutil
+import threading
+import subprocess
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+from config import Config
+from .config import PROJECT_ROOT, get_workspace_path, is_path_in_workspace
+from .decorator import tool
+from .fetch import _ReadableHTMLParser, _decode
+from .file_utils import _hash_file, _write_json_atomic
+from .workspace_search import IGNORED_DIRS
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+config = Config()
+
+INDEX_DIR = config.get("tool.retrieval.index_dir") or os.path.join(PROJECT_ROOT, ".cache", "retrieval")
+CHUNK_CHARS = config.get("tool.retrieval.chunk_chars", 1000)
+CHUNK_OVERLAP = config.get("tool.retrieval.chunk_overlap", 200)
+MAX_FILE_SIZE = config.get("tool.retrieval.max_file_mb", 50) * 1024 * 1024
+LOADED_DOCS = 256
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TEXT_EXTENSIONS = {".txt", ".md", ".markdown", ".rst", ".tex", ".csv", ".tsv", ".json", ".xml", ".log"}
+HTML_EXTENSIONS = {".html", ".htm", ".xhtml"}
+PDF_EXTENSIONS = {".pdf"}
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words; runs of non-ASCII script (e.g. Chinese) become character bigrams"""
+    tokens = []
+    for word in TOKEN_PATTERN.findall(text.lower()):
+        if not word.isascii() and len(word) > 1:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def _pdf_pages(path: str) -> List[str]:
+    if PdfReader is not None:
+        return [page.extract_text() or "" for page in PdfReader(path).pages]
+    if shutil.which("pdftotext"):
+        output = subprocess.run(["pdftotext", "-layout", path, "-"], capture_output=True, timeout=120, check=True).stdout
+        return output.decode("utf-8", errors="replace").split("\f")
+    raise RuntimeError("PDF support needs the pypdf package or the pdftotext command")
+
+
+def extract_pages(path: str) -> List[str]:
+    """Text of a document, as a list of pages (a single page for anything but PDF)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PDF_EXTENSIONS:
+        return _pdf_pages(path)
+    with open(path, "rb") as f:
+        content = f.read()
+    if extension in HTML_EXTENSIONS:
+        parser = _ReadableHTMLParser(path, markdown=False)
+        parser.feed(_decode(content, "text/html"))
+        parser.close()
+        return [parser.get_text()]
+    return [_decode(content, "text/plain")]
+
+
+def chunk_pages(pages: List[str]) -> List[Dict]:
+    """Split pages into overlapping passages, cut at paragraph or word boundaries where possible"""
+    chunks = []
+    offset = 0
+    for page_number, page in enumerate(pages, 1):
+        start = 0
+        while start < len(page):
+            end = min(len(page), start + CHUNK_CHARS)
+            if end < len(page):
+                cut = page.rfind("\n\n", start + CHUNK_CHARS // 2, end)
+                if cut == -1:
+                    cut = page.rfind(" ", start + CHUNK_CHARS // 2, end)
+                if cut != -1:
+                    end = cut
+            text = page[start:end].strip()
+            if text:
+                chunks.append({"page": page_number, "start": offset + start, "end": offset + end, "text": text})
+            if end >= len(page):
+                break
+            start = max(start + 1, end - CHUNK_OVERLAP)
+        offset += len(page) + 1
+    for chunk in chunks:
+        terms = tokenize(chunk["text"])
+        chunk["length"] = len(terms)
+        chunk["terms"] = dict(Counter(terms))
+    return chunks
+
+
+class PassageIndex:
+    """
+    Incremental on-disk BM25 index of workspace documents.
+
+    Each document's passages and term counts are stored once under the hash of its content,
+    so unchanged, renamed or copied files are never re-extracted. A manifest maps paths to
+    hashes and is refreshed by mtime and size.
+    """
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.index_dir = index_dir
+        self.manifest_path = os.path.join(index_dir, "manifest.json")
+        self.manifest: Dict[str, Dict] = self._load_json(self.manifest_path) or {}
+        self.docs: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _load_json(path: str) -> Optional[Dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _doc_path(self, sha: str) -> str:
+        return os.path.join(self.index_dir, "docs", f"{sha}.json")
+
+    def _load_doc(self, sha: str) -> Optional[List[Dict]]:
+        with self.lock:
+            if sha in self.docs:
+                self.docs.move_to_end(sha)
+                return self.docs[sha]
+        data = self._load_json(self._doc_path(sha))
+        if data is None:
+            return None
+        with self.lock:
+            self.docs[sha] = data["chunks"]
+            while len(self.docs) > LOADED_DOCS:
+                self.docs.popitem(last=False)
+        return data["chunks"]
+
+    def _index_file(self, path: str, stat: os.stat_result) -> Tuple[Optional[str], Optional[str]]:
+        """Return (content hash, error) for a file, extracting and storing it if its content is new"""
+        entry = self.manifest.get(path)
+        # Failed extractions are retried, e.g. once a missing PDF library is installed
+        if entry and not entry.get("error") and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["sha"], None
+
+        sha = _hash_file(path)
+        error = None
+        if not os.path.exists(self._doc_path(sha)):
+            try:
+                chunks = chunk_pages(extract_pages(path))
+                _write_json_atomic(self._doc_path(sha), {"chunks": chunks})
+            except Exception as e:
+                # Nothing is stored under the hash, so the content is extracted again next time
+                error = str(e)
+        with self.lock:
+            self.manifest[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha": sha, "error": error}
+        return sha, error
+
+    def refresh(self, root: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Index the documents under root (a file or directory); returns ({path: hash}, {path: error})"""
+        paths = []
+        if os.path.isfile(root):
+            paths.append(root)
+        else:
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if d not in IGNORED_DIRS]
+                paths.extend(os.path.join(dirpath, name) for name in filenames)
+
+        documents, errors = {}, {}
+        changed = False
+        for path in paths:
+            extension = os.path.splitext(path)[1].lower()
+            if extension not in TEXT_EXTENSIONS | HTML_EXTENSIONS | PDF_EXTENSIONS:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_size > MAX_FILE_SIZE:
+                errors[path] = "File too large to index"
+                continue
+            before = self.manifest.get(path)
+            sha, error = self._index_file(path, stat)
+            changed = changed or before != self.manifest.get(path)
+            if error:
+                errors[path] = error
+            else:
+                documents[path] = sha
+
+        if changed:
+            with self.lock:
+                manifest = dict(self.manifest)
+            _write_json_atomic(self.manifest_path, manifest)
+        return documents, errors
+
+    def search(self, documents: Dict[str, str], query: str, top_k: int) -> List[Dict]:
+        """BM25 over the passages of the given documents"""
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        passages = []
+        for path, sha in documents.items():
+            for chunk in self._load_doc(sha) or []:
+                passages.append((path, chunk))
+        if not passages or not query_terms:
+            return []
+
+        total = len(passages)
+        average_length = sum(chunk["length"] for _, chunk in passages) / total or 1.0
+        df = {term: sum(1 for _, chunk in passages if term in chunk["terms"]) for term in query_terms}
+        idf = {term: math.log(1 + (total - n + 0.5) / (n + 0.5)) for term, n in df.items() if n}
+
+        scored = []
+        for path, chunk in passages:
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * chunk["length"] / average_length)
+            for term, weight in idf.items():
+                tf = chunk["terms"].get(term)
+                if tf:
+                    score += weight * tf * (BM25_K1 + 1) / (tf + norm)
+            if score > 0:
+                scored.append((score, path, chunk))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [{"score": score, "path": path, **chunk} for score, path, chunk in scored[:top_k]]
+
+
+_index = PassageIndex()
+
+
+@tool()
+def search_documents(query: str, path: str = "", top_k: int = 5, max_chars: int = 1000) -> str:
+    """
+    Find the passages of workspace documents (text, markdown, HTML and PDF) most relevant to a query.
+    Prefer this over read_file for answering questions from long documents: it returns only the matching passages.
+
+    Args:
+        query: What to look for, in natural language or keywords.
+        path: A document or directory to search, relative to the workspace (default: the whole workspace).
+        top_k: Number of passages to return (default: 5).
+        max_chars: Maximum characters returned per passage (default: 1000).
+
+    Returns:
+        A JSON string with the best passages, each with its file, page, character offsets and BM25 score.
+    """
+    try:
+        abs_path = get_workspace_path(path or None)
+        if not is_path_in_workspace(abs_path):
+            return json.dumps({"error": "Access to the path is not allowed."})
+        if not os.path.exists(abs_path):
+            return json.dumps({"error": f"Path '{abs_path}' does not exist."})
+        if not query or not query.strip():
+            return json.dumps({"error": "Query must not be empty."})
+
+        documents, errors = _index.refresh(abs_path)
+        top_k = max(1, min(int(top_k), 50))
+        workspace_dir = get_workspace_path()
+        passages = [
+            {
+                "file": os.path.relpath(hit["path"], workspace_dir),
+                "page": hit["page"],
+                "start": hit["start"],
+                "end": hit["end"],
+                "score": round(hit["score"], 4),
+                "text": hit["text"][:max_chars],
+            }
+            for hit in _index.search(documents, query, top_k)
+        ]
+        return json.dumps({
+            "success": True,
+            "query": query,
+            "documents_searched": len(documents),
+            "passages": passages,
+            "skipped": {os.path.relpath(p, workspace_dir): e for p, e in errors.items()},
+        }, ensure_ascii=False)
+    except Exception as e:
+        return json.dumps({"error": f"Searching documents for '{query}' failed: {str(e)}"})
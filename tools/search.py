@@ -1,26 +1,101 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 import requests
 from config import Config
+from events import publish
+from ratelimit import RetryPolicy, get_rate_limiter
 from .decorator import tool
+from .browser_cache import normalize_url
 
 config = Config()
+retry_policy = RetryPolicy.from_config(config)
+REQUEST_TIMEOUT = config.get("tool.search.timeout", 20)
+MAX_QUERIES = config.get("tool.search.max_queries", 5)
+MAX_CONCURRENCY = config.get("tool.search.max_concurrency", 4)
+MAX_MERGED_RESULTS = config.get("tool.search.max_merged_results", 15)
+# Ranking bonus for a result that more than one query found
+MULTI_QUERY_BONUS = 0.05
 
-@tool()
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="search")
+
+
+def _tavily_search(payload: Dict[str, Any]) -> requests.Response:
+    headers = {
+        "Authorization": f"Bearer {config.get_search_key()}",
+        "Content-Type": "application/json"
+    }
+
+    def post():
+        response = requests.post("https://api.tavily.com/search", json=payload, headers=headers, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response
+
+    return retry_policy.call(post, limiter=get_rate_limiter("tavily", config))
+
+
+def truncate_raw_content(raw: str, max_raw_chars: int) -> str:
+    if max_raw_chars and len(raw) > max_raw_chars:
+        return raw[:max_raw_chars] + "…"
+    return raw
+
+
+def merge_results(responses: Dict[str, Dict[str, Any]], max_raw_chars: int, limit: int = MAX_MERGED_RESULTS) -> List[Dict[str, Any]]:
+    """Merge the results of several queries by normalized URL, best score first, keeping at most limit"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for query, response in responses.items():
+        for result in response.get("results", []):
+            if not result.get("url"):
+                continue
+            key = normalize_url(result["url"])
+            item = merged.get(key)
+            if item is None:
+                item = merged[key] = {
+                    "title": result.get("title", ""),
+                    "url": result["url"],
+                    "content": result.get("content", ""),
+                    "score": result.get("score") or 0.0,
+                    "queries": [],
+                }
+                if result.get("raw_content"):
+                    item["raw_content"] = truncate_raw_content(result["raw_content"], max_raw_chars)
+            elif (result.get("score") or 0.0) > item["score"]:
+                item["score"] = result["score"]
+                item["content"] = result.get("content", "") or item["content"]
+            item["queries"].append(query)
+    ranked = sorted(
+        merged.values(),
+        key=lambda item: item["score"] + MULTI_QUERY_BONUS * (len(item["queries"]) - 1),
+        reverse=True,
+    )
+    return ranked[:limit] if limit else ranked
+
+
+@tool(memoize=True, ttl=config.get("tool.search.cache_ttl", 3600), timeout=60)
 def web_search(
-    query: str,
+    query: str = "",
+    queries: Optional[List[str]] = None,
     topic: str = "general",
     search_depth: str = "basic",
     max_results: int = 5,
+    include_raw_content: bool = False,
+    max_raw_chars: int = 2000,
 ) -> str:
     """
     Search the web for a query and return the results using Tavily API.
+    To cover several angles of a topic at once, pass them all in "queries": they run concurrently and
+    their results are merged into one list, which saves a turn per extra query.
     
     Args:
         query: The search query
+        queries: Several search queries to run at once instead of "query" (at most 5)
         topic: The topic of the search (default: "general")
         search_depth: Depth of search - "basic" or "advanced" (default: "basic")
-        max_results: Maximum number of results to return (default: 5)
+        max_results: Maximum number of results to return per query (default: 5)
+        include_raw_content: Whether to include the cleaned page content of each result (default: False)
+        max_raw_chars: Characters of page content kept per result when include_raw_content is set (default: 2000)
     
-    Return template (type: str):
+    Return template for a single query (type: str):
         {
             "query": "",
             "answer": "",
@@ -36,30 +111,99 @@ def web_search(
             ],
             "response_time": ""
             }
+
+    Return template with "queries" (type: str):
+        {
+            "success": true,
+            "queries": [],
+            "results": [
+                {
+                "title": "",
+                "url": "",
+                "content": "",
+                "score": ...,
+                "queries": [],
+                "raw_content": ""
+                }
+            ],
+            "errors": {}
+            }
     """
-    url = "https://api.tavily.com/search"
-    
+    if queries:
+        return _multi_search(([query] if query else []) + list(queries), topic, search_depth, max_results, include_raw_content, max_raw_chars)
+    if not query:
+        return json.dumps({"error": "Either 'query' or 'queries' is required."})
+
     payload = {
         "query": query,
         "topic": topic,
         "search_depth": search_depth,
         "max_results": max_results,
+        "include_raw_content": include_raw_content,
     }
-    
-    headers = {
-        "Authorization": f"Bearer {config.get_search_key()}",
-        "Content-Type": "application/json"
-    }
-    
+
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        return response.text
+        response = _tavily_search(payload)
+        if not include_raw_content:
+            return response.text
+        data = response.json()
+        for result in data.get("results", []):
+            if result.get("raw_content"):
+                result["raw_content"] = truncate_raw_content(result["raw_content"], max_raw_chars)
+        return json.dumps(data, ensure_ascii=False)
     except requests.exceptions.HTTPError as e:
-        error_msg = f"HTTP Error {response.status_code}: {response.text}"
-        print(f"Tavily API Error: {error_msg}")
-        return f'{{"error": "Search API error: {error_msg}"}}'
+        error_msg = f"HTTP Error {e.response.status_code}: {e.response.text}"
+        publish("search_error", "error", message=f"Tavily API Error: {error_msg}")
+        return json.dumps({"error": f"Search API error: {error_msg}"})
     except Exception as e:
         error_msg = f"Search request failed: {str(e)}"
-        print(f"Search Error: {error_msg}")
-        return f'{{"error": "{error_msg}"}}'
+        publish("search_error", "error", message=f"Search Error: {error_msg}")
+        return json.dumps({"error": error_msg})
+
+
+def _multi_search(
+    queries: List[str],
+    topic: str,
+    search_depth: str,
+    max_results: int,
+    include_raw_content: bool,
+    max_raw_chars: int,
+) -> str:
+    queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+    if not queries:
+        return json.dumps({"error": "Either 'query' or 'queries' is required."})
+    if len(queries) > MAX_QUERIES:
+        return json.dumps({"error": f"At most {MAX_QUERIES} queries can be searched at once."})
+
+    def search(query: str) -> Dict[str, Any]:
+        payload = {
+            "query": query,
+            "topic": topic,
+            "search_depth": search_depth,
+            "max_results": max_results,
+            "include_raw_content": include_raw_content,
+        }
+        return _tavily_search(payload).json()
+
+    responses = {}
+    errors = {}
+    # The shared pool bounds concurrency across sessions; the rate limiter paces the requests
+    futures = {query: _executor.submit(search, query) for query in queries}
+    for query, future in futures.items():
+        try:
+            responses[query] = future.result()
+        except requests.exceptions.HTTPError as e:
+            errors[query] = f"HTTP Error {e.response.status_code}: {e.response.text}"
+        except Exception as e:
+            errors[query] = f"Search request failed: {str(e)}"
+    for query, error in errors.items():
+        publish("search_error", "error", query=query, message=f"Search Error for '{query}': {error}")
+
+    if not responses:
+        return json.dumps({"error": "Search API error: " + "; ".join(errors.values())})
+    return json.dumps({
+        "success": True,
+        "queries": queries,
+        "results": merge_results(responses, max_raw_chars),
+        "errors": errors,
+    }, ensure_ascii=False)
@@ -0,0 +1,213 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from config import Config
+from .config import get_workspace_path, is_path_in_workspace
+from .decorator import tool
+from .fetch import render_table
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    import pyarrow
+    import pyarrow.feather
+except ImportError:
+    pyarrow = None
+
+config = Config()
+
+CACHE_SIZE = config.get("tool.table.cache_size", 4)
+MAX_ROWS = config.get("tool.table.max_rows", 50)
+MAX_CELL_CHARS = config.get("tool.table.max_cell_chars", 80)
+
+CSV_EXTENSIONS = {".csv": ",", ".tsv": "\t", ".tab": "\t"}
+EXCEL_EXTENSIONS = {".xlsx", ".xlsm", ".xls", ".ods"}
+PARQUET_EXTENSIONS = {".parquet", ".pq"}
+FEATHER_EXTENSIONS = {".feather", ".arrow", ".ipc"}
+JSON_EXTENSIONS = {".json", ".jsonl", ".ndjson"}
+OPERATIONS = ("schema", "head", "filter", "aggregate", "describe")
+AGGREGATIONS = {"count", "size", "sum", "mean", "median", "min", "max", "std", "var", "nunique", "first", "last"}
+
+_tables: "OrderedDict[Tuple, pd.DataFrame]" = OrderedDict()
+_tables_lock = threading.Lock()
+
+
+def _read(path: str, sheet: str) -> "pd.DataFrame":
+    extension = os.path.splitext(path)[1].lower()
+    if extension in CSV_EXTENSIONS:
+        # The pyarrow parser is multi-threaded and builds columns directly
+        options = {"engine": "pyarrow"} if pyarrow is not None else {"memory_map": True}
+        return pd.read_csv(path, sep=CSV_EXTENSIONS[extension], **options)
+    if extension in PARQUET_EXTENSIONS:
+        return pd.read_parquet(path, memory_map=True)
+    if extension in FEATHER_EXTENSIONS:
+        if pyarrow is None:
+            raise RuntimeError("Reading Feather/Arrow files needs the pyarrow package")
+        return pyarrow.feather.read_table(path, memory_map=True).to_pandas()
+    if extension in EXCEL_EXTENSIONS:
+        return pd.read_excel(path, sheet_name=sheet or 0)
+    if extension in JSON_EXTENSIONS:
+        return pd.read_json(path, lines=extension != ".json")
+    raise ValueError(f"Unsupported table format '{extension}'")
+
+
+def load_table(path: str, sheet: str = "") -> "pd.DataFrame":
+    """Table of a file, parsed once and kept in memory until the file changes"""
+    stat = os.stat(path)
+    key = (path, sheet, stat.st_mtime_ns, stat.st_size)
+    with _tables_lock:
+        if key in _tables:
+            _tables.move_to_end(key)
+            return _tables[key]
+    table = _read(path, sheet)
+    with _tables_lock:
+        for stale in [k for k in _tables if k[:2] == key[:2]]:
+            del _tables[stale]
+        _tables[key] = table
+        while len(_tables) > CACHE_SIZE:
+            _tables.popitem(last=False)
+    return table
+
+
+def _format(value) -> str:
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return ""
+    text = f"{value:.6g}" if isinstance(value, float) else str(value)
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 1] + "…"
+
+
+def _render(frame: "pd.DataFrame", limit: int, index: bool = False) -> str:
+    shown = frame.head(limit)
+    if index:
+        shown = shown.reset_index()
+    rows = [[str(column) for column in shown.columns]]
+    rows += [[_format(value) for value in row] for row in shown.itertuples(index=False, name=None)]
+    return render_table(rows)
+
+
+def _check_columns(frame: "pd.DataFrame", names: List[str]):
+    missing = [name for name in names if name not in frame.columns]
+    if missing:
+        raise ValueError(f"Unknown columns: {', '.join(missing)}. Available: {', '.join(map(str, frame.columns))}")
+
+
+def _aggregate(frame: "pd.DataFrame", group_by: List[str], aggregations: Dict[str, str]) -> "pd.DataFrame":
+    named = {}
+    for column, functions in aggregations.items():
+        for function in str(functions).split(","):
+            function = function.strip()
+            if function not in AGGREGATIONS:
+                raise ValueError(f"Unknown aggregation '{function}'. Use one of: {', '.join(sorted(AGGREGATIONS))}")
+            named[f"{column}_{function}"] = (column, function)
+    if not group_by:
+        return pd.DataFrame({name: [frame[column].agg(function)] for name, (column, function) in named.items()})
+    grouped = frame.groupby(group_by, dropna=False, sort=False, observed=True)
+    if not named:
+        return grouped.size().rename("count").reset_index()
+    return grouped.agg(**named).reset_index()
+
+
+@tool(memoize=True, path_args=["path"])
+def query_table(
+    path: str,
+    operation: str = "schema",
+    columns: Optional[List[str]] = None,
+    where: str = "",
+    group_by: Optional[List[str]] = None,
+    aggregations: Optional[Dict[str, str]] = None,
+    sort_by: str = "",
+    descending: bool = False,
+    limit: int = 20,
+    sheet: str = "",
+) -> str:
+    """
+    Analyse a tabular data file in the workspace (CSV, TSV, Excel, Parquet, Feather, JSON lines) without reading it into the conversation.
+    The file is loaded once into an in-memory columnar table; each call returns only a small result table.
+    Start with operation "schema", then use "head", "filter", "aggregate" or "describe".
+
+    Args:
+        path: The data file, relative to the workspace.
+        operation: "schema" (columns, types, row count), "head" (first rows), "filter" (rows matching `where`),
+            "aggregate" (group by and aggregate), or "describe" (summary statistics).
+        columns: Columns to return or describe (default: all).
+        where: Row filter as a pandas query expression, e.g. "price > 10 and country == 'FR'"; use backticks for column names with spaces.
+        group_by: Columns to group by for "aggregate" (default: aggregate the whole table).
+        aggregations: For "aggregate", a mapping of column to function(s), e.g. {"price": "mean,max", "id": "count"};
+            functions: count, size, sum, mean, median, min, max, std, var, nunique, first, last. Without it, rows per group are counted.
+        sort_by: Column of the result to sort by.
+        descending: Sort in descending order.
+        limit: Maximum rows to return (default: 20).
+        sheet: Excel sheet name (default: the first sheet).
+
+    Returns:
+        A JSON string with the result as a markdown table, the number of matching rows, and whether the table was cut off.
+    """
+    if pd is None:
+        return json.dumps({"error": "query_table needs the pandas package (and pyarrow for Parquet and Feather files)"})
+    if operation not in OPERATIONS:
+        return json.dumps({"error": f"Unknown operation '{operation}'. Use one of: {', '.join(OPERATIONS)}"})
+    try:
+        abs_path = get_workspace_path(path)
+        if not is_path_in_workspace(abs_path):
+            return json.dumps({"error": "Access to the path is not allowed."})
+        if not os.path.isfile(abs_path):
+            return json.dumps({"error": f"File '{path}' does not exist."})
+
+        table = load_table(abs_path, sheet)
+        limit = max(1, min(int(limit), MAX_ROWS))
+
+        if operation == "schema":
+            rows = [["column", "type", "non-null", "example"]]
+            non_null = table.count()
+            first_valid = {column: table[column].first_valid_index() for column in table.columns}
+            for column in table.columns:
+                example = table[column].at[first_valid[column]] if first_valid[column] is not None else None
+                rows.append([str(column), str(table[column].dtype), str(int(non_null[column])), _format(example)])
+            return json.dumps({
+                "success": True,
+                "path": path,
+                "rows": len(table),
+                "columns": len(table.columns),
+                "memory_mb": round(table.memory_usage(deep=False).sum() / (1024 * 1024), 1),
+                "table": render_table(rows),
+            }, ensure_ascii=False)
+
+        if operation == "filter" and not where:
+            return json.dumps({"error": "The filter operation needs a `where` expression."})
+        frame = table.query(where) if where else table
+
+        index = False
+        if operation == "aggregate":
+            _check_columns(frame, list(group_by or []) + list((aggregations or {}).keys()))
+            frame = _aggregate(frame, list(group_by or []), aggregations or {})
+        elif operation == "describe":
+            if columns:
+                _check_columns(frame, columns)
+                frame = frame[columns]
+            frame = frame.describe(include="all").T
+            frame.index.name = "column"
+            index = True
+        elif columns:
+            _check_columns(frame, columns)
+            frame = frame[columns]
+
+        if sort_by:
+            _check_columns(frame, [sort_by])
+            frame = frame.sort_values(sort_by, ascending=not descending, kind="stable")
+
+        return json.dumps({
+            "success": True,
+            "path": path,
+            "operation": operation,
+            "rows": len(frame),
+            "returned": min(limit, len(frame)),
+            "truncated": len(frame) > limit,
+            "table": _render(frame, limit, index=index),
+        }, ensure_ascii=False)
+    except Exception as e:
+        return json.dumps({"error": f"Querying table '{path}' failed: {type(e).__name__}: {str(e)}"})
@@ -0,0 +1,80 @@
+import os
+import json
+import base64
+import threading
+from typing import Optional
+from config import Config
+from llm import ProviderRouter
+from .config import get_workspace_path, is_path_in_workspace
+from .decorator import tool
+from .file_utils import get_path_from_source, is_url
+from .image_utils import prepare_image
+
+config = Config()
+
+MAX_TOKENS = config.get("tool.vision.max_tokens", 1024)
+MAX_DOWNLOAD_MB = config.get("tool.vision.max_download_mb", 20)
+
+_router: Optional[ProviderRouter] = None
+_router_lock = threading.Lock()
+
+
+def _get_router() -> ProviderRouter:
+    """Router over the multimodal providers, created on first use"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ProviderRouter(config, config.get("tool.vision.providers"))
+        return _router
+
+
+def _resolve_image(image_path: str) -> str:
+    if is_url(image_path):
+        file_path, _ = get_path_from_source(image_path, allowed_mime_prefixes=["image/"], max_size_mb=MAX_DOWNLOAD_MB, type="image")
+        return file_path
+    file_path = get_workspace_path(image_path)
+    # For security reasons, we limit the file path to the workspace directory
+    if not is_path_in_workspace(file_path):
+        raise PermissionError("File access out of allowed range")
+    return file_path
+
+
+@tool(memoize=True, path_args=["image_path"], timeout=180)
+def analyze_image(image_path: str, question: str = "Describe this image in detail, including any text it contains.") -> str:
+    """
+    Look at an image (photo, screenshot, chart, diagram, scanned page) and answer a question about it.
+
+    Args:
+        image_path: Image file path relative to the workspace, or URL
+        question: What to find out from the image (default: a detailed description)
+
+    Returns:
+        str: JSON string with the model's answer in "answer", plus the size of the image as uploaded
+    """
+    try:
+        file_path = _resolve_image(image_path)
+        if not os.path.isfile(file_path):
+            return json.dumps({"error": f"Image file '{image_path}' does not exist"})
+
+        image = prepare_image(file_path)
+        with open(image["path"], "rb") as f:
+            data_url = f"data:{image['mime_type']};base64," + base64.b64encode(f.read()).decode("ascii")
+
+        response, provider = _get_router().create(
+            messages=[{
+                "role": "user",
+                "content": [
+                    {"type": "image_url", "image_url": {"url": data_url}},
+                    {"type": "text", "text": question},
+                ],
+            }],
+            max_tokens=MAX_TOKENS,
+        )
+        return json.dumps({
+            "success": True,
+            "answer": response.choices[0].message.content,
+            "provider": provider,
+            "image": {key: image[key] for key in ("mime_type", "width", "height", "original_bytes", "bytes")},
+        }, ensure_ascii=False)
+    except Exception as e:
+        return json.dumps({"error": f"Analyzing image '{image_path}' failed: {str(e)}"})
@@ -0,0 +1,375 @@
+import os
+import re
+import json
+import fnmatch
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+from .config import get_workspace_path, is_path_in_workspace
+from .decorator import tool
+
+IGNORED_DIRS = {
+    ".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", "venv",
+    ".mypy_cache", ".pytest_cache", ".ruff_cache", ".tox", ".nox", ".idea",
+}
+# Larger files are not indexed but still searched, line by line
+MAX_FILE_SIZE = 8 * 1024 * 1024
+BINARY_SNIFF_BYTES = 8192
+MAX_LINE_LENGTH = 300
+MAX_TOTAL_MATCHES = 10000
+# Below this many files the process pool costs more than it saves
+PARALLEL_THRESHOLD = 32
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+        return _executor
+
+
+def _map(func, items: list) -> list:
+    if len(items) < PARALLEL_THRESHOLD:
+        return [func(item) for item in items]
+    chunksize = max(1, len(items) // ((os.cpu_count() or 1) * 4))
+    return list(_get_executor().map(func, items, chunksize=chunksize))
+
+
+def _read_text(path: str) -> Optional[str]:
+    """Return the decoded file content, or None for binary/unreadable/oversized files."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read(MAX_FILE_SIZE + 1)
+    except OSError:
+        return None
+    if len(data) > MAX_FILE_SIZE or b"\0" in data[:BINARY_SNIFF_BYTES]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def _is_large_text(path: str) -> bool:
+    """Whether a file too large to index is text that should still be searched."""
+    try:
+        if os.path.getsize(path) <= MAX_FILE_SIZE:
+            return False
+        with open(path, "rb") as f:
+            return b"\0" not in f.read(BINARY_SNIFF_BYTES)
+    except OSError:
+        return False
+
+
+def _iter_lines(path: str):
+    text = _read_text(path)
+    if text is not None:
+        yield from text.splitlines()
+        return
+    if not _is_large_text(path):
+        return
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                yield line.rstrip("\r\n")
+    except OSError:
+        return
+
+
+def _trigrams(text: str) -> Set[str]:
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _index_file(path: str) -> Tuple[str, Optional[Set[str]], bool]:
+    """Trigrams of a file (None if it cannot be indexed), and whether it is large text searched without the index."""
+    text = _read_text(path)
+    if text is not None:
+        return path, _trigrams(text), False
+    return path, None, _is_large_text(path)
+
+
+def _scan_file(job: Tuple[str, str, int, int]) -> Tuple[str, List[Tuple[int, str]], int]:
+    path, pattern, flags, limit = job
+    regex = re.compile(pattern, flags)
+    matches = []
+    count = 0
+    for line_no, line in enumerate(_iter_lines(path), 1):
+        if regex.search(line):
+            count += 1
+            if len(matches) < limit:
+                matches.append((line_no, line[:MAX_LINE_LENGTH]))
+    return path, matches, count
+
+
+# Escapes that stand for a class, an anchor or a single control character and take no argument
+SIMPLE_ESCAPES = set("dDwWsSbBAZntrfva")
+
+
+def _class_end(pattern: str, start: int) -> int:
+    """Index just past the character class opening at start, or len(pattern) if it is not closed"""
+    i = start + 1
+    if i < len(pattern) and pattern[i] == "^":
+        i += 1
+    if i < len(pattern) and pattern[i] == "]":
+        # A leading ] is a literal member
+        i += 1
+    while i < len(pattern):
+        if pattern[i] == "\\":
+            i += 2
+            continue
+        if pattern[i] == "]":
+            return i + 1
+        i += 1
+    return len(pattern)
+
+
+def _required_literals(pattern: str) -> List[str]:
+    """
+    Extract literal runs that every match of a regex must contain.
+
+    Conservative: anything inside groups or character classes is ignored, a
+    top-level alternation disables filtering altogether, and extraction stops at
+    escapes with arguments (\\x41, \\u00e9, \\N{...}, octal, backreferences).
+    """
+    literals = []
+    current = ""
+    depth = 0
+    # Number of literals found before extraction stopped
+    stopped_at = None
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern):
+            escaped = pattern[i + 1]
+            i += 2
+            if not escaped.isalnum():
+                if depth == 0:
+                    current += escaped
+                continue
+            literals.append(current)
+            current = ""
+            if escaped not in SIMPLE_ESCAPES and stopped_at is None:
+                # Its argument would be misread as literal text; keep scanning only for alternations
+                stopped_at = len(literals)
+            continue
+        if char == "[":
+            i = _class_end(pattern, i)
+            literals.append(current)
+            current = ""
+            continue
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth = max(0, depth - 1)
+        elif char == "|" and depth == 0:
+            return []
+        elif char in "*?{" and depth == 0:
+            # The preceding character is optional
+            current = current[:-1]
+            if char == "{":
+                end = pattern.find("}", i)
+                i = len(pattern) if end == -1 else end
+        elif char == "{":
+            end = pattern.find("}", i)
+            i = len(pattern) if end == -1 else end
+        elif char not in ".^$+" and depth == 0:
+            current += char
+            i += 1
+            continue
+        literals.append(current)
+        current = ""
+        i += 1
+    literals.append(current)
+    return [literal for literal in literals[:stopped_at] if len(literal) >= 3]
+
+
+class TrigramIndex:
+    """In-memory trigram index over workspace files, refreshed by mtime and size."""
+
+    def __init__(self):
+        self.files: Dict[str, Tuple[int, int]] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        self.file_trigrams: Dict[str, Set[str]] = {}
+        self.unindexable: Set[str] = set()
+        # Text files too large to index; every search scans them
+        self.large: Set[str] = set()
+        self.lock = threading.Lock()
+
+    def _remove(self, path: str):
+        for trigram in self.file_trigrams.pop(path, ()):
+            posting = self.postings.get(trigram)
+            if posting is not None:
+                posting.discard(path)
+                if not posting:
+                    del self.postings[trigram]
+        self.unindexable.discard(path)
+        self.large.discard(path)
+        self.files.pop(path, None)
+
+    def refresh(self, root: str) -> List[str]:
+        """Bring the index up to date for root and return the searchable files under it."""
+        current = {}
+        stack = [root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.name not in IGNORED_DIRS:
+                                    stack.append(entry.path)
+                            elif entry.is_file():
+                                stat = entry.stat()
+                                current[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+        with self.lock:
+            prefix = os.path.join(root, "")
+            for path in [p for p in self.files if p.startswith(prefix) and p not in current]:
+                self._remove(path)
+
+            stale = [path for path, sig in current.items() if self.files.get(path) != sig]
+            for path in stale:
+                self._remove(path)
+            for path, trigrams, large in _map(_index_file, stale):
+                self.files[path] = current[path]
+                if large:
+                    self.large.add(path)
+                    continue
+                if trigrams is None:
+                    self.unindexable.add(path)
+                    continue
+                self.file_trigrams[path] = trigrams
+                for trigram in trigrams:
+                    self.postings.setdefault(trigram, set()).add(path)
+
+            return sorted(path for path in current if path not in self.unindexable)
+
+    def candidates(self, files: List[str], literals: List[str]) -> List[str]:
+        """Narrow files down to those containing every trigram of every literal."""
+        required = set()
+        for literal in literals:
+            required |= _trigrams(literal)
+        if not required:
+            return files
+        with self.lock:
+            postings = sorted((self.postings.get(t, set()) for t in required), key=len)
+            matched = set.intersection(*postings) if postings else set()
+            large = set(self.large)
+        return [path for path in files if path in matched or path in large]
+
+
+_index = TrigramIndex()
+
+
+def _matches_globs(rel_path: str, globs: List[str]) -> bool:
+    name = os.path.basename(rel_path)
+    return any(fnmatch.fnmatch(rel_path, g) or fnmatch.fnmatch(name, g) for g in globs)
+
+
+def _split_globs(value: str) -> List[str]:
+    return [g.strip() for g in (value or "").split(",") if g.strip()]
+
+
+@tool()
+def search_workspace(
+    pattern: str,
+    directory: str = "",
+    is_regex: bool = False,
+    case_sensitive: bool = False,
+    include: str = "",
+    exclude: str = "",
+    max_results: int = 50,
+    offset: int = 0,
+) -> str:
+    """
+    Search the contents of files in the workspace for a literal string or regular expression.
+
+    Args:
+        pattern: The text or regular expression to search for. Matching is done line by line.
+        directory: Directory to search, relative to the workspace (default: the whole workspace).
+        is_regex: Treat the pattern as a Python regular expression instead of literal text (default: False).
+        case_sensitive: Whether matching is case sensitive (default: False).
+        include: Comma-separated glob patterns of files to search, e.g. "*.py,docs/*.md" (default: all files).
+        exclude: Comma-separated glob patterns of files to skip (default: none).
+        max_results: Maximum number of matching lines to return (default: 50).
+        offset: Number of matching lines to skip, for fetching the next page of results (default: 0).
+
+    Returns:
+        A JSON string with the matching lines (file, line number, text), the total match count and
+        the offset of the next page if more results are available.
+    """
+    try:
+        abs_directory_path = get_workspace_path(directory or None)
+
+        # For security reasons, we limit the search to the workspace directory
+        if not is_path_in_workspace(abs_directory_path):
+            return json.dumps({"error": "Access to the directory is not allowed."})
+        if not os.path.isdir(abs_directory_path):
+            return json.dumps({"error": f"Directory '{abs_directory_path}' does not exist."})
+        if not pattern:
+            return json.dumps({"error": "Search pattern must not be empty."})
+
+        regex_source = pattern if is_regex else re.escape(pattern)
+        flags = 0 if case_sensitive else re.IGNORECASE
+        try:
+            re.compile(regex_source, flags)
+        except re.error as e:
+            return json.dumps({"error": f"Invalid regular expression '{pattern}': {str(e)}"})
+
+        max_results = max(1, min(int(max_results), 500))
+        offset = max(0, int(offset))
+
+        files = _index.refresh(abs_directory_path)
+        workspace_dir = get_workspace_path()
+        include_globs = _split_globs(include)
+        exclude_globs = _split_globs(exclude)
+        if include_globs or exclude_globs:
+            filtered = []
+            for path in files:
+                rel_path = os.path.relpath(path, workspace_dir)
+                if include_globs and not _matches_globs(rel_path, include_globs):
+                    continue
+                if exclude_globs and _matches_globs(rel_path, exclude_globs):
+                    continue
+                filtered.append(path)
+            files = filtered
+
+        literals = _required_literals(pattern) if is_regex else [pattern]
+        candidates = _index.candidates(files, literals)
+
+        # Each file only needs to report as many lines as could land on the requested page
+        per_file_limit = offset + max_results
+        jobs = [(path, regex_source, flags, per_file_limit) for path in candidates]
+
+        matches = []
+        total = 0
+        for path, file_matches, count in _map(_scan_file, jobs):
+            rel_path = os.path.relpath(path, workspace_dir)
+            for line_no, text in file_matches:
+                if len(matches) < per_file_limit:
+                    matches.append({"file": rel_path, "line": line_no, "text": text})
+            total += count
+            if total >= MAX_TOTAL_MATCHES:
+                break
+
+        page = matches[offset:offset + max_results]
+        next_offset = offset + len(page) if offset + len(page) < total else None
+        return json.dumps({
+            "success": True,
+            "pattern": pattern,
+            "directory": abs_directory_path,
+            "files_searched": len(candidates),
+            "total_matches": total,
+            "total_is_lower_bound": total >= MAX_TOTAL_MATCHES,
+            "offset": offset,
+            "next_offset": next_offset,
+            "matches": page,
+        }, ensure_ascii=False)
+    except Exception as e:
+        return json.dumps({"error": f"Searching for '{pattern}' failed: {str(e)}"})
@@ -4,9 +4,8 @@ import json
 
 def extract_json(content):
     pattern = r'```json\s*({.*?})\s*```'
-    match = re.search(pattern, content, re.DOTALL)
     
-    if match:
+    for match in re.finditer(pattern, content, re.DOTALL):
         try:
             completion_data = json.loads(match.group(1))
             if isinstance(completion_data, dict) and completion_data.get("task_complete") is True:
@@ -0,0 +1,189 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+from config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    prompt TEXT NOT NULL,
+    max_iterations INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    session_id TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, id);
+"""
+
+STATUSES = ("queued", "running", "completed", "failed")
+
+
+class WorkQueue:
+    """
+    Durable task queue in a SQLite file, shared by any number of worker processes.
+
+    A worker claims a task with a lease that it keeps extending through heartbeats. A task
+    whose lease expires (its worker died or hung) goes back to the queue, until it has been
+    attempted max_attempts times, after which it is marked failed.
+
+    The queue uses SQLite's write-ahead log, which needs shared memory and so only works for
+    processes on one host. Set shared for a queue file on a network filesystem used by workers
+    on several hosts: it then uses a rollback journal, which relies on POSIX file locks only,
+    so the filesystem must implement them correctly.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0, shared: bool = False):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode; write transactions are opened explicitly with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        if shared:
+            self.conn.execute("PRAGMA journal_mode=DELETE")
+            self.conn.execute("PRAGMA synchronous=FULL")
+        else:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, config: Config) -> "WorkQueue":
+        return cls(
+            config.get("queue.path", os.path.join(config.get("logging.save_path", "logs/"), "queue.db")),
+            shared=config.get("queue.shared", False),
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def _write(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self.conn.execute(sql, params)
+            self.conn.execute("COMMIT")
+            return cursor
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        task = dict(row)
+        if task["result"] is not None:
+            task["result"] = json.loads(task["result"])
+        return task
+
+    def enqueue(self, prompts: List[str], max_iterations: int = 16, max_attempts: int = 3) -> List[int]:
+        """Add tasks to the queue in one transaction and return their ids"""
+        now = time.time()
+        ids = []
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for prompt in prompts:
+                cursor = self.conn.execute(
+                    "INSERT INTO tasks (prompt, max_iterations, max_attempts, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (prompt, max_iterations, max_attempts, now, now),
+                )
+                ids.append(cursor.lastrowid)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """Take the oldest queued task, after returning expired leases to the queue"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, "
+                "error = 'Lease expired on worker ' || worker_id, worker_id = NULL, lease_expires_at = NULL, updated_at = ? "
+                "WHERE status = 'running' AND lease_expires_at < ?",
+                (now, now),
+            )
+            row = self.conn.execute("SELECT id FROM tasks WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute(
+                "UPDATE tasks SET status = 'running', attempts = attempts + 1, worker_id = ?, lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (worker_id, now + lease_seconds, now, row["id"]),
+            )
+            task = self.conn.execute("SELECT * FROM tasks WHERE id = ?", (row["id"],)).fetchone()
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return self._to_dict(task)
+
+    def heartbeat(self, task_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """Extend the lease; False means the worker no longer owns the task"""
+        now = time.time()
+        cursor = self._write(
+            "UPDATE tasks SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (now + lease_seconds, now, task_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+    def set_session(self, task_id: int, worker_id: str, session_id: str):
+        """Remember the agent session, so a retry resumes it from its checkpoint"""
+        self._write(
+            "UPDATE tasks SET session_id = ?, updated_at = ? WHERE id = ? AND worker_id = ?",
+            (session_id, time.time(), task_id, worker_id),
+        )
+
+    def complete(self, task_id: int, worker_id: str, result: Dict[str, Any]) -> bool:
+        cursor = self._write(
+            "UPDATE tasks SET status = 'completed', result = ?, error = NULL, worker_id = NULL, lease_expires_at = NULL, "
+            "updated_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (json.dumps(result, ensure_ascii=False), time.time(), task_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, task_id: int, worker_id: str, error: str) -> bool:
+        """Record a failed attempt; the task is retried while it has attempts left"""
+        cursor = self._write(
+            "UPDATE tasks SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, error = ?, "
+            "worker_id = NULL, lease_expires_at = NULL, updated_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (error, time.time(), task_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, task_id: int, worker_id: str) -> bool:
+        """Hand a task back without counting the attempt, e.g. when the worker shuts down"""
+        cursor = self._write(
+            "UPDATE tasks SET status = 'queued', attempts = MAX(attempts - 1, 0), worker_id = NULL, lease_expires_at = NULL, "
+            "updated_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (time.time(), task_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+    def get(self, task_id: int) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        if status:
+            rows = self.conn.execute("SELECT * FROM tasks WHERE status = ? ORDER BY id LIMIT ?", (status, limit))
+        else:
+            rows = self.conn.execute("SELECT * FROM tasks ORDER BY id LIMIT ?", (limit,))
+        return [self._to_dict(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(STATUSES, 0)
+        for row in self.conn.execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        return counts